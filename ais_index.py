@@ -0,0 +1,312 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import heapq
+import math
+
+from distance_engine import LocalTangentPlane
+
+# optional, per tick recomputation of all vessel distances is vectorized when available
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    numpy = None
+    NUMPY_AVAILABLE = False
+
+
+def bounding_box_degrees(latitude, radius):
+    """Half sizes (latitude, longitude) in degrees of a box containing every point within radius meters"""
+    # 110574 and 111320 are the smallest meters per degree of latitude and longitude (at the equator), 1% margin
+    d_lat = radius * 1.01 / 110574
+    d_lon = radius * 1.01 / (111320 * max(math.cos(math.radians(min(abs(latitude), 89))), 0.01))
+    return d_lat, d_lon
+
+
+class _Entry(object):
+    __slots__ = ('slot', 'cell', 'distance', 'bearing', 'sequence')
+
+
+class VesselIndex(object):
+    """Tracked vessels bucketed in a uniform grid of the local plane around own ship, with a max-heap of their distances.
+    Nearest and within radius queries only visit the cells around the query point, the farthest vessel is the top of the heap.
+    Heap entries are invalidated by newer updates rather than removed, and compacted once stale ones dominate.
+    Plane coordinates are kept in contiguous arrays (NumPy when available) so recompute() can refresh all distances
+    and bearings in one pass after own ship moved.
+    The plane is re-centered on own ship only when it moved more than rebase_distance, which is rare at anchor."""
+
+    def __init__(self, cell_size=250, rebase_distance=2000, use_numpy=NUMPY_AVAILABLE):
+        self.cell_size = cell_size
+        self.rebase_distance = rebase_distance
+        self._use_numpy = use_numpy and NUMPY_AVAILABLE
+
+        self._plane = None
+        self._own_east = 0
+        self._own_north = 0
+
+        self._cells = {}        # (column, row) -> set of mmsi
+        self._entries = {}      # mmsi -> _Entry
+        self._positions = {}    # mmsi -> (latitude, longitude), to re-project on rebase
+        self._heap = []         # (-distance, sequence, mmsi)
+        self._sequence = 0
+
+        # plane coordinates by slot, slots of removed vessels are reused
+        self._east = numpy.zeros(0) if self._use_numpy else []
+        self._north = numpy.zeros(0) if self._use_numpy else []
+        self._slot_mmsi = []
+        self._free_slots = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, mmsi):
+        return mmsi in self._entries
+
+    def set_origin(self, position):
+        """Own ship position, queries and distances computed by the index are relative to it"""
+        if self._plane is not None:
+            self._own_east, self._own_north = self._plane.to_xy(position.latitude, position.longitude)
+            if math.hypot(self._own_east, self._own_north) <= self.rebase_distance:
+                return
+
+        self._plane = LocalTangentPlane(position)
+        self._own_east = 0
+        self._own_north = 0
+
+        self._cells = {}
+        for mmsi, (latitude, longitude) in self._positions.items():
+            entry = self._entries[mmsi]
+            east, north = self._plane.to_xy(latitude, longitude)
+            self._east[entry.slot] = east
+            self._north[entry.slot] = north
+            entry.cell = self._cell(east, north)
+            self._cells.setdefault(entry.cell, set()).add(mmsi)
+
+    def update(self, mmsi, latitude, longitude, distance=None):
+        """Adds or moves a vessel. distance to own ship defaults to the planar one"""
+        if self._plane is None:
+            raise ValueError("VesselIndex origin not set")
+
+        east, north = self._plane.to_xy(latitude, longitude)
+        d_east = east - self._own_east
+        d_north = north - self._own_north
+        if distance is None:
+            distance = math.hypot(d_east, d_north)
+
+        entry = self._entries.get(mmsi)
+        if entry is None:
+            entry = _Entry()
+            entry.slot = self._allocate_slot(mmsi)
+            entry.cell = None
+            self._entries[mmsi] = entry
+
+        cell = self._cell(east, north)
+        if cell != entry.cell:
+            if entry.cell is not None:
+                self._discard_from_cell(mmsi, entry.cell)
+            self._cells.setdefault(cell, set()).add(mmsi)
+
+        self._east[entry.slot] = east
+        self._north[entry.slot] = north
+        entry.cell = cell
+        entry.bearing = math.degrees(math.atan2(d_east, d_north)) % 360
+        self._positions[mmsi] = (latitude, longitude)
+        self.set_distance(mmsi, distance)
+
+    def set_distance(self, mmsi, distance):
+        """Updates the distance of an indexed vessel to own ship"""
+        entry = self._entries[mmsi]
+        self._sequence += 1
+        entry.distance = distance
+        entry.sequence = self._sequence
+        heapq.heappush(self._heap, (-distance, self._sequence, mmsi))
+
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(-e.distance, e.sequence, m) for m, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def recompute(self):
+        """Recomputes planar distances and bearings of all vessels from the current own ship position and rebuilds the heap.
+        Returns [(mmsi, distance, bearing)]"""
+        count = len(self._slot_mmsi)
+        if self._use_numpy:
+            d_east = self._east[:count] - self._own_east
+            d_north = self._north[:count] - self._own_north
+            distances = numpy.hypot(d_east, d_north).tolist()
+            bearings = (numpy.degrees(numpy.arctan2(d_east, d_north)) % 360).tolist()
+        else:
+            own_east = self._own_east
+            own_north = self._own_north
+            d_east = [east - own_east for east in self._east]
+            d_north = [north - own_north for north in self._north]
+            distances = list(map(math.hypot, d_east, d_north))
+            bearings = [math.degrees(angle) % 360 for angle in map(math.atan2, d_east, d_north)]
+
+        results = []
+        heap = []
+        for slot, mmsi in enumerate(self._slot_mmsi):
+            if mmsi is None:
+                continue
+
+            self._sequence += 1
+            entry = self._entries[mmsi]
+            entry.distance = distances[slot]
+            entry.bearing = bearings[slot]
+            entry.sequence = self._sequence
+            heap.append((-entry.distance, self._sequence, mmsi))
+            results.append((mmsi, entry.distance, entry.bearing))
+
+        heapq.heapify(heap)
+        self._heap = heap
+        return results
+
+    def remove(self, mmsi):
+        entry = self._entries.pop(mmsi, None)
+        if entry is None:
+            return
+
+        del self._positions[mmsi]
+        self._discard_from_cell(mmsi, entry.cell)
+        self._slot_mmsi[entry.slot] = None
+        self._free_slots.append(entry.slot)
+
+    def distance(self, mmsi):
+        """Last known distance of a vessel to own ship, None if not indexed"""
+        entry = self._entries.get(mmsi)
+        return entry.distance if entry is not None else None
+
+    def bearing(self, mmsi):
+        """Last known true bearing in degrees of a vessel from own ship, None if not indexed"""
+        entry = self._entries.get(mmsi)
+        return entry.bearing if entry is not None else None
+
+    def distance_to(self, latitude, longitude):
+        """Planar distance in meters of a position to own ship"""
+        if self._plane is None:
+            raise ValueError("VesselIndex origin not set")
+
+        east, north = self._plane.to_xy(latitude, longitude)
+        return math.hypot(east - self._own_east, north - self._own_north)
+
+    def farthest(self):
+        """(mmsi, distance) of the farthest vessel from own ship, None if empty"""
+        heap = self._heap
+        while heap:
+            distance, sequence, mmsi = heap[0]
+            entry = self._entries.get(mmsi)
+            if entry is not None and entry.sequence == sequence:
+                return mmsi, -distance
+            heapq.heappop(heap)
+        return None
+
+    def pop_beyond(self, distance):
+        """Removes and returns the mmsi of vessels farther than distance from own ship, farthest first"""
+        removed = []
+        farthest = self.farthest()
+        while farthest is not None and farthest[1] > distance:
+            self.remove(farthest[0])
+            removed.append(farthest[0])
+            farthest = self.farthest()
+        return removed
+
+    def within(self, latitude, longitude, radius):
+        """[(mmsi, distance)] of vessels within radius meters of a position, closest first"""
+        if self._plane is None:
+            return []
+
+        east, north = self._plane.to_xy(latitude, longitude)
+        size = self.cell_size
+        results = []
+        for column in range(math.floor((east - radius) / size), math.floor((east + radius) / size) + 1):
+            for row in range(math.floor((north - radius) / size), math.floor((north + radius) / size) + 1):
+                for mmsi in self._cells.get((column, row), ()):
+                    distance = self._distance_from(mmsi, east, north)
+                    if distance <= radius:
+                        results.append((mmsi, distance))
+
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def nearest(self, latitude, longitude):
+        """(mmsi, distance) of the vessel closest to a position, None if empty.
+        Visits rings of cells around the position until no closer vessel can be found"""
+        if not self._entries:
+            return None
+
+        east, north = self._plane.to_xy(latitude, longitude)
+        column, row = self._cell(east, north)
+        best = None
+
+        ring = 0
+        while True:
+            for cell in self._ring(column, row, ring):
+                for mmsi in self._cells.get(cell, ()):
+                    distance = self._distance_from(mmsi, east, north)
+                    if best is None or distance < best[1]:
+                        best = (mmsi, distance)
+
+            # cells of the next rings are at least ring * cell_size away
+            if best is not None and best[1] <= ring * self.cell_size:
+                return best
+            ring += 1
+
+    def _distance_from(self, mmsi, east, north):
+        slot = self._entries[mmsi].slot
+        return math.hypot(self._east[slot] - east, self._north[slot] - north)
+
+    def _allocate_slot(self, mmsi):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_mmsi[slot] = mmsi
+            return slot
+
+        slot = len(self._slot_mmsi)
+        self._slot_mmsi.append(mmsi)
+        if self._use_numpy:
+            if slot >= len(self._east):
+                # grow by doubling so arrays stay contiguous without a copy per new vessel
+                capacity = max(64, len(self._east))
+                self._east = numpy.concatenate((self._east, numpy.zeros(capacity)))
+                self._north = numpy.concatenate((self._north, numpy.zeros(capacity)))
+        else:
+            self._east.append(0.0)
+            self._north.append(0.0)
+        return slot
+
+    def _cell(self, east, north):
+        return math.floor(east / self.cell_size), math.floor(north / self.cell_size)
+
+    def _ring(self, column, row, ring):
+        if ring == 0:
+            yield (column, row)
+            return
+
+        for offset in range(-ring, ring + 1):
+            yield (column + offset, row - ring)
+            yield (column + offset, row + ring)
+        for offset in range(-ring + 1, ring):
+            yield (column - ring, row + offset)
+            yield (column + ring, row + offset)
+
+    def _discard_from_cell(self, mmsi, cell):
+        members = self._cells[cell]
+        members.discard(mmsi)
+        if not members:
+            del self._cells[cell]
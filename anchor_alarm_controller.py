@@ -20,33 +20,67 @@
 
 from anchor_alarm_model import AnchorAlarmConfiguration
 from anchor_alarm_model import AnchorAlarmModel
+from position_filter import PositionFilter
 
 import sys
 import os
+import time
+from collections import namedtuple
 
 from utils import exit_on_error
 
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'gps_providers'))
 from abstract_gps_provider import GPSPosition
+from abstract_gps_provider import GPSSnapshot
 
 
 import logging
 logger = logging.getLogger(__name__)
 
+
+# expected interval between two timer ticks, in seconds
+TICK_INTERVAL = 1
+
+# statistics on how late the timer ticks are, in seconds. A tick is late if it comes more than LATE_TICK_DRIFT after expected
+TimerStats = namedtuple('TimerStats', ['ticks', 'last_interval', 'average_drift', 'max_drift', 'late_ticks'], defaults=[0, None, 0, 0, 0])
+LATE_TICK_DRIFT = 0.5
+
+# connector update policies, see AbstractConnector.update_policy
+UPDATE_EVERY_TICK = 'every_tick'
+UPDATE_ON_CHANGE = 'on_change'
+
+
 class AnchorAlarmController(object):
 
-    def __init__(self, timer_provider, settings_provider):
+    def __init__(self, timer_provider, settings_provider, clock=time.monotonic):
         self._settings_provider = settings_provider
+        self._clock = clock
 
-
-        self._anchor_alarm = AnchorAlarmModel(self._on_state_changed)
+        self._anchor_alarm = AnchorAlarmModel(self._on_state_changed, clock)
         self._gps_providers = []
+        self._active_gps_provider = None
+
+        # position taken once per tick or pushed fix, shared with connectors
+        self._gps_snapshot = None
+
+        # optional filter stage between gps providers and the model
+        self._position_filter = PositionFilter()
+        self._last_filtered_fix = None
+
+        # monotonic time of the last time the model evaluated a position (or the lack of)
+        self._last_evaluation_time = self._clock()
+
+        self._last_tick_time = None
+        self._timer_stats = TimerStats()
 
         self._connectors = []
 
+        # connector -> (version, time) of the last state sent with update_state
+        self._connector_updates = {}
+
         self._init_settings()
 
-        timer_provider().timeout_add(1000, exit_on_error, self._on_timer_tick)
+        timer_provider().timeout_add(TICK_INTERVAL*1000, exit_on_error, self._on_timer_tick)
 
         # if the Active flag was set, reset_state
         if self._settings["Active"] == 1:
@@ -66,6 +100,9 @@ class AnchorAlarmController(object):
             # Number of seconds the alarm will be muted for when the alarm is acknowledged
             "MuteDuration":         ["/Settings/AnchorAlarm/MuteDuration", 120, 0, 600], 
 
+            # Distance in meters around radius + tolerance where the exact geodesic distance is computed instead of the faster planar one
+            "GeodesicBand":         ["/Settings/AnchorAlarm/GeodesicBand", 5, 0, 100],
+
             # Safe radius to use when activating mooring ball mode
             "MooringRadius":        ["/Settings/AnchorAlarm/MooringRadius", 15, 0, 256],
 
@@ -78,6 +115,16 @@ class AnchorAlarmController(object):
             # Last saved safe radius. Used when device reboots or to set a specific value arbitrary
             "Radius":               ["/Settings/AnchorAlarm/Last/Radius", 0, 0, 256],
 
+            # Set to 1 to evaluate every GPS fix as soon as it arrives instead of once per second. 
+            # Lowers alarm latency, gps providers push their fixes and are not polled anymore
+            "EventDrivenEvaluation": ["/Settings/AnchorAlarm/EventDrivenEvaluation", 0, 0, 1],
+
+            # Set to 1 to smooth GPS positions with a Kalman filter before checking the radius. Ignores single position jumps
+            "PositionFilter":       ["/Settings/AnchorAlarm/PositionFilter/Enabled", 0, 0, 1],
+
+            # Percent confidence the boat must be out of radius with, given the position accuracy, before alarming. 0 to alarm on the position as is
+            "Confidence":           ["/Settings/AnchorAlarm/PositionFilter/Confidence", 0, 0, 99],
+
             # Is the anchor alarm enabled ? Used when device reboots. Setting it to 0 will deactivate the alarm. Setting it to 1 will activate the alarm
             "Active":               ["/Settings/AnchorAlarm/Last/Active", 0, 0, 1],  
         }
@@ -93,10 +140,14 @@ class AnchorAlarmController(object):
         if not hasattr(self, '_settings'):
             return  # not yet instanciated
         
-        if key in ["Tolerance", "NoGPSCountThreshold", "MuteDuration"]:
-            conf = AnchorAlarmConfiguration(self._settings["Tolerance"], self._settings["NoGPSCountThreshold"], self._settings["MuteDuration"])
+        if key in ["Tolerance", "NoGPSCountThreshold", "MuteDuration", "GeodesicBand", "Confidence"]:
+            conf = AnchorAlarmConfiguration(self._settings["Tolerance"], self._settings["NoGPSCountThreshold"], self._settings["MuteDuration"], self._settings["GeodesicBand"], self._settings["Confidence"])
             self._anchor_alarm.update_configuration(conf)
 
+        if key == "PositionFilter":
+            self._position_filter.reset()
+            self._last_filtered_fix = None
+
         if key == "Active":
              # if the Active flag was set, reset_state
             if new_value == 1:
@@ -119,9 +170,11 @@ class AnchorAlarmController(object):
 
     def register_gps_provider(self, gps_provider):
         self._gps_providers.append(gps_provider)
+        gps_provider.on_gps_position = self._on_gps_position
 
     def get_gps_position(self):
         logger.debug("Got "+str(len(self._gps_providers))+" gps providers")
+        self._active_gps_provider = None
         for gps_provider in self._gps_providers:
             gps_position = gps_provider.get_gps_position()
 
@@ -134,11 +187,129 @@ class AnchorAlarmController(object):
                     return None
             
                 logger.debug("Returning GPSPosition: "+ str(gps_position))
+                self._active_gps_provider = gps_provider
                 return gps_position
             else:
                 logger.debug("Provider "+ str(gps_provider) + " didn't return a GPS position")
         
         return None
+
+    def get_gps_snapshot(self):
+        """Returns the GPSSnapshot taken at the last tick or fix, without querying the gps providers again.
+        Use it for frequent reads, eg when handling AIS messages"""
+        if self._gps_snapshot is None:
+            self._take_gps_snapshot()
+
+        return self._gps_snapshot._replace(age=self._clock() - self._gps_snapshot.timestamp)
+
+    def get_position_filter(self):
+        """Returns the PositionFilter, to read the filtered position, covariance and velocity"""
+        return self._position_filter
+
+    def _filter_gps_position(self, gps_position):
+        if gps_position is None:
+            return None
+
+        # polled providers may return the same fix on several ticks, only feed it once
+        # fixes are told apart by the provider fix id, or by value for providers that can't tell
+        fix_id = getattr(self._active_gps_provider, 'get_fix_id', lambda: None)()
+        fix = (self._active_gps_provider, fix_id) if fix_id is not None else tuple(gps_position)
+        if fix != self._last_filtered_fix:
+            self._last_filtered_fix = fix
+            gps_velocity = getattr(self._active_gps_provider, 'get_gps_velocity', lambda: None)()
+            if type(gps_velocity).__name__ != "GPSVelocity":
+                gps_velocity = None
+
+            self._position_filter.update(gps_position, self._clock(), gps_velocity)
+
+        return self._position_filter.get_position()
+
+    def _take_gps_snapshot(self):
+        return self._set_gps_snapshot(self.get_gps_position())
+
+    def _set_gps_snapshot(self, gps_position):
+        if self._settings["PositionFilter"] == 1:
+            gps_position = self._filter_gps_position(gps_position)
+
+        source = self._active_gps_provider.get_source_id() if self._active_gps_provider is not None else None
+        epoch = self._gps_snapshot.epoch + 1 if self._gps_snapshot is not None else 1
+
+        self._gps_snapshot = GPSSnapshot(gps_position, source, epoch, self._clock())
+        return self._gps_snapshot
+
+    # called by gps providers when a new fix arrives, or with None when they lost it
+    def _on_gps_position(self, gps_provider, gps_position):
+        if self._settings["EventDrivenEvaluation"] != 1:
+            return
+
+        if gps_position is not None and (type(gps_position).__name__ != "GPSPosition" or gps_position.latitude < -90 or gps_position.latitude > 90):
+            logger.error("Got a invalid GPS position from "+ str(gps_provider) +", ignoring")
+            return
+
+        # the snapshot comes from the fix itself, other providers are not polled
+        if gps_position is not None and self._is_preferred_provider(gps_provider):
+            self._active_gps_provider = gps_provider
+        elif gps_position is None and self._active_gps_provider is gps_provider:
+            self._active_gps_provider = None
+        else:
+            return
+
+        snapshot = self._set_gps_snapshot(gps_position)
+        if self._anchor_alarm.state in ['DISABLED', 'DROP_POINT_SET']:
+            return
+
+        self._evaluate(snapshot.position)
+
+    def _is_preferred_provider(self, gps_provider):
+        """Fixes of a provider are used unless a provider registered before it has a valid fix"""
+        if self._active_gps_provider is None or self._active_gps_provider is gps_provider or self._is_snapshot_expired():
+            return True
+
+        return self._gps_providers.index(gps_provider) < self._gps_providers.index(self._active_gps_provider)
+
+    def _is_snapshot_expired(self):
+        """In event driven mode, a fix is valid until the provider pushes another one, or for its fix_timeout"""
+        if self._gps_snapshot is None or self._gps_snapshot.position is None:
+            return True
+
+        fix_timeout = getattr(self._active_gps_provider, 'fix_timeout', None)
+        return isinstance(fix_timeout, (int, float)) and self._clock() - self._gps_snapshot.timestamp >= fix_timeout
+
+    def _get_event_snapshot(self):
+        """Snapshot of the last pushed fix, without polling the gps providers. Empty once the fix expired"""
+        if self._gps_snapshot is None:
+            return self._take_gps_snapshot()
+
+        if self._gps_snapshot.position is not None and self._is_snapshot_expired():
+            logger.info("No GPS fix pushed by "+ str(self._active_gps_provider) +" recently")
+            self._active_gps_provider = None
+            return self._set_gps_snapshot(None)
+
+        return self._gps_snapshot
+
+    def _evaluate(self, gps_position):
+        self._last_evaluation_time = self._clock()
+        self._anchor_alarm.on_timer_tick(gps_position)
+
+    def get_timer_stats(self):
+        """Returns TimerStats describing how much the main loop delays the 1s timer"""
+        return self._timer_stats
+
+    def _record_tick(self):
+        now = self._clock()
+        if self._last_tick_time is not None:
+            interval = now - self._last_tick_time
+            drift = interval - TICK_INTERVAL
+            stats = self._timer_stats
+
+            self._timer_stats = TimerStats(
+                ticks=          stats.ticks + 1,
+                last_interval=  interval,
+                average_drift=  stats.average_drift + (drift - stats.average_drift) / (stats.ticks + 1),
+                max_drift=      max(stats.max_drift, drift),
+                late_ticks=     stats.late_ticks + (1 if drift > LATE_TICK_DRIFT else 0))
+
+        self._last_tick_time = now
         
 
     def register_connector(self, connector):
@@ -233,13 +404,43 @@ class AnchorAlarmController(object):
                 logger.error("Error in connector "+ str(connector), exc_info=True)
                 pass # TODO XXX
 
+    def _should_update_connector(self, connector, current_state):
+        """Applies the connector update_policy, UPDATE_EVERY_TICK if not defined"""
+        now = self._clock()
+        policy = getattr(connector, 'update_policy', UPDATE_EVERY_TICK)
+
+        if policy == UPDATE_ON_CHANGE and connector in self._connector_updates:
+            last_version, last_time = self._connector_updates[connector]
+            keepalive_interval = getattr(connector, 'update_keepalive_interval', None)
+
+            if last_version == current_state.version and (keepalive_interval is None or now - last_time < keepalive_interval):
+                return False
+
+        self._connector_updates[connector] = (current_state.version, now)
+        return True
+
     def _on_timer_tick(self):
+        self._record_tick()
+
+        if self._settings["EventDrivenEvaluation"] != 1:
+            snapshot = self._take_gps_snapshot()
+        else:
+            snapshot = self._get_event_snapshot()
+
         current_state = self._anchor_alarm.get_current_state()
         if current_state.state != 'DISABLED':
-            self._anchor_alarm.on_timer_tick(self.get_gps_position())
+            if self._settings["EventDrivenEvaluation"] != 1:
+                self._evaluate(snapshot.position)
+
+            # no fix got evaluated during the last second, keep the durations counting and check if GPS is lost
+            elif self._clock() - self._last_evaluation_time >= TICK_INTERVAL:
+                self._evaluate(snapshot.position)
 
         # notify connectors
         for connector in self._connectors:
+            if not self._should_update_connector(connector, current_state):
+                continue
+
             try:
                 connector.update_state(current_state)
             except Exception:
@@ -20,39 +20,45 @@
 
 import sys
 import os
+import time
+from statistics import NormalDist
 
-# bundle our dependencies
-sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'ext'))
-
-
-
-from transitions import Machine
+from state_machine import StateMachine
 import logging
 logger = logging.getLogger(__name__)
 from collections import namedtuple
-from geopy.distance import geodesic
+from distance_engine import DistanceEngine
 
 
 logger = logging.getLogger(__name__)
 
 
-AnchorAlarmConfiguration = namedtuple('AnchorAlarmConfiguration', ['tolerance', 'no_gps_count_threshold', 'mute_duration'], defaults=[15, 30, 30])
+# geodesic_band : distance in meters around radius + tolerance where the exact geodesic distance is used instead of the planar one
+# confidence : percent. When set and positions carry an accuracy, alarm only when the boat is out of radius with that confidence. 0 to compare the position as is
+AnchorAlarmConfiguration = namedtuple('AnchorAlarmConfiguration', ['tolerance', 'no_gps_count_threshold', 'mute_duration', 'geodesic_band', 'confidence'], defaults=[15, 30, 30, 5, 0])
 # level = info | warning | error | emergency
-AnchorAlarmState = namedtuple('AnchorAlarmState', ['state', 'message', 'short_message', 'level', 'muted', 'params'])
+# version is increased every time any field changes, connectors can compare it to skip unchanged states
+AnchorAlarmState = namedtuple('AnchorAlarmState', ['state', 'message', 'short_message', 'level', 'muted', 'params', 'version'], defaults=[0])
 
 
 
 
 class AnchorAlarmModel(object):
-    def __init__(self, on_state_change_fn):
+    def __init__(self, on_state_change_fn, clock=time.monotonic):
 
         self._on_state_change_fn = on_state_change_fn
 
+        # durations are computed from monotonic timestamps so they don't drift when the main loop lags
+        self._clock = clock
+
         # if you need that changed, call on_conf_updated
         self._radius_tolerance = 15
         self._no_gps_count_threshold = 30
         self._mute_duration = 30
 
+        # number of standard deviations a position must be out of radius by, from the configured confidence
+        self._confidence_sigmas = 0
+
         self._drop_point = None
         self._radius = None
         self._no_gps_count = 0
@@ -60,6 +66,17 @@ class AnchorAlarmModel(object):
         self._current_radius = None
         self._alarm_muted_count = 0
 
+        self._last_fix_time = None
+        self._in_radius_time = None
+        self._mute_start_time = None
+
+        self._distance_engine = DistanceEngine()
+
+        # last AnchorAlarmState returned by get_current_state, rebuilt only when one of the fields changed
+        self._current_state = None
+        self._current_state_key = None
+        self._version = 0
+
         states = [
             {'name': 'DISABLED'}, 
             {'name': 'DROP_POINT_SET'}, 
@@ -105,11 +122,10 @@ class AnchorAlarmModel(object):
         ]
 
         # Initialize the state machine
-        self._machine = Machine(model=self,  states=states, 
+        self._machine = StateMachine(model=self, states=states, 
                                             transitions=transitions,
                                             initial='DISABLED', 
-                                            after_state_change=self._after_state_change, 
-                                            ignore_invalid_triggers=True)
+                                            after_state_change=self._after_state_change)
 
 
     def update_configuration(self, conf):
@@ -118,12 +134,15 @@ class AnchorAlarmModel(object):
         self._radius_tolerance = conf.tolerance
         self._no_gps_count_threshold = conf.no_gps_count_threshold
         self._mute_duration = conf.mute_duration
+        self._distance_engine.geodesic_band = conf.geodesic_band
+        self._confidence_sigmas = NormalDist().inv_cdf(conf.confidence / 100) if conf.confidence > 0 else 0
 
         if tolerance_updated:
             # we're back in radius with new tolerance
             logger.info("Tolerance updated to "+ str(self._radius_tolerance))
             if self.state in ['ALARM_DRAGGING', 'ALARM_DRAGGING_MUTED'] and self._current_radius < self._radius + self._radius_tolerance:
                 self._out_of_radius_count = 0
+                self._in_radius_time = self._clock()
                 self.on_tolerance_updated()
 
 
@@ -171,19 +190,22 @@ class AnchorAlarmModel(object):
 
 
     def on_timer_tick(self, gps_position):
-        """Called every second when watching with GPS position.
+        """Called every second when watching with GPS position, or on every fix in event driven mode.
         If no GPS position given for #no_gps_count_thresold#, will go in ALARM_NO_GPS state
-        If GPS position is outside safe radius, will go in ALARM_DRAGGING state"""   
+        If GPS position is outside safe radius, will go in ALARM_DRAGGING state
+        Durations are measured with the monotonic clock, not by counting calls"""   
 
 
         # make sure this code is only run in IN_RADIUS, ALARM_DRAGGING or ALARM_NO_GPS
         if self.state not in ['IN_RADIUS', 'ALARM_DRAGGING', 'ALARM_NO_GPS', 'ALARM_DRAGGING_MUTED', 'ALARM_NO_GPS_MUTED']:
             return
 
+        now = self._clock()
 
         # handle mute state
-        if self.state in ['ALARM_DRAGGING_MUTED', 'ALARM_NO_GPS_MUTED'] and self._alarm_muted_count < self._mute_duration:
-            self._alarm_muted_count += 1
+        is_muted = self.state in ['ALARM_DRAGGING_MUTED', 'ALARM_NO_GPS_MUTED']
+        if is_muted and self._duration_since(self._mute_start_time, now) <= self._mute_duration:
+            self._alarm_muted_count = self._duration_since(self._mute_start_time, now)
             should_transition = False
         elif self.state in ['ALARM_DRAGGING', 'ALARM_NO_GPS']:
             should_transition = False
@@ -194,13 +216,15 @@ class AnchorAlarmModel(object):
         is_anchor_dragging = self.state in ['ALARM_DRAGGING', 'ALARM_DRAGGING_MUTED']
 
         if gps_position is None:
-            self._no_gps_count+=1
+            self._no_gps_count = self._duration_since(self._last_fix_time, now)
             self._current_radius = None
 
             if is_anchor_dragging:
-                self._out_of_radius_count+=1    # if we are dragging already, still count out_of_radius
+                self._out_of_radius_count = self._duration_since(self._in_radius_time, now)    # if we are dragging already, still count out_of_radius
                 if should_transition:           # do not go back yet to ALARM_DRAGGING if it's muted
                     self.on_anchor_dragging()
+            else:
+                self._in_radius_time = now      # not known to be out of radius yet
 
             if self._no_gps_count > self._no_gps_count_threshold:
                 if should_transition:   # do not go back yet to ALARM_NO_GPS if it's muted
@@ -210,11 +234,17 @@ class AnchorAlarmModel(object):
         else:
             # we have a gps position
             self._no_gps_count = 0
-            self._current_radius = round(self._calculate_distance(self._drop_point, gps_position))
+            self._last_fix_time = now
+            distance = self._calculate_distance(self._drop_point, gps_position, self._radius + self._radius_tolerance)
+            self._current_radius = round(distance)
+
+            # an uncertain position must be out of radius by enough to be confident the boat is out
+            if self._confidence_sigmas > 0 and getattr(gps_position, 'accuracy', None) is not None:
+                distance = max(0, distance - self._confidence_sigmas * gps_position.accuracy)
 
-            if self._current_radius >= self._radius + self._radius_tolerance :
+            if round(distance) >= self._radius + self._radius_tolerance :
                 # outside radius
-                self._out_of_radius_count += 1
+                self._out_of_radius_count = self._duration_since(self._in_radius_time, now)
 
                 if should_transition:   # do not go back yet to ALARM_DRAGGING if muted
                     self.on_anchor_dragging()   
@@ -222,9 +252,10 @@ class AnchorAlarmModel(object):
             else:
                 # inside radius
                 if is_anchor_dragging:
-                    self._out_of_radius_count += 1  # when once dragging, being in safe radius again doesn't reset out_of_radius_count
+                    self._out_of_radius_count = self._duration_since(self._in_radius_time, now)  # when once dragging, being in safe radius again doesn't reset out_of_radius_count
                 else:
                     self._out_of_radius_count = 0   # only reset out of radius count if not dragging
+                    self._in_radius_time = now
                     if self.state != "IN_RADIUS":
                         self.on_in_radius()
 
@@ -269,6 +300,19 @@ class AnchorAlarmModel(object):
 
 
     def get_current_state(self):
+        key = (self.state, self._radius_tolerance, self._drop_point, self._radius, self._no_gps_count, 
+               self._out_of_radius_count, self._alarm_muted_count, self._current_radius)
+
+        if key == self._current_state_key:
+            return self._current_state
+
+        self._version += 1
+        self._current_state = self._build_state()
+        self._current_state_key = key
+
+        return self._current_state
+
+    def _build_state(self):
         params = {
             "state": self.state,
             "radius_tolerance": self._radius_tolerance,
@@ -335,9 +379,7 @@ class AnchorAlarmModel(object):
         else:
             raise RuntimeError("Unknown state "+ self.state)
 
-        current_state = AnchorAlarmState(self.state, message, short_message, level, muted, params)
-
-        return current_state
+        return AnchorAlarmState(self.state, message, short_message, level, muted, params, self._version)
 
 
 
@@ -349,9 +391,14 @@ class AnchorAlarmModel(object):
         self._out_of_radius_count = 0
         self._alarm_muted_count = 0
         self._current_radius = None
+        self._last_fix_time = None
+        self._in_radius_time = None
+        self._mute_start_time = None
+        self._distance_engine.set_origin(None)
 
     def on_enter_DROP_POINT_SET(self, gps_position):
         self._drop_point = gps_position
+        self._distance_engine.set_origin(gps_position)
 
 
     def on_after_set_radius(self, radius):
@@ -359,26 +406,38 @@ class AnchorAlarmModel(object):
         self._current_radius = self._radius
         self._out_of_radius_count = 0
 
+        # watch starts now
+        now = self._clock()
+        self._last_fix_time = now
+        self._in_radius_time = now
+
     def on_enter_ALARM_DRAGGING(self):
         self._alarm_muted_count = 0
 
     def on_enter_ALARM_NO_GPS(self):
         self._alarm_muted_count = 0
 
+    def on_enter_ALARM_DRAGGING_MUTED(self):
+        self._mute_start_time = self._clock()
+
+    def on_enter_ALARM_NO_GPS_MUTED(self):
+        self._mute_start_time = self._clock()
+
+    def _duration_since(self, start_time, now):
+        """Whole seconds elapsed since start_time"""
+        if start_time is None:
+            return 0
+        return round(now - start_time)
+
     def _after_state_change(self, *args, **kwargs):
         # notify state change
         if self._on_state_change_fn is not None: 
             self._on_state_change_fn(self.get_current_state())
 
-    def _calculate_distance(self, drop_point, current_position):
+    def _calculate_distance(self, drop_point, current_position, boundary=None):
+        """Planar distance from drop point, exact geodesic distance when close to boundary"""
         if current_position is None or drop_point is None:
             return None
         
-        try:
-            distance = geodesic((drop_point.latitude, drop_point.longitude), 
-                          (current_position.latitude, current_position.longitude)).meters
-        except:
-            distance = 999
-
-        return distance
+        return self._distance_engine.distance(drop_point, current_position, boundary)
 
@@ -64,7 +64,16 @@ class DbusAnchorAlarmService(object):
         # create the setting that are needed
         settingsList = {
             # If auto discovery of NMEA can device fails, you can force it. Reboot required
-            "NNMEACanDevice":     ["/Settings/AnchorAlarm/NMEA/CanDevice", "auto", 0, 128]
+            "NNMEACanDevice":     ["/Settings/AnchorAlarm/NMEA/CanDevice", "auto", 0, 128],
+
+            # Set to 1 for compact binary messages between the NodeJS bridge and the service instead of JSON lines. Reboot required
+            "NMEABinaryFraming":  ["/Settings/AnchorAlarm/NMEA/BinaryFraming", 0, 0, 1],
+
+            # Decode the PGNs the service listens to in Python, straight from SocketCAN, instead of in the NodeJS bridge. Reboot required
+            "NMEANativeDecoding":  ["/Settings/AnchorAlarm/NMEA/NativeDecoding", 0, 0, 1],
+
+            # Record received NMEA messages to that file, to be replayed with bridge_replay.py. Empty to disable. Reboot required
+            "NMEACaptureFile":  ["/Settings/AnchorAlarm/NMEA/CaptureFile", "", 0, 0]
         }
 
         bus = dbus.SessionBus() if 'DBUS_SESSION_BUS_ADDRESS' in os.environ else dbus.SystemBus()
@@ -74,7 +83,10 @@ class DbusAnchorAlarmService(object):
         if can_id == "auto":
             can_id = find_n2k_can(bus)
 
-        self._nmea_bridge  = NMEABridge(can_id)
+        self._nmea_bridge  = NMEABridge(can_id,
+                                        binary_framing=settings['NMEABinaryFraming'] == 1,
+                                        native_decoding=settings['NMEANativeDecoding'] == 1,
+                                        capture_path=settings['NMEACaptureFile'] or None)
 
         self._initStateMachine(bus)
 
@@ -86,7 +98,7 @@ class DbusAnchorAlarmService(object):
         self._nmea_bridge.error_handler = lambda msg: self._alarm_controller.trigger_show_message("error", msg)
 
         dbus_gps_provider = DBusGPSProvider(lambda: GLib)
-        nmea_gps_provider = NMEAGPSProvider(lambda: GLib, self._nmea_bridge)
+        nmea_gps_provider = NMEAGPSProvider(lambda: GLib, self._nmea_bridge, settings_provider=lambda settings, cb: SettingsDevice(bus, settings, cb))
 
         self._alarm_controller.register_gps_provider(dbus_gps_provider)
         self._alarm_controller.register_gps_provider(nmea_gps_provider)
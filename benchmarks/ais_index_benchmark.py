@@ -0,0 +1,105 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Compares the vessel index with the linear scans it replaces, for a crowded anchorage,
+and the per tick recomputation of all distances (pure Python and NumPy when installed) with one geodesic per vessel.
+Run with : python3 benchmarks/ais_index_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../gps_providers'))
+
+import random
+import timeit
+
+from ais_index import VesselIndex, NUMPY_AVAILABLE
+from distance_engine import LocalTangentPlane, geodesic_distance
+from abstract_gps_provider import GPSPosition
+
+
+def main():
+    rnd = random.Random(1)
+    origin = GPSPosition(18.5060715, -64.3725071)
+    plane = LocalTangentPlane(origin)
+
+    for count in (30, 300, 3000):
+        index = VesselIndex()
+        index.set_origin(origin)
+
+        vessels = {}
+        for i in range(count):
+            latitude, longitude = plane.from_xy(rnd.uniform(-5000, 5000), rnd.uniform(-5000, 5000))
+            index.update(str(i), latitude, longitude)
+            vessels[str(i)] = {'latitude': latitude, 'longitude': longitude, 'distance': index.distance(str(i))}
+
+        # one AIS report : a vessel moves, then the farthest one is looked up for eviction
+        def run_scan():
+            mmsi = str(rnd.randrange(count))
+            vessels[mmsi]['distance'] = rnd.uniform(0, 7000)
+            max(vessels.keys(), key=lambda vessel_mmsi: vessels[vessel_mmsi]['distance'])
+
+        def run_index():
+            mmsi = str(rnd.randrange(count))
+            index.set_distance(mmsi, rnd.uniform(0, 7000))
+            index.farthest()
+
+        def run_scan_within():
+            [mmsi for mmsi, vessel in vessels.items() if plane.distance(vessel['latitude'], vessel['longitude']) <= 500]
+
+        def run_index_within():
+            index.within(origin.latitude, origin.longitude, 500)
+
+        positions = [GPSPosition(vessel['latitude'], vessel['longitude']) for vessel in vessels.values()]
+
+        def run_geodesic():
+            for position in positions:
+                geodesic_distance(origin, position)
+
+        python_index = VesselIndex(use_numpy=False)
+        python_index.set_origin(origin)
+        for mmsi, vessel in vessels.items():
+            python_index.update(mmsi, vessel['latitude'], vessel['longitude'])
+
+        number = 200
+        recompute = [
+            ("recompute, geodesic", min(timeit.repeat(run_geodesic, number=2, repeat=3)) * number / 2),
+            ("recompute, python", min(timeit.repeat(python_index.recompute, number=number, repeat=3))),
+        ]
+        if NUMPY_AVAILABLE:
+            recompute.append(("recompute, numpy", min(timeit.repeat(index.recompute, number=number, repeat=3))))
+
+        number = 200
+        results = [
+            ("farthest, scan", min(timeit.repeat(run_scan, number=number, repeat=3))),
+            ("farthest, heap", min(timeit.repeat(run_index, number=number, repeat=3))),
+            ("within 500m, scan", min(timeit.repeat(run_scan_within, number=number, repeat=3))),
+            ("within 500m, grid", min(timeit.repeat(run_index_within, number=number, repeat=3))),
+        ] + recompute
+
+        print(f"{count} vessels")
+        for name, duration in results:
+            print(f"  {name:20s} {duration / number * 1e6:8.2f} us/call")
+
+
+if __name__ == '__main__':
+    main()
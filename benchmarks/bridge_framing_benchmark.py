@@ -0,0 +1,73 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Measures the Python side cost of decoding an AIS flood (129039) from nmea_bridge.js stdout,
+with the JSON lines framing compared to binary frames carrying only the fields.
+Run with : python3 benchmarks/bridge_framing_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import timeit
+
+from bridge_framing import StreamDecoder, encode_frame, FRAME_NMEA
+
+
+def ais_message(index):
+    return {'canId': 301469618, 'prio': 4, 'src': 43, 'dst': 255, 'pgn': 129039, 'timestamp': '2025-06-06T17:35:03.931Z', 'input': [],
+            'fields': {'Message ID': 'Standard Class B position report', 'Repeat Indicator': 'Initial', 'User ID': 316000000 + index,
+                       'Longitude': -60.9602 + index * 1e-5, 'Latitude': 14.0848, 'Position Accuracy': 'Low', 'RAIM': 'not in use',
+                       'Time Stamp': '13', 'COG': 2.1, 'SOG': 0.05, 'Communication State': 393222, 'AIS Transceiver information': 'Channel A VDL reception',
+                       'Heading': None, 'Regional Application B': 0, 'Unit type': 'CS', 'Integrated Display': 'No', 'DSC': 'Yes', 'Band': 'Entire marine band',
+                       'Can handle Msg 22': 'Yes', 'AIS mode': 'Autonomous', 'AIS communication state': 'ITDMA'},
+            'description': 'AIS Class B Position Report'}
+
+
+def main():
+    count = 10000
+    messages = [ais_message(i) for i in range(count)]
+
+    json_stream = b''.join((json.dumps({'event': 'on_NMEA_message', 'message': message}) + '\n').encode() for message in messages)
+    binary_stream = b''.join(encode_frame(FRAME_NMEA, json.dumps(message['fields']).encode(), message['pgn'], message['src'], message['dst'], message['prio']) for message in messages)
+
+    def decode_json():
+        decoder = StreamDecoder()
+        decoder.feed(json_stream)
+        for kind, pgn, src, dst, prio, payload in decoder.messages():
+            message = json.loads(payload.decode())['message']
+
+    def decode_binary():
+        decoder = StreamDecoder()
+        decoder.binary = True
+        decoder.feed(binary_stream)
+        for kind, pgn, src, dst, prio, payload in decoder.messages():
+            message = {'pgn': pgn, 'src': src, 'dst': dst, 'prio': prio, 'fields': json.loads(payload)}
+
+    for name, stream, run in [("json lines", json_stream, decode_json), ("binary frames", binary_stream, decode_binary)]:
+        elapsed = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{name:15s} {len(stream) / count:6.0f} bytes/message, {elapsed / count * 1e6:6.2f} us/message")
+
+
+if __name__ == '__main__':
+    main()
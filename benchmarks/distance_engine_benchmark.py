@@ -0,0 +1,82 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Compares the planar DistanceEngine with a full geodesic solve for anchoring distances.
+Run with : python3 benchmarks/distance_engine_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../gps_providers'))
+
+import random
+import timeit
+
+from distance_engine import DistanceEngine, LocalTangentPlane, geodesic_distance
+from abstract_gps_provider import GPSPosition
+
+
+def main():
+    rnd = random.Random(1)
+    drop_point = GPSPosition(18.5060715, -64.3725071)
+
+    # positions swinging around the drop point, up to 80m away
+    positions = []
+    for i in range(1000):
+        positions.append(GPSPosition(drop_point.latitude + rnd.uniform(-0.0007, 0.0007), drop_point.longitude + rnd.uniform(-0.0007, 0.0007)))
+
+    engine = DistanceEngine(geodesic_band=5)
+    engine.set_origin(drop_point)
+    plane = LocalTangentPlane(drop_point)
+    boundary = 50 + 15
+
+    def run_geodesic():
+        for p in positions:
+            geodesic_distance(drop_point, p)
+
+    def run_planar():
+        for p in positions:
+            plane.distance(p.latitude, p.longitude)
+
+    def run_engine():
+        for p in positions:
+            engine.distance(drop_point, p, boundary)
+
+    number = 20
+    results = [
+        ("geodesic", min(timeit.repeat(run_geodesic, number=number, repeat=3))),
+        ("planar", min(timeit.repeat(run_planar, number=number, repeat=3))),
+        ("engine (band 5m)", min(timeit.repeat(run_engine, number=number, repeat=3))),
+    ]
+
+    calls = number * len(positions)
+    for name, duration in results:
+        print(f"{name:20s} {duration / calls * 1e6:8.2f} us/call")
+
+    print(f"engine geodesic fallback ratio: {engine.geodesic_count / (engine.geodesic_count + engine.planar_count) * 100:.1f}%")
+
+    max_error = max(abs(plane.distance(p.latitude, p.longitude) - geodesic_distance(drop_point, p)) for p in positions)
+    print(f"max planar error: {max_error * 1000:.3f} mm")
+
+
+if __name__ == '__main__':
+    main()
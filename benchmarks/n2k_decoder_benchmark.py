@@ -0,0 +1,75 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Measures the Python side cost of receiving the PGNs the service listens to, decoded natively from raw frames
+compared to the nmea_bridge.js path, where canboatjs decodes them and the service only parses binary frames.
+The Node.js side of that path (canboatjs parsing and JSON encoding) runs in another process and is not included.
+Run with : python3 benchmarks/n2k_decoder_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import timeit
+
+from n2k_decoder import N2KDecoder, read_candump
+from bridge_framing import StreamDecoder, encode_frame, FRAME_NMEA
+
+
+CANDUMP_PATH = os.path.join(os.path.dirname(__file__), '..', 'tests', 'data', 'anchorage.candump')
+
+
+def main():
+    with open(CANDUMP_PATH) as candump:
+        frames = [(can_id, data) for timestamp, can_id, data in read_candump(candump)]
+
+    decoder = N2KDecoder()
+    messages = [message for message in (decoder.decode_frame(can_id, data) for can_id, data in frames) if message is not None]
+
+    repeat = 1000
+    frames = frames * repeat
+    count = len(messages) * repeat
+
+    # what nmea_bridge.js would send for the same messages
+    binary_stream = b''.join(encode_frame(FRAME_NMEA, json.dumps(message['fields']).encode(), message['pgn'], message['src'], message['dst'], message['prio']) for message in messages) * repeat
+
+    def decode_native():
+        decoder = N2KDecoder()
+        for can_id, data in frames:
+            message = decoder.decode_frame(can_id, data)
+
+    def decode_bridge():
+        decoder = StreamDecoder()
+        decoder.binary = True
+        decoder.feed(binary_stream)
+        for kind, pgn, src, dst, prio, payload in decoder.messages():
+            message = {'pgn': pgn, 'src': src, 'dst': dst, 'prio': prio, 'fields': json.loads(payload)}
+
+    print(f"{len(frames) // repeat} frames, {count // repeat} messages (fast packet GNSS, AIS, alert and config, single frame heading, depth, wind...)")
+    for name, run in [("native frames", decode_native), ("bridge frames", decode_bridge)]:
+        elapsed = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{name:15s} {elapsed / count * 1e6:6.2f} us/message")
+
+
+if __name__ == '__main__':
+    main()
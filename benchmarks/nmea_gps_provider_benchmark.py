@@ -0,0 +1,91 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Measures main loop timer churn of NMEAGPSProvider with 3 GNSS sources sending 129029 at 10Hz,
+compared to the previous implementation re-creating an invalidate timer for every fix.
+Run with : python3 benchmarks/nmea_gps_provider_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../gps_providers'))
+
+import timeit
+
+from nmea_gps_provider import NMEAGPSProvider
+
+
+class CountingTimerProvider(object):
+    """Counts sources added and removed like GLib would"""
+
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+
+    def timeout_add(self, delay, *args, **kwargs):
+        self.added += 1
+        return self.added
+
+    def source_remove(self, id):
+        self.removed += 1
+
+
+class TimerInvalidatedNMEAGPSProvider(NMEAGPSProvider):
+    """Previous behaviour, an invalidate timer re-created for every fix"""
+
+    def _on_gnss_position_data(self, nmea_message):
+        super()._on_gnss_position_data(nmea_message)
+        if nmea_message['src'] in self._gps_positions:
+            self._add_timer('invalidate_'+ str(nmea_message['src']), lambda: self._gps_positions.pop(nmea_message['src'], None), self._INVALIDATE_DURATION)
+
+
+class MockBridge(object):
+    def add_pgn_handler(self, pgn, handler, **kwargs):
+        if pgn == 129029:
+            self.handler = handler
+
+
+def fix_message(src, index):
+    return {'src': src, 'pgn': 129029, 'fields': {'Latitude': 14.0848 + index * 1e-7, 'Longitude': -60.9602, 'Method': 'GNSS fix'}}
+
+
+def main():
+    sources = [3, 43, 101]
+    rate = 10
+    duration = 60
+    messages = [fix_message(src, i) for i in range(rate * duration) for src in sources]
+
+    for name, provider_class in [("timer per fix", TimerInvalidatedNMEAGPSProvider), ("receive timestamp", NMEAGPSProvider)]:
+        timer_provider = CountingTimerProvider()
+        bridge = MockBridge()
+        provider = provider_class(lambda: timer_provider, bridge)
+
+        def run():
+            for message in messages:
+                bridge.handler(message)
+
+        elapsed = timeit.timeit(run, number=1)
+        print(f"{name:20s} {timer_provider.added:6d} sources added, {timer_provider.removed:6d} removed, {elapsed / len(messages) * 1e6:6.2f} us/message")
+
+
+if __name__ == '__main__':
+    main()
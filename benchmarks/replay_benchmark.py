@@ -0,0 +1,171 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Replays a synthetic 6 hours capture of a crowded anchorage (2 GNSS, 60 AIS targets, instruments) through the
+controller, the NMEA GPS provider and the connectors, as fast as possible on a virtual clock.
+The capture is what NMEABridge records, so PGNs throttled by nmea_bridge.js are at their throttled rate.
+DBusConnector, which handles AIS targets, is only included when the dbus module is available.
+Run with : python3 benchmarks/replay_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../gps_providers'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../connectors'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../ext/velib_python/test'))
+
+import math
+import random
+import tempfile
+import timeit
+
+from bridge_replay import CaptureWriter, ReplayBridge, read_capture
+from anchor_alarm_controller import AnchorAlarmController
+from nmea_gps_provider import NMEAGPSProvider
+from nmea_alert_connector import NMEAAlertConnector
+from nmea_ais_anchor_connector import NMEAAISAnchorConnector
+from nmea_ydab_connector import NMEAYDABConnector
+from nmea_sog_rpm_connector import NMEASOGRPMConnector
+from nmea_ds_connector import NMEADSConnector
+from mock_settings_device import MockSettingsDevice
+
+ANCHOR = (18.5060715, -64.3725071)
+DURATION = 6 * 3600
+AIS_TARGETS = 60
+
+
+class CaptureClock(object):
+    def __init__(self):
+        self.now = 1700000000
+
+    def __call__(self):
+        return self.now
+
+
+def offset(east, north):
+    return ANCHOR[0] + north / 111320, ANCHOR[1] + east / (111320 * math.cos(math.radians(ANCHOR[0])))
+
+
+def write_capture(path):
+    rnd = random.Random(42)
+    clock = CaptureClock()
+    writer = CaptureWriter(path, max_bytes=100 * 1024 * 1024, clock=clock)
+    start = clock.now
+
+    vessels = [(244000000 + i, rnd.uniform(-800, 800), rnd.uniform(-800, 800), rnd.uniform(0, 30)) for i in range(AIS_TARGETS)]
+
+    count = 0
+    for tenth in range(DURATION * 10):
+        second, step = divmod(tenth, 10)
+        clock.now = start + tenth / 10
+
+        # swinging on 40m of chain
+        swing = math.radians(second / 600 * 360)
+        latitude, longitude = offset(40 * math.sin(swing), 40 * math.cos(swing))
+
+        messages = []
+        if step % 2 == 0:
+            messages.append({'pgn': 129026, 'src': 3, 'fields': {'COG Reference': 'True', 'COG': swing % (2 * math.pi), 'SOG': 0.2}})
+
+        if step == 0:
+            for src in [3, 43]:
+                messages.append({'pgn': 129029, 'src': src, 'fields': {'Latitude': latitude, 'Longitude': longitude, 'Method': 'GNSS fix', 'HDOP': 0.8, 'PDOP': 1.4, 'Number of SVs': 12}})
+            messages.append({'pgn': 127250, 'src': 5, 'fields': {'Heading': (swing + math.pi) % (2 * math.pi)}})
+            messages.append({'pgn': 130306, 'src': 7, 'fields': {'Wind Speed': 8.5, 'Wind Angle': 1.2, 'Reference': 'Apparent'}})
+            if second % 5 == 0:
+                messages.append({'pgn': 128267, 'src': 7, 'fields': {'Depth': 6.2, 'Offset': 0}})
+
+        for user_id, east, north, phase in vessels:
+            if (tenth + int(phase * 10)) % 300 == 0:
+                vessel_latitude, vessel_longitude = offset(east + 20 * math.sin(swing), north)
+                messages.append({'pgn': 129039, 'src': 1, 'fields': {'User ID': user_id, 'Latitude': vessel_latitude, 'Longitude': vessel_longitude, 'COG': 0, 'SOG': 0, 'Heading': 0}})
+            if (tenth + int(phase * 10)) % 3600 == 0:
+                messages.append({'pgn': 129810, 'src': 1, 'fields': {'User ID': user_id, 'Beam': 4.5, 'Length': 12}})
+
+        for message in messages:
+            message.update(dst=255, prio=2)
+            writer.write(message)
+        count += len(messages)
+
+    writer.close()
+    return count
+
+
+def create_stack(bridge):
+    timer_provider = lambda: bridge.clock
+    settings_provider = lambda settings, cb: MockSettingsDevice(settings, cb)
+
+    controller = AnchorAlarmController(timer_provider, MockSettingsDevice, clock=bridge.clock)
+    controller.register_gps_provider(NMEAGPSProvider(timer_provider, bridge, clock=bridge.clock, settings_provider=settings_provider))
+
+    connectors = [NMEAAlertConnector(timer_provider, settings_provider, bridge),
+                  NMEAAISAnchorConnector(timer_provider, settings_provider, bridge),
+                  NMEAYDABConnector(timer_provider, settings_provider, bridge),
+                  NMEASOGRPMConnector(timer_provider, settings_provider, bridge),
+                  NMEADSConnector(timer_provider, settings_provider, bridge)]
+
+    try:
+        import dbus
+        from dbus_connector import DBusConnector
+        from mock_dbus_service import MockDbusService
+        connectors.append(DBusConnector(timer_provider, settings_provider, bridge, MockDbusService("com.victronenergy.anchoralarm.benchmark")))
+    except ImportError:
+        print("dbus not available, DBusConnector and AIS targets handling skipped")
+
+    for connector in connectors:
+        controller.register_connector(connector)
+
+    # anchor down after a minute, chain out after 5
+    bridge.clock.timeout_add(60 * 1000, controller.trigger_anchor_down)
+    bridge.clock.timeout_add(5 * 60 * 1000, controller.trigger_chain_out)
+    return controller
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'anchorage.capture')
+        count = write_capture(path)
+        print(f"capture: {count} messages, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        # decoding the capture alone
+        elapsed = timeit.timeit(lambda: sum(1 for message in read_capture(path)), number=1)
+        print(f"{'read capture':20s} {elapsed:6.2f} s, {count / elapsed:9.0f} messages/s")
+
+        bridge = ReplayBridge(read_capture(path))
+        controller = create_stack(bridge)
+
+        elapsed = timeit.timeit(bridge.run, number=1)
+        print(f"{'replay':20s} {elapsed:6.2f} s, {count / elapsed:9.0f} messages/s, {DURATION / elapsed:6.0f}x real time")
+        print(f"{bridge.dispatched} handler calls, {len(bridge.sent)} messages sent, {bridge.get_suppression_stats()}")
+        print(f"final state: {controller._anchor_alarm.get_current_state().state}")
+
+        # DBusConnector takes a snapshot every 10s, then this only covers the last 10s of the capture
+        snapshot = bridge.get_bridge_stats()
+        print(f"time spent in handlers over {snapshot.duration:.0f}s of capture:")
+        for name, stats in sorted(snapshot.handlers.items(), key=lambda item: -item[1].total):
+            if stats.count == 0:
+                continue
+            print(f"  {name:52s} {stats.count:7d} calls, {stats.average * 1e6:7.2f} us average, {stats.p95 * 1e6:7.0f} us p95, {stats.total:6.3f} s")
+
+
+if __name__ == '__main__':
+    main()
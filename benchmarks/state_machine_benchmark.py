@@ -0,0 +1,86 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Compares the compiled StateMachine used by AnchorAlarmModel with the transitions library it replaced.
+Run with : python3 benchmarks/state_machine_benchmark.py
+"""
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../ext'))
+
+import timeit
+
+from anchor_alarm_model import AnchorAlarmModel
+
+
+class TransitionsAnchorAlarmModel(AnchorAlarmModel):
+    """Same model, with the machine replaced by transitions.Machine like it used to be"""
+
+    def __init__(self):
+        from transitions import Machine
+
+        super().__init__(None)
+        compiled = self._machine
+
+        # remove compiled triggers so transitions can add its own
+        for trigger in set(transition['trigger'] for transition in compiled.transitions):
+            delattr(self, trigger)
+
+        self._machine = Machine(model=self, states=compiled.states, transitions=compiled.transitions, initial='DISABLED',
+                                after_state_change=self._after_state_change, ignore_invalid_triggers=True)
+
+
+def cycle(model):
+    # one anchoring with dragging, mute and no GPS, plus a few ignored triggers
+    model.on_set_drop_point(None)
+    model.on_set_radius(30)
+    model.on_anchor_dragging()
+    model.on_alarm_muted()
+    model.on_anchor_dragging()
+    model.on_tolerance_updated()
+    model.on_no_gps()
+    model.on_alarm_muted()
+    model.on_no_gps()
+    model.on_in_radius()
+    model.on_set_drop_point(None)   # ignored
+    model.on_alarm_muted()          # ignored
+    model.on_anchor_up()
+    model.on_error()
+
+TRIGGERS_PER_CYCLE = 14
+
+
+def main():
+    start = timeit.default_timer()
+    import transitions
+    import_duration = timeit.default_timer() - start
+    print(f"transitions import         {import_duration * 1000:8.2f} ms")
+
+    number = 2000
+    for name, model in [("transitions.Machine", TransitionsAnchorAlarmModel()), ("StateMachine", AnchorAlarmModel(None))]:
+        duration = min(timeit.repeat(lambda: cycle(model), number=number, repeat=3))
+        print(f"{name:25s} {number * TRIGGERS_PER_CYCLE / duration:12,.0f} triggers/s")
+
+
+if __name__ == '__main__':
+    main()
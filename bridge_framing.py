@@ -0,0 +1,92 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import struct
+
+
+# stdout framing modes of nmea_bridge.js, negotiated with the initCAN command
+FRAMING_JSON = 'json'
+FRAMING_BINARY = 'binary'
+
+# binary frame kinds. An event payload is the same JSON object as in JSON mode, an NMEA payload only contains the fields
+FRAME_EVENT = 0
+FRAME_NMEA = 1
+
+# payload length, kind, prio, src, dst, pgn. Must match writeFrame in nmea_bridge.js
+FRAME_HEADER = struct.Struct('>IBBBBI')
+
+
+def encode_frame(kind, payload, pgn=0, src=0, dst=0, prio=0):
+    """Builds a binary frame, payload being bytes"""
+    return FRAME_HEADER.pack(len(payload), kind, prio, src, dst, pgn) + payload
+
+
+class StreamDecoder(object):
+    """Splits the nmea_bridge.js stdout stream in messages.
+    The stream starts with newline terminated JSON lines and switches to binary frames once binary is set.
+    Incomplete messages are kept until the next feed."""
+
+    def __init__(self):
+        self.binary = False
+        self._buffer = bytearray()
+
+    def reset(self):
+        self.binary = False
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+
+    def pending_bytes(self):
+        """Number of bytes of an incomplete message waiting for more data"""
+        return len(self._buffer)
+
+    def messages(self):
+        """Yields (kind, pgn, src, dst, prio, payload) for every complete message.
+        JSON lines are returned as FRAME_EVENT with the line as payload. binary can be changed while iterating"""
+        buffer = self._buffer
+        header_size = FRAME_HEADER.size
+        start = 0
+        try:
+            while start < len(buffer):
+                if self.binary:
+                    if len(buffer) - start < header_size:
+                        break
+
+                    length, kind, prio, src, dst, pgn = FRAME_HEADER.unpack_from(buffer, start)
+                    end = start + header_size + length
+                    if end > len(buffer):
+                        break
+
+                    payload = bytes(buffer[start + header_size:end])
+                    start = end
+                    yield kind, pgn, src, dst, prio, payload
+
+                else:
+                    end = buffer.find(b"\n", start)
+                    if end == -1:
+                        break
+
+                    line = bytes(buffer[start:end]).strip()
+                    start = end + 1
+                    if line:
+                        yield FRAME_EVENT, 0, 0, 0, 0, line
+        finally:
+            del buffer[:start]
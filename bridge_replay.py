@@ -0,0 +1,292 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import json
+import heapq
+import time
+
+from bridge_scheduler import ChangeSuppressor, MessageTemplate, merge_template
+from bridge_stats import BridgeStats, CommandStats, ReadStats, handler_name
+from bridge_throttle import HandlerThrottle
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# interval in seconds used when a handler asks for throttle=True, same as NMEABridge
+DEFAULT_THROTTLE_INTERVAL = 1
+
+
+class CaptureWriter(object):
+    """Appends inbound NMEA messages to a capture file, one compact JSON array per line : [time, pgn, src, dst, prio, fields].
+    When the file grows over max_bytes it is renamed to path.1, path.1 to path.2 and so on, keeping backup_count older files"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._clock = clock
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def write(self, message):
+        line = json.dumps([round(self._clock(), 3), message.get('pgn'), message.get('src'), message.get('dst'), message.get('prio'), message.get('fields', {})],
+                          separators=(',', ':')) + '\n'
+
+        if self._size > 0 and self._size + len(line) > self.max_bytes:
+            self._rotate()
+
+        self._file.write(line)
+        self._size += len(line)
+
+    def _rotate(self):
+        self._file.close()
+
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(self.path +'.'+ str(i)):
+                    os.replace(self.path +'.'+ str(i), self.path +'.'+ str(i + 1))
+            os.replace(self.path, self.path +'.1')
+        else:
+            os.remove(self.path)
+
+        self._open()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def capture_files(path):
+    """Files of a capture, oldest first"""
+    rotated = []
+    i = 1
+    while os.path.exists(path +'.'+ str(i)):
+        rotated.append(path +'.'+ str(i))
+        i += 1
+
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+
+def read_capture(path):
+    """Yields (time, message) from a capture and its rotated files. Truncated lines are skipped"""
+    for file_path in capture_files(path):
+        with open(file_path, encoding='utf-8') as capture:
+            for line in capture:
+                try:
+                    timestamp, pgn, src, dst, prio, fields = json.loads(line)
+                except ValueError:
+                    logger.warning("Invalid capture line in "+ file_path +": "+ line[:80])
+                    continue
+
+                yield timestamp, {'pgn': pgn, 'src': src, 'dst': dst, 'prio': prio, 'fields': fields}
+
+
+class VirtualClock(object):
+    """Virtual time in seconds, only moving when advance_to is called.
+    Also a timer provider with the GLib API used by the service, timers firing in virtual time"""
+
+    def __init__(self, start=0):
+        self._now = start
+        self._timers = []
+        self._cancelled = set()
+        self._next_id = 0
+
+    def __call__(self):
+        return self._now
+
+    def timeout_add(self, interval, callback, *args):
+        self._next_id += 1
+        heapq.heappush(self._timers, (self._now + interval / 1000, self._next_id, interval / 1000, callback, args))
+        return self._next_id
+
+    def timeout_add_seconds(self, interval, callback, *args):
+        return self.timeout_add(interval * 1000, callback, *args)
+
+    def idle_add(self, callback, *args):
+        return self.timeout_add(0, callback, *args)
+
+    def source_remove(self, id):
+        self._cancelled.add(id)
+
+    def advance_to(self, time):
+        """Moves to time, firing due timers in order. A timer returning True fires again after its interval"""
+        while len(self._timers) and self._timers[0][0] <= time:
+            due, id, interval, callback, args = heapq.heappop(self._timers)
+            if id in self._cancelled:
+                self._cancelled.discard(id)
+                continue
+
+            self._now = max(self._now, due)
+            if callback(*args):
+                # an idle callback asking to run again would never let time move
+                heapq.heappush(self._timers, (self._now + max(interval, 0.001), id, interval, callback, args))
+
+        self._now = max(self._now, time)
+
+
+class ReplayBridge(object):
+    """Feeds a capture to PGN handlers with the same API as NMEABridge, without any CAN device nor Node.js process.
+    Code under test gets its time and timers from clock, a VirtualClock moved to each message time before it is dispatched.
+    speed : 1 replays in real time, N times faster with N, as fast as possible with 0.
+    Sent messages are kept in sent as (time, message). get_bridge_stats gives rates in capture time and the real time spent in each handler"""
+
+    def __init__(self, capture, speed=0, clock=None, sleep=time.sleep):
+        self.clock = clock if clock is not None else VirtualClock()
+        self.speed = speed
+        self.sent = []
+        self.error_handler = None
+
+        self._capture = capture
+        self._sleep = sleep
+        self._handlers = {}
+        self._templates = {}
+        self._suppressor = ChangeSuppressor(self.clock)
+        self._stats = BridgeStats(self.clock)
+        self.dispatched = 0
+
+    def add_pgn_handler(self, pgn, handler, throttle=False, fields=None):
+        if throttle is True:
+            throttle = DEFAULT_THROTTLE_INTERVAL
+
+        self.remove_pgn_handler(pgn, handler)
+
+        # throttled with the virtual clock timers, like NMEABridge does
+        handler_info = {'handler': handler, 'throttle': throttle or 0, 'histogram': self._stats.handler_histogram(handler_name(handler))}
+        handler_info['throttler'] = HandlerThrottle(throttle or 0, lambda message: self._call_handler(handler_info, message), self.clock, self.clock)
+        self._handlers.setdefault(pgn, []).append(handler_info)
+
+    def remove_pgn_handler(self, pgn, handler):
+        if pgn in self._handlers:
+            for h in self._handlers[pgn]:
+                if h['handler'] == handler:
+                    h['throttler'].cancel()
+            self._handlers[pgn] = [h for h in self._handlers[pgn] if h['handler'] != handler]
+            if not self._handlers[pgn]:
+                del self._handlers[pgn]
+
+    def send_nmea(self, nmea_message, priority=None):
+        if self._suppressor.should_send(nmea_message):
+            self.sent.append((self.clock(), nmea_message))
+
+    def register_template(self, name, nmea_message):
+        self._templates[name] = MessageTemplate(name, nmea_message)
+
+    def send_template(self, name, fields=None, priority=None):
+        template = self._templates[name]
+        if self._suppressor.should_send_template(template, fields or {}):
+            self.sent.append((self.clock(), merge_template(template.message, fields)))
+
+    def enable_change_suppression(self, pgn, keepalive):
+        self._suppressor.enable(pgn, keepalive)
+
+    def get_suppression_stats(self):
+        return self._suppressor.get_stats()
+
+    def get_bridge_stats(self):
+        return self._stats.snapshot()
+
+    def get_command_stats(self):
+        return CommandStats(sent=len(self.sent), acked=len(self.sent))
+
+    def get_read_stats(self):
+        return ReadStats()
+
+    def get_restart_count(self):
+        return 0
+
+    def run(self, duration=None):
+        """Replays the capture, or only its first duration seconds. Returns the number of messages replayed"""
+        start_time = None
+        start_clock = self.clock()
+        start_real = time.monotonic()
+        count = 0
+
+        for timestamp, message in self._capture:
+            if start_time is None:
+                start_time = timestamp
+
+            elapsed = timestamp - start_time
+            if duration is not None and elapsed > duration:
+                break
+
+            if self.speed > 0:
+                wait = elapsed / self.speed - (time.monotonic() - start_real)
+                if wait > 0:
+                    self._sleep(wait)
+
+            self.clock.advance_to(start_clock + elapsed)
+            self._dispatch(message)
+            count += 1
+
+        if duration is not None:
+            self.clock.advance_to(start_clock + duration)
+
+        return count
+
+    def _dispatch(self, message):
+        self._stats.count_message(message['pgn'], message['src'])
+
+        handlers = self._handlers.get(message['pgn'])
+        if handlers is None:
+            return
+
+        for handler_info in handlers:
+            if handler_info['throttle'] > 0:
+                handler_info['throttler'].push(message)
+            else:
+                self._call_handler(handler_info, message)
+
+    def _call_handler(self, handler_info, message):
+        self.dispatched += 1
+        start = time.perf_counter()
+        handler_info['handler'](message)
+        handler_info['histogram'].record(time.perf_counter() - start)
+
+
+
+if __name__ == '__main__':
+    import sys
+    from argparse import ArgumentParser
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = ArgumentParser(description="Replays a capture recorded by NMEABridge, printing the PGNs given or all of them")
+    parser.add_argument('capture', help="capture file, rotated files are read too")
+    parser.add_argument('--speed', type=float, default=1, help="1 for real time, N for N times faster, 0 for as fast as possible")
+    parser.add_argument('pgns', type=int, nargs='*')
+    args = parser.parse_args()
+
+    pgns = args.pgns
+    if len(pgns) == 0:
+        pgns = sorted(set(message['pgn'] for timestamp, message in read_capture(args.capture)))
+
+    bridge = ReplayBridge(read_capture(args.capture), args.speed)
+    for pgn in pgns:
+        bridge.add_pgn_handler(pgn, lambda message: print("%10.3f" % bridge.clock(), message))
+
+    count = bridge.run()
+    print(str(count) +" messages replayed in "+ str(round(bridge.clock(), 3)) +"s of capture time", file=sys.stderr)
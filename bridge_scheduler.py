@@ -0,0 +1,299 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import time
+from collections import deque, namedtuple
+
+
+# outbound priority classes, lower goes first. Control commands (initCAN, filters) are never rate limited nor dropped
+PRIORITY_CONTROL = 0
+PRIORITY_ALARM = 1
+PRIORITY_STATUS = 2
+PRIORITY_AIS = 3
+
+# class used by send_nmea when none is given
+_PGN_PRIORITIES = {
+    126983: PRIORITY_ALARM,     # alert
+    126985: PRIORITY_ALARM,     # alert text
+    127502: PRIORITY_ALARM,     # switch bank control, YDAB alarm switching
+    129039: PRIORITY_AIS,       # AIS class B position report
+    129809: PRIORITY_AIS,       # AIS class B static data
+    129810: PRIORITY_AIS,
+}
+
+# (messages per second, burst) per class, None if not rate limited.
+# Keeps our own traffic to a small share of the ~1800 frames/s of a 250kbit/s NMEA 2000 bus
+DEFAULT_RATES = {
+    PRIORITY_CONTROL: None,
+    PRIORITY_ALARM: None,
+    PRIORITY_STATUS: (10, 20),
+    PRIORITY_AIS: (2, 6),
+}
+
+# per class statistics
+ClassStats = namedtuple('ClassStats', ['sent', 'dropped', 'queued'], defaults=[0, 0, 0])
+
+# statistics of the change suppression cache. sent : messages let through, suppressed : identical messages not sent again
+SuppressionStats = namedtuple('SuppressionStats', ['sent', 'suppressed', 'cached'], defaults=[0, 0, 0])
+
+# fields identifying what a message is about, beside its PGN and destination
+_INSTANCE_FIELDS = ['Instance', 'Alert Type', 'User ID']
+
+# a sender repeating a message every keepalive seconds must not be suppressed because its timer fired slightly early
+_KEEPALIVE_TOLERANCE = 0.5
+
+
+def merge_template(template, fields):
+    """Complete message sent by send_template. Variable fields go in the template fields, or at the top level
+    for messages written without a fields object. Must match mergeTemplate in nmea_bridge.js"""
+    if not fields:
+        return template
+
+    if 'fields' in template:
+        return dict(template, fields=dict(template['fields'], **fields))
+
+    return dict(template, **fields)
+
+
+class MessageTemplate(object):
+    """Message registered with register_template, serialized once : each send only serializes its variable fields"""
+
+    def __init__(self, name, nmea_message):
+        self.name = name
+        self.message = nmea_message
+        self.pgn = nmea_message.get('pgn')
+
+        # constant parts of the sendTemplate command line, and of what ChangeSuppressor compares
+        self._command_prefix = '{"command": "sendTemplate", "template": ' + json.dumps(name) + ', "fields": '
+        self.payload = json.dumps(nmea_message, sort_keys=True)
+
+    def serialize_command(self, command):
+        """sendTemplate command line, json.dumps(command) with the keys in another order"""
+        return self._command_prefix + json.dumps(command['fields']) + ', "id": ' + json.dumps(command['id']) + '}'
+
+
+def get_nmea_priority(nmea_message):
+    """Default priority class of an outgoing NMEA message"""
+    return _PGN_PRIORITIES.get(nmea_message.get('pgn'), PRIORITY_STATUS)
+
+
+class TokenBucket(object):
+    """Allows rate messages per second on average, up to burst messages at once"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._last_refill = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def try_consume(self):
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+
+        return False
+
+    def delay(self):
+        """Seconds until a message is allowed"""
+        self._refill()
+        return max(0, (1 - self._tokens) / self.rate)
+
+
+class OutboundScheduler(object):
+    """Orders commands waiting to be written to nmea_bridge.js.
+    Highest priority class first, FIFO within a class, each class limited by its own token bucket.
+    When max_queued commands are waiting, the oldest command of the lowest priority class is dropped.
+    Control and alarm commands are never dropped."""
+
+    def __init__(self, max_queued=100, rates=None, clock=time.monotonic):
+        if rates is None:
+            rates = DEFAULT_RATES
+
+        self.max_queued = max_queued
+        self._queues = {priority: deque() for priority in rates}
+        self._buckets = {priority: TokenBucket(rate[0], rate[1], clock) for priority, rate in rates.items() if rate is not None}
+        self._priorities = sorted(rates)
+        self._stats = {priority: ClassStats() for priority in rates}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def push(self, command, priority):
+        """Queues a command, returns the command dropped to make room for it, if any"""
+        return self._add(command, priority, False)
+
+    def requeue(self, command, priority):
+        """Puts back a command that was written but never answered, ahead of the others of its class"""
+        return self._add(command, priority, True)
+
+    def _add(self, command, priority, first):
+        if priority not in self._queues:
+            priority = self._priorities[-1]
+
+        if self._length >= self.max_queued:
+            dropped = self._drop(command, priority)
+            if dropped is command:
+                return command
+        else:
+            dropped = None
+
+        if first:
+            self._queues[priority].appendleft(command)
+        else:
+            self._queues[priority].append(command)
+        self._length += 1
+        return dropped
+
+    def _drop(self, command, priority):
+        # oldest command of the least important class, or the incoming one if it is even less important
+        drop_priority = next((p for p in reversed(self._priorities) if len(self._queues[p])), None)
+
+        if drop_priority is not None and drop_priority > PRIORITY_ALARM and drop_priority >= priority:
+            self._count(drop_priority, 'dropped')
+            self._length -= 1
+            return self._queues[drop_priority].popleft()
+
+        if priority > PRIORITY_ALARM:
+            self._count(priority, 'dropped')
+            return command
+
+        # only control and alarm commands are waiting, go above the limit
+        return None
+
+    def pop(self):
+        """Next command allowed to be written, None if nothing is queued or all classes are rate limited"""
+        for priority in self._priorities:
+            queue = self._queues[priority]
+            if len(queue) == 0:
+                continue
+
+            bucket = self._buckets.get(priority)
+            if bucket is not None and not bucket.try_consume():
+                continue
+
+            self._length -= 1
+            self._count(priority, 'sent')
+            return queue.popleft()
+
+        return None
+
+    def next_delay(self):
+        """Seconds until a queued command can be popped, None if nothing is queued"""
+        delays = [self._buckets[priority].delay() if priority in self._buckets else 0 for priority in self._priorities if len(self._queues[priority])]
+        return min(delays) if len(delays) else None
+
+    def _count(self, priority, field):
+        stats = self._stats[priority]
+        self._stats[priority] = stats._replace(**{field: getattr(stats, field) + 1})
+
+    def get_stats(self):
+        """Returns priority class -> ClassStats"""
+        return {priority: stats._replace(queued=len(self._queues[priority])) for priority, stats in self._stats.items()}
+
+
+class ChangeSuppressor(object):
+    """Suppresses outgoing messages identical to the last one sent for the same (PGN, destination, instance).
+    Only applies to enabled PGNs. Identical messages are still sent every keepalive seconds of their PGN,
+    the interval their sender repeats them at, so other devices do not time us out."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._keepalives = {}
+        self._cache = {}
+        self._stats = SuppressionStats()
+
+    def enable(self, pgn, keepalive):
+        """A keepalive of 0 disables the suppression"""
+        if keepalive <= 0:
+            self.disable(pgn)
+        else:
+            self._keepalives[pgn] = keepalive
+
+    def is_enabled(self, pgn):
+        return pgn in self._keepalives
+
+    def disable(self, pgn):
+        self._keepalives.pop(pgn, None)
+        for key in [key for key in self._cache if key[0] == pgn]:
+            del self._cache[key]
+
+    def _get_key(self, nmea_message):
+        fields = nmea_message.get('fields', nmea_message)
+        instance = next((fields[name] for name in _INSTANCE_FIELDS if name in fields), None)
+        return (nmea_message.get('pgn'), nmea_message.get('dst', 255), instance)
+
+    def _get_template_key(self, template, fields):
+        key = self._get_key(template.message)
+        instance = next((fields[name] for name in _INSTANCE_FIELDS if name in fields), None)
+        return key if instance is None else (key[0], key[1], instance)
+
+    def should_send(self, nmea_message):
+        """Returns False if the message is identical to the one sent less than keepalive seconds ago"""
+        keepalive = self._keepalives.get(nmea_message.get('pgn'))
+        if keepalive is None:
+            return self._count_sent()
+
+        return self._check(self._get_key(nmea_message), json.dumps(nmea_message, sort_keys=True), keepalive)
+
+    def should_send_template(self, template, fields):
+        """should_send for merge_template(template.message, fields), only comparing the variable fields
+        with the ones last sent with that MessageTemplate, without building nor serializing the complete message"""
+        keepalive = self._keepalives.get(template.pgn)
+        if keepalive is None:
+            return self._count_sent()
+
+        return self._check(self._get_template_key(template, fields), (template.payload, json.dumps(fields, sort_keys=True)), keepalive)
+
+    def _check(self, key, payload, keepalive):
+        now = self._clock()
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == payload and now - cached[1] < keepalive - _KEEPALIVE_TOLERANCE:
+            self._stats = self._stats._replace(suppressed=self._stats.suppressed + 1)
+            return False
+
+        self._cache[key] = (payload, now)
+        return self._count_sent()
+
+    def _count_sent(self):
+        self._stats = self._stats._replace(sent=self._stats.sent + 1)
+        return True
+
+    def forget(self, nmea_message):
+        """The message never made it to the bus, the next identical one must be sent"""
+        self._cache.pop(self._get_key(nmea_message), None)
+
+    def forget_template(self, template, fields):
+        self._cache.pop(self._get_template_key(template, fields), None)
+
+    def clear(self):
+        self._cache = {}
+
+    def get_stats(self):
+        return self._stats._replace(cached=len(self._cache))
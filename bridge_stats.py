@@ -0,0 +1,131 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+
+# statistics on commands sent to nmea_bridge.js
+CommandStats = namedtuple('CommandStats', ['sent', 'acked', 'timeouts', 'dropped', 'queued', 'in_flight', 'write_buffer'], defaults=[0, 0, 0, 0, 0, 0, 0])
+
+# statistics on stdout reads. messages : lines or frames dispatched per wakeup, backlog : bytes waiting in the pipe when woken up
+ReadStats = namedtuple('ReadStats', ['wakeups', 'messages', 'last_messages', 'max_messages', 'last_backlog', 'max_backlog', 'partial_bytes'], defaults=[0, 0, 0, 0, 0, 0, 0])
+
+# durations are in seconds. total : time spent in all calls, p95 : upper bound of the histogram bucket holding the 95th percentile
+HistogramStats = namedtuple('HistogramStats', ['count', 'total', 'average', 'p95', 'max'], defaults=[0, 0, 0, 0, 0])
+
+# everything NMEABridge measured since the previous snapshot.
+# rates : (pgn, src) -> messages per second, handlers : handler name -> HistogramStats, nodejs : counters reported by nmea_bridge.js
+BridgeSnapshot = namedtuple('BridgeSnapshot', ['duration', 'rates', 'parse', 'handlers', 'commands', 'writes', 'nodejs'])
+
+# histogram buckets upper bounds, from 10us to 5s
+_LATENCY_BOUNDS = [1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5]
+
+
+def handler_name(handler):
+    """Connector class and method name of a PGN handler, eg NMEADSConnector._on_ds_change"""
+    if hasattr(handler, '__self__') and hasattr(handler, '__name__'):
+        return type(handler.__self__).__name__ +'.'+ handler.__name__
+
+    return getattr(handler, '__qualname__', repr(handler))
+
+
+class LatencyHistogram(object):
+    """Fixed buckets, recording is a bisect and a few additions"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._buckets = [0] * (len(_LATENCY_BOUNDS) + 1)
+        self._count = 0
+        self._total = 0
+        self._max = 0
+
+    def record(self, duration):
+        self._buckets[bisect_left(_LATENCY_BOUNDS, duration)] += 1
+        self._count += 1
+        self._total += duration
+        if duration > self._max:
+            self._max = duration
+
+    def get_stats(self):
+        if self._count == 0:
+            return HistogramStats()
+
+        p95 = self._max
+        threshold = self._count * 0.95
+        seen = 0
+        for i, count in enumerate(self._buckets[:-1]):
+            seen += count
+            if seen >= threshold:
+                p95 = min(_LATENCY_BOUNDS[i], self._max)
+                break
+
+        return HistogramStats(self._count, self._total, self._total / self._count, p95, self._max)
+
+
+class BridgeStats(object):
+    """Counters and latency histograms of NMEABridge hot paths, reset by every snapshot.
+    parse : decoding of messages received, commands : time between a command written and its answer,
+    writes : time between a command queued and its last byte written to the Node.js stdin"""
+
+    def __init__(self, clock=time.monotonic):
+        self.parse = LatencyHistogram()
+        self.commands = LatencyHistogram()
+        self.writes = LatencyHistogram()
+        self.nodejs = {}
+
+        self._clock = clock
+        self._messages = {}
+        self._handlers = {}
+        self._window_start = clock()
+
+    def count_message(self, pgn, src):
+        key = (pgn, src)
+        self._messages[key] = self._messages.get(key, 0) + 1
+
+    def handler_histogram(self, name):
+        """Histogram a handler records its duration to, shared by handlers of the same name"""
+        histogram = self._handlers.get(name)
+        if histogram is None:
+            histogram = self._handlers[name] = LatencyHistogram()
+
+        return histogram
+
+    def snapshot(self):
+        now = self._clock()
+        duration = now - self._window_start
+
+        rates = {key: count / duration for key, count in self._messages.items()} if duration > 0 else {}
+        snapshot = BridgeSnapshot(duration, rates, self.parse.get_stats(),
+                                  {name: histogram.get_stats() for name, histogram in self._handlers.items()},
+                                  self.commands.get_stats(), self.writes.get_stats(), dict(self.nodejs))
+
+        self._messages = {}
+        self.parse.reset()
+        self.commands.reset()
+        self.writes.reset()
+        for histogram in self._handlers.values():
+            histogram.reset()
+        self._window_start = now
+
+        return snapshot
@@ -0,0 +1,64 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class RestartBackoff(object):
+    """Decides when to restart the Node.js bridge after it exited.
+    The first restart is immediate, then the delay doubles up to max_delay.
+    Attempts are forgotten once the bridge stayed ready for stable_period seconds,
+    we only give up after max_attempts restarts in a row that never got stable."""
+
+    def __init__(self, max_attempts=10, initial_delay=0.25, max_delay=30, stable_period=60, clock=time.monotonic):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.stable_period = stable_period
+        self.attempts = 0
+        self.restarts = 0
+
+        self._clock = clock
+        self._ready_time = None
+
+    def on_exit(self):
+        """The bridge exited. Returns the delay in seconds before restarting it, None to give up"""
+        self._ready_time = None
+        self.attempts += 1
+        if self.attempts > self.max_attempts:
+            return None
+
+        self.restarts += 1
+        if self.attempts == 1:
+            return 0
+
+        return min(self.max_delay, self.initial_delay * 2 ** (self.attempts - 2))
+
+    def on_ready(self):
+        self._ready_time = self._clock()
+
+    def check_stable(self):
+        """Called periodically, forgets previous attempts once the bridge is ready for long enough"""
+        if self.attempts and self._ready_time is not None and self._clock() - self._ready_time >= self.stable_period:
+            logger.info("NMEA bridge stable for "+ str(self.stable_period) +"s, restart attempts reset")
+            self.attempts = 0
@@ -0,0 +1,78 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+
+from utils import exit_on_error
+
+
+class HandlerThrottle(object):
+    """Delivers messages at most once per interval for each source, the same way nmea_bridge.js throttles PGNs :
+    the first message right away, then the most recent one at the end of each interval.
+    timer_provider has the GLib timeout_add and source_remove API"""
+
+    def __init__(self, interval, deliver, timer_provider, clock=time.monotonic):
+        self.interval = interval
+        self._deliver = deliver
+        self._timer_provider = timer_provider
+        self._clock = clock
+
+        # src -> time of the last delivery, most recent message not delivered yet, timer delivering it
+        self._last_calls = {}
+        self._pending = {}
+        self._timers = {}
+
+        # messages replaced by a more recent one before being delivered
+        self.throttled = 0
+
+    def push(self, message):
+        src = message.get('src')
+        now = self._clock()
+
+        last_call = self._last_calls.get(src)
+        if src not in self._timers and (last_call is None or now - last_call >= self.interval):
+            self._last_calls[src] = now
+            self._deliver(message)
+            return
+
+        if src in self._pending:
+            self.throttled += 1
+        self._pending[src] = message
+
+        if src not in self._timers:
+            delay = self.interval - (now - last_call)
+            self._timers[src] = self._timer_provider.timeout_add(max(1, round(delay * 1000)), exit_on_error, self._on_timer, src)
+
+    def _on_timer(self, src):
+        del self._timers[src]
+        message = self._pending.pop(src, None)
+        if message is not None:
+            self._last_calls[src] = self._clock()
+            self._deliver(message)
+
+        return False
+
+    def cancel(self):
+        """Drops the pending messages"""
+        for timer_id in self._timers.values():
+            self._timer_provider.source_remove(timer_id)
+
+        self._timers = {}
+        self._pending = {}
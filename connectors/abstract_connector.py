@@ -26,6 +26,7 @@ from utils import AbstractTimerUtils
 
 from anchor_alarm_model import AnchorAlarmState
 from anchor_alarm_controller import AnchorAlarmController
+from anchor_alarm_controller import UPDATE_EVERY_TICK, UPDATE_ON_CHANGE
 
 
 class AbstractConnector(AbstractTimerUtils):
@@ -35,6 +36,12 @@ class AbstractConnector(AbstractTimerUtils):
 
         self.controller = None
 
+        # UPDATE_EVERY_TICK : update_state is called every second
+        # UPDATE_ON_CHANGE  : update_state is only called when the state version changed, 
+        #                     and at least every update_keepalive_interval seconds if not None
+        self.update_policy = UPDATE_EVERY_TICK
+        self.update_keepalive_interval = None
+
     def set_controller(self, controller:AnchorAlarmController):
         """Controller has :
             - trigger_anchor_down
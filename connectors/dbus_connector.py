@@ -20,6 +20,7 @@
 
 
 from re import M
+import re
 import sys
 import os
 import json
@@ -31,14 +32,15 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 
 from abstract_connector import AbstractConnector
+from ais_index import VesselIndex, bounding_box_degrees
 from anchor_alarm_controller import AnchorAlarmController
 from anchor_alarm_controller import GPSPosition
+from anchor_alarm_controller import GPSSnapshot
 from anchor_alarm_model import AnchorAlarmState
 
 from collections import deque
 import time
 import math
-from geopy.distance import geodesic
 
 
 # our own packages
@@ -57,17 +59,30 @@ class DBusConnector(AbstractConnector):
 
             'show_error_timeout': None,
 
-            'extended_status': None
+            'extended_status': None,
+
+            'bridge_diagnostics': None
         }
 
         self._previous_system_name = None
         self._system_name_error_duration = 15000
         self._ais_self_distance_threshold = 5  # meters, distance below which we consider the vessel is self
         self._ais_staleness_threshold = 60  # seconds, after which we accept lower precision data or clear heading
-        self._ais_bounding_box_degrees = 0.02  # degrees, roughly 2km bounding box for fast filtering
+        self._ais_index_cell_size = 250  # meters, size of the grid cells vessels are bucketed in
+        self._bridge_diagnostics_interval = 10  # seconds, bridge rates and durations are measured over that period
+
+        # /Diagnostics/Bridge/Rates and /Handlers paths already created, they are added as PGNs, sources and handlers show up
+        self._bridge_rate_paths = set()
+        self._bridge_handler_paths = set()
 
         self._vessels = {}
 
+        # tracked vessels other than self, by position and distance to own ship
+        self._vessel_index = VesselIndex(self._ais_index_cell_size)
+
+        # last state written to alarm paths, the model returns the same object as long as nothing changed
+        self._last_state = None
+
         # environment
         self._last_depth = None 
         self._last_awa = None
@@ -86,12 +101,14 @@ class DBusConnector(AbstractConnector):
         self._create_vessel('self')
         self._set_self_beam_length()
 
-        self._bridge.add_pgn_handler(129026, self._on_sog, throttle=True)  # SOG rapid update - throttled for display
-        self._bridge.add_pgn_handler(128267, self._on_depth, throttle=True)  # Depth
-        self._bridge.add_pgn_handler(130306, self._on_wind, throttle=True)  # Wind
-        self._bridge.add_pgn_handler(127250, self._on_heading, throttle=True)  # Heading
-        self._bridge.add_pgn_handler(129039, self._on_ais_message)  # AIS Class B Position Report (no throttling)
-        self._bridge.add_pgn_handler(129810, self._on_ais_extended_message)  # AIS Class B static data (no throttling)
+        self._add_timer('bridge_diagnostics', self._write_bridge_diagnostics, self._bridge_diagnostics_interval * 1000, False)
+
+        self._bridge.add_pgn_handler(129026, self._on_sog, throttle=True, fields=["SOG", "COG"])  # SOG rapid update - throttled for display
+        self._bridge.add_pgn_handler(128267, self._on_depth, throttle=5, fields=["Depth", "Offset"])  # Depth, changes slowly
+        self._bridge.add_pgn_handler(130306, self._on_wind, throttle=True, fields=["Wind Speed", "Wind Angle", "Reference"])  # Wind
+        self._bridge.add_pgn_handler(127250, self._on_heading, throttle=True, fields=["Heading"])  # Heading
+        self._bridge.add_pgn_handler(129039, self._on_ais_message, fields=["User ID", "Longitude", "Latitude", "COG", "SOG", "Heading"])  # AIS Class B Position Report (no throttling)
+        self._bridge.add_pgn_handler(129810, self._on_ais_extended_message, fields=["User ID", "Beam", "Length"])  # AIS Class B static data (no throttling)
 
         
     def _init_settings(self):
@@ -162,11 +179,11 @@ class DBusConnector(AbstractConnector):
             # Interval in seconds to prune old tracks for each vessel
             "PruneInterval":             ["/Settings/AnchorAlarm/Vessels/PruneInterval", 180, 0, 3600],
 
-            # Distance to vessels to keep track of. Do not set it too high as it will put the Cerbo under stress
-            "DistanceToVessel":            ["/Settings/AnchorAlarm/Vessels/DistanceToVessel", 400, 0, 2000],
+            # Distance to vessels to keep track of. Every tracked vessel is published on D-Bus every second, mind the Cerbo load
+            "DistanceToVessel":            ["/Settings/AnchorAlarm/Vessels/DistanceToVessel", 400, 0, 10000],
 
-            # Maximum number ofvessels to keep track of. Do not set it too high as it will put the Cerbo under stress
-            "MaxVessels":                 ["/Settings/AnchorAlarm/Vessels/MaxVessels", 10, 0, 30],
+            # Maximum number of vessels to keep track of. Every tracked vessel is published on D-Bus every second, mind the Cerbo load
+            "MaxVessels":                 ["/Settings/AnchorAlarm/Vessels/MaxVessels", 10, 0, 300],
 
             # MMSI of your boat. Used to strip out AIS data from your own boat and avoing showing on the map twice
             "MMSI":                       ["/Settings/AnchorAlarm/Vessels/self/MMSI", "", 0, 0],
@@ -252,6 +269,37 @@ class DBusConnector(AbstractConnector):
         self._dbus_service.add_path('/Environment/Wind/Speed', "", "Wind speed (knots)", writeable=False)
         self._dbus_service.add_path('/Environment/Wind/Direction', "", "Wind direction (degrees)", writeable=False)
 
+        # Timer diagnostics, how late the 1s timer fires when the main loop is busy
+        self._dbus_service.add_path('/Diagnostics/Timer/Ticks', 0, "Number of timer ticks measured", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Timer/LastInterval', "", "Last interval between two ticks (s)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Timer/AverageDrift', 0, "Average delay of ticks (s)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Timer/MaxDrift', 0, "Maximum delay of a tick (s)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Timer/LateTicks', 0, "Number of ticks late by more than 0.5s", writeable=False)
+
+        # NMEA bridge diagnostics, updated every _bridge_diagnostics_interval. Durations are in ms, over the last interval
+        self._dbus_service.add_path('/Diagnostics/Bridge/MessagesPerSecond', 0, "NMEA messages received per second", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Parse/Count', 0, "Messages decoded", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Parse/AverageTime', 0, "Average decoding time (ms)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Parse/MaxTime', 0, "Maximum decoding time (ms)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/Queued', 0, "Commands waiting to be written to the NodeJS bridge", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/InFlight', 0, "Commands written and not answered yet", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/WriteBuffer', 0, "Bytes not read by the NodeJS bridge yet", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/Sent', 0, "Commands sent", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/Dropped', 0, "Commands dropped because the queue was full", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/Timeouts', 0, "Commands never answered", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/Suppressed', 0, "Unchanged messages not sent", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/AverageLatency', 0, "Average time between a command written and its answer (ms)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/MaxLatency', 0, "Maximum time between a command written and its answer (ms)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/AverageWriteDelay', 0, "Average time between a command queued and written to the NodeJS bridge (ms)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Commands/MaxWriteDelay', 0, "Maximum time between a command queued and written to the NodeJS bridge (ms)", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Read/MaxMessages', 0, "Maximum messages handled in a main loop wakeup", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/Read/MaxBacklog', 0, "Maximum bytes waiting in the pipe when woken up", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/NodeJS/Received', 0, "Messages matching a filter received by the NodeJS bridge", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/NodeJS/Throttled', 0, "Messages replaced by a more recent one by throttling", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/NodeJS/Unparsed', 0, "Messages the NodeJS bridge could not parse", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/NodeJS/Backpressure', 0, "Writes done while the service was not reading fast enough", writeable=False)
+        self._dbus_service.add_path('/Diagnostics/Bridge/NodeJS/Restarts', 0, "Number of times the NodeJS bridge was restarted", writeable=False)
+
 
         # create trigger points for other people to manipulate state
         self._dbus_service.add_path('/Triggers/AnchorDown', 0, "Set 1 to trigger anchor down and define drop point", writeable=True, onchangecallback=self._on_service_changed)
@@ -285,31 +333,26 @@ class DBusConnector(AbstractConnector):
     def update_state(self, current_state:AnchorAlarmState):
         """Called by controller every second with updated state"""
 
-        # Alarm info
-        self._dbus_service['/Alarm/State']    = current_state.state
-        self._dbus_service['/Alarm/Message']  = current_state.message
-        self._dbus_service['/Alarm/Level']    = current_state.level
-        self._dbus_service['/Alarm/Muted']    = 1 if current_state.muted else 0
-        self._dbus_service['/Alarm/Alarm']    = 1 if current_state.state in ['ALARM_DRAGGING', 'ALARM_DRAGGING_MUTED', 'ALARM_NO_GPS', 'ALARM_NO_GPS_MUTED'] else 0
-        self._dbus_service['/Alarm/MutedDuration']          = current_state.params['alarm_muted_count']
-        self._dbus_service['/Alarm/NoGPSDuration']          = current_state.params['no_gps_count']
-        self._dbus_service['/Alarm/OutOfRadiusDuration']    = current_state.params['out_of_radius_count']
-
-
-        # Anchor info
-        self._dbus_service['/Anchor/Latitude']          = "" if current_state.params['drop_point'] is None else current_state.params['drop_point'].latitude
-        self._dbus_service['/Anchor/Longitude']         = "" if current_state.params['drop_point'] is None else current_state.params['drop_point'].longitude
-        self._dbus_service['/Anchor/Radius']            = current_state.params['radius']
-        self._dbus_service['/Anchor/Distance']          = current_state.params['current_radius']
-        self._dbus_service['/Anchor/Tolerance']         = current_state.params['radius_tolerance']
-
+        # alarm paths and feedback only change with the state, vessels and environment every second
+        if current_state is not self._last_state:
+            self._write_alarm_state(current_state)
+            self._last_state = current_state
 
         # Vessel info
         if self.controller is not None:
-            gps_position = self.controller.get_gps_position()
+            gps_position = self.controller.get_gps_snapshot().position
             if gps_position is not None:
                 self._vessels['self']['latitude'] = gps_position.latitude
                 self._vessels['self']['longitude'] = gps_position.longitude
+                self._vessel_index.set_origin(gps_position)
+                self._update_vessel_distances()
+
+            timer_stats = self.controller.get_timer_stats()
+            self._dbus_service['/Diagnostics/Timer/Ticks']          = timer_stats.ticks
+            self._dbus_service['/Diagnostics/Timer/LastInterval']   = "" if timer_stats.last_interval is None else round(timer_stats.last_interval, 3)
+            self._dbus_service['/Diagnostics/Timer/AverageDrift']   = round(timer_stats.average_drift, 3)
+            self._dbus_service['/Diagnostics/Timer/MaxDrift']       = round(timer_stats.max_drift, 3)
+            self._dbus_service['/Diagnostics/Timer/LateTicks']      = timer_stats.late_ticks
 
         # update vessels info
         self._prune_vessels()
@@ -323,6 +366,26 @@ class DBusConnector(AbstractConnector):
         self._dbus_service['/Environment/Depth']            = self._last_depth if self._last_depth is not None else ""
 
 
+    def _write_alarm_state(self, current_state:AnchorAlarmState):
+        # Alarm info
+        self._dbus_service['/Alarm/State']    = current_state.state
+        self._dbus_service['/Alarm/Message']  = current_state.message
+        self._dbus_service['/Alarm/Level']    = current_state.level
+        self._dbus_service['/Alarm/Muted']    = 1 if current_state.muted else 0
+        self._dbus_service['/Alarm/Alarm']    = 1 if current_state.state in ['ALARM_DRAGGING', 'ALARM_DRAGGING_MUTED', 'ALARM_NO_GPS', 'ALARM_NO_GPS_MUTED'] else 0
+        self._dbus_service['/Alarm/MutedDuration']          = current_state.params['alarm_muted_count']
+        self._dbus_service['/Alarm/NoGPSDuration']          = current_state.params['no_gps_count']
+        self._dbus_service['/Alarm/OutOfRadiusDuration']    = current_state.params['out_of_radius_count']
+
+
+        # Anchor info
+        self._dbus_service['/Anchor/Latitude']          = "" if current_state.params['drop_point'] is None else current_state.params['drop_point'].latitude
+        self._dbus_service['/Anchor/Longitude']         = "" if current_state.params['drop_point'] is None else current_state.params['drop_point'].longitude
+        self._dbus_service['/Anchor/Radius']            = current_state.params['radius']
+        self._dbus_service['/Anchor/Distance']          = current_state.params['current_radius']
+        self._dbus_service['/Anchor/Tolerance']         = current_state.params['radius_tolerance']
+
+
         if self._settings['FeedbackDigitalInputNumber'] != 0:
             self._alarm_monitor.set_value(self._feedback_digital_input, '/CustomName', current_state.message)
             self._alarm_monitor.set_value(self._feedback_digital_input, '/ProductName', current_state.message)
@@ -568,6 +631,68 @@ class DBusConnector(AbstractConnector):
 
 
 
+    def _write_bridge_diagnostics(self):
+        """Publishes what the NMEA bridge measured since the previous call"""
+        snapshot = self._bridge.get_bridge_stats()
+
+        # per PGN and source rates. Paths of sources that went quiet are kept, at 0
+        rates = {'/Diagnostics/Bridge/Rates/'+ str(pgn) +'/'+ str(src): rate for (pgn, src), rate in snapshot.rates.items()}
+        for path in self._bridge_rate_paths - rates.keys():
+            self._dbus_service[path] = 0
+
+        for path, rate in rates.items():
+            if path not in self._bridge_rate_paths:
+                self._dbus_service.add_path(path, 0, "Messages per second", writeable=False)
+                self._bridge_rate_paths.add(path)
+            self._dbus_service[path] = round(rate, 2)
+
+        self._dbus_service['/Diagnostics/Bridge/MessagesPerSecond']   = round(sum(snapshot.rates.values()), 2)
+        self._dbus_service['/Diagnostics/Bridge/Parse/Count']         = snapshot.parse.count
+        self._dbus_service['/Diagnostics/Bridge/Parse/AverageTime']   = round(snapshot.parse.average * 1000, 3)
+        self._dbus_service['/Diagnostics/Bridge/Parse/MaxTime']       = round(snapshot.parse.max * 1000, 3)
+
+        # time spent in each handler, Load is the percentage of the interval spent in it
+        for name, stats in snapshot.handlers.items():
+            prefix = '/Diagnostics/Bridge/Handlers/'+ re.sub('[^A-Za-z0-9_]', '_', name)
+            if prefix not in self._bridge_handler_paths:
+                self._dbus_service.add_path(prefix +'/Calls', 0, "Calls of "+ name, writeable=False)
+                self._dbus_service.add_path(prefix +'/AverageTime', 0, "Average duration (ms)", writeable=False)
+                self._dbus_service.add_path(prefix +'/P95Time', 0, "95th percentile duration (ms)", writeable=False)
+                self._dbus_service.add_path(prefix +'/MaxTime', 0, "Maximum duration (ms)", writeable=False)
+                self._dbus_service.add_path(prefix +'/Load', 0, "Percentage of time spent in handler", writeable=False)
+                self._bridge_handler_paths.add(prefix)
+
+            self._dbus_service[prefix +'/Calls']        = stats.count
+            self._dbus_service[prefix +'/AverageTime']  = round(stats.average * 1000, 3)
+            self._dbus_service[prefix +'/P95Time']      = round(stats.p95 * 1000, 3)
+            self._dbus_service[prefix +'/MaxTime']      = round(stats.max * 1000, 3)
+            self._dbus_service[prefix +'/Load']         = round(stats.total / snapshot.duration * 100, 2) if snapshot.duration > 0 else 0
+
+        command_stats = self._bridge.get_command_stats()
+        self._dbus_service['/Diagnostics/Bridge/Commands/Queued']         = command_stats.queued
+        self._dbus_service['/Diagnostics/Bridge/Commands/InFlight']       = command_stats.in_flight
+        self._dbus_service['/Diagnostics/Bridge/Commands/WriteBuffer']    = command_stats.write_buffer
+        self._dbus_service['/Diagnostics/Bridge/Commands/Sent']           = command_stats.sent
+        self._dbus_service['/Diagnostics/Bridge/Commands/Dropped']        = command_stats.dropped
+        self._dbus_service['/Diagnostics/Bridge/Commands/Timeouts']       = command_stats.timeouts
+        self._dbus_service['/Diagnostics/Bridge/Commands/Suppressed']     = self._bridge.get_suppression_stats().suppressed
+        self._dbus_service['/Diagnostics/Bridge/Commands/AverageLatency'] = round(snapshot.commands.average * 1000, 3)
+        self._dbus_service['/Diagnostics/Bridge/Commands/MaxLatency']     = round(snapshot.commands.max * 1000, 3)
+        self._dbus_service['/Diagnostics/Bridge/Commands/AverageWriteDelay'] = round(snapshot.writes.average * 1000, 3)
+        self._dbus_service['/Diagnostics/Bridge/Commands/MaxWriteDelay']     = round(snapshot.writes.max * 1000, 3)
+
+        read_stats = self._bridge.get_read_stats()
+        self._dbus_service['/Diagnostics/Bridge/Read/MaxMessages']    = read_stats.max_messages
+        self._dbus_service['/Diagnostics/Bridge/Read/MaxBacklog']     = read_stats.max_backlog
+
+        self._dbus_service['/Diagnostics/Bridge/NodeJS/Received']     = snapshot.nodejs.get('received', 0)
+        self._dbus_service['/Diagnostics/Bridge/NodeJS/Throttled']    = snapshot.nodejs.get('throttled', 0)
+        self._dbus_service['/Diagnostics/Bridge/NodeJS/Unparsed']     = snapshot.nodejs.get('unparsed', 0)
+        self._dbus_service['/Diagnostics/Bridge/NodeJS/Backpressure'] = snapshot.nodejs.get('backpressure', 0)
+        self._dbus_service['/Diagnostics/Bridge/NodeJS/Restarts']     = self._bridge.get_restart_count()
+
+        return True
+
     def _create_vessel(self, mmsi):
         """Create a new vessel with the given MMSI"""
         if mmsi in self._vessels:
@@ -582,6 +707,8 @@ class DBusConnector(AbstractConnector):
         self._dbus_service.add_path('/Vessels/'+ mmsi +'/Beam', "", "Beam (m)", writeable=False)
         self._dbus_service.add_path('/Vessels/'+ mmsi +'/Length', "", "Length (m)", writeable=False)
         self._dbus_service.add_path('/Vessels/'+ mmsi +'/Tracks', "", "Tracks", writeable=False)
+        self._dbus_service.add_path('/Vessels/'+ mmsi +'/Distance', "", "Distance to own boat (m)", writeable=False)
+        self._dbus_service.add_path('/Vessels/'+ mmsi +'/Bearing', "", "True bearing from own boat (deg)", writeable=False)
         
         vessel = {
             'mmsi': mmsi,
@@ -591,6 +718,7 @@ class DBusConnector(AbstractConnector):
             'cog': "",
             'tracks': deque(maxlen=self._settings['NumberOfTracks']),  # Keep last 100 tracks
             'distance': 0,  # Distance to self vessel
+            'bearing': "",  # True bearing from self vessel
             'beam': str(self._settings['DefaultBeam']),
             'length': str(self._settings['DefaultLength']),
             'heading': "",
@@ -612,6 +740,7 @@ class DBusConnector(AbstractConnector):
 
     def _remove_vessel(self, mmsi):
         """Remove a vessel with the given MMSI"""
+        self._vessel_index.remove(mmsi)
         if mmsi in self._vessels:
             del self._vessels[mmsi]
             # Remove paths from dbus service
@@ -623,6 +752,8 @@ class DBusConnector(AbstractConnector):
             del self._dbus_service['/Vessels/' + mmsi + '/Beam']
             del self._dbus_service['/Vessels/' + mmsi + '/Length']
             del self._dbus_service['/Vessels/' + mmsi + '/Tracks']
+            del self._dbus_service['/Vessels/' + mmsi + '/Distance']
+            del self._dbus_service['/Vessels/' + mmsi + '/Bearing']
 
 
     def _write_vessel_info(self, mmsi):
@@ -652,6 +783,8 @@ class DBusConnector(AbstractConnector):
         self._dbus_service['/Vessels/' + mmsi + '/Beam']        = vessel['beam'] or ""
         self._dbus_service['/Vessels/' + mmsi + '/Length']      = vessel['length'] or ""
         self._dbus_service['/Vessels/' + mmsi + '/Tracks']      = json.dumps(list(vessel['tracks']))
+        self._dbus_service['/Vessels/' + mmsi + '/Distance']    = round(vessel['distance'], 1)
+        self._dbus_service['/Vessels/' + mmsi + '/Bearing']     = round(vessel['bearing'], 1) if vessel['bearing'] != "" else ""
 
 
     def _get_coordinate_precision(self, value):
@@ -695,7 +828,7 @@ class DBusConnector(AbstractConnector):
         if self.controller is None:
             return
         
-        gps_position = self.controller.get_gps_position()
+        gps_position = self.controller.get_gps_snapshot().position
         if gps_position is None:
             return
         
@@ -703,26 +836,24 @@ class DBusConnector(AbstractConnector):
         longitude = nmea_message["fields"]["Longitude"]
         latitude = nmea_message["fields"]["Latitude"]   
 
-        # _ais_bounding_box_degrees = 0.02
-        # latitude=12.0026408, longitude=-61.7243712 and 
-        # gps_position.latitude=12.00131893157959, gps_position.longitude=-61.73062515258789 
-
-
-        # Fast bounding box filter to discard distant vessels before expensive geodesic calculation
+        # Fast bounding box filter to discard distant vessels before any distance calculation
         # Reject vessels outside bounding box to handle PredictWind over-the-horizon flooding
-        if (longitude < gps_position.longitude - self._ais_bounding_box_degrees or 
-            longitude > gps_position.longitude + self._ais_bounding_box_degrees or
-            latitude < gps_position.latitude - self._ais_bounding_box_degrees or 
-            latitude > gps_position.latitude + self._ais_bounding_box_degrees):
-            logger.debug(f"Ignoring vessel {mmsi} outside bounding box: vessel lat={latitude}, lon={longitude}, GPS lat={gps_position.latitude}, lon={gps_position.longitude}, box={self._ais_bounding_box_degrees}")
+        box_latitude, box_longitude = bounding_box_degrees(gps_position.latitude, self._settings['DistanceToVessel'])
+        if (longitude < gps_position.longitude - box_longitude or 
+            longitude > gps_position.longitude + box_longitude or
+            latitude < gps_position.latitude - box_latitude or 
+            latitude > gps_position.latitude + box_latitude):
+            logger.debug(f"Ignoring vessel {mmsi} outside bounding box: vessel lat={latitude}, lon={longitude}, GPS lat={gps_position.latitude}, lon={gps_position.longitude}, box={box_latitude},{box_longitude}")
             return  # Ignore vessels outside bounding box
 
-        try:
-            distance = geodesic((latitude, longitude), (gps_position.latitude, gps_position.longitude)).meters
-        except (ValueError, Exception):
+        if latitude < -90 or latitude > 90 or longitude < -180 or longitude > 180:
             logger.debug(f"Invalid coordinates for vessel {mmsi}: lat={latitude}, lon={longitude}")
             return  # Ignore vessels with invalid coordinates
 
+        # planar distance in the vessel index plane, close enough to the geodesic for tracking and much cheaper
+        self._vessel_index.set_origin(gps_position)
+        distance = self._vessel_index.distance_to(latitude, longitude)
+
         # Auto-detect self vessel MMSI if not already set and vessel is very close
         if distance < self._ais_self_distance_threshold and self._settings['MMSI'] == "":
             self._settings['MMSI'] = mmsi
@@ -738,20 +869,20 @@ class DBusConnector(AbstractConnector):
             logger.debug(f"Ignoring vessel {mmsi} at distance {distance} meters, too far away")
             return  # Ignore vessels that are too far away
         
-        if len(self._vessels) > self._settings['MaxVessels']:   # > and not >= because we always have self vessel in the list 
+        if mmsi not in self._vessels and len(self._vessels) > self._settings['MaxVessels']:   # > and not >= because we always have self vessel in the list 
             # We have too many vessels, check if we need to replace one
-            farther_vessel_mmsi = max(self._vessels.keys(), key=lambda vessel_mmsi: self._vessels[vessel_mmsi]['distance'])
-            if farther_vessel_mmsi == 'self':
-                return # should never happen, but just in case
+            farther_vessel = self._vessel_index.farthest()
+            if farther_vessel is None:
+                return # only self or vessels without position, should never happen
             
-            farther_vessel = self._vessels[farther_vessel_mmsi]
-            if farther_vessel['distance'] < distance:
+            farther_vessel_mmsi, farther_vessel_distance = farther_vessel
+            if farther_vessel_distance < distance:
                 logger.debug(f"Ignoring vessel {mmsi} at distance {distance} meters, too many vessels already")
                 return   
             else:
                 # Remove the farthest vessel to replace with this one
-                self._remove_vessel(farther_vessel['mmsi'])
-                logger.debug(f"Removed vessel {farther_vessel['mmsi']} at distance {farther_vessel['distance']} meters to add {mmsi} at distance {distance}")
+                self._remove_vessel(farther_vessel_mmsi)
+                logger.debug(f"Removed vessel {farther_vessel_mmsi} at distance {farther_vessel_distance} meters to add {mmsi} at distance {distance}")
             
         # Create or update vessel info
         vessel = self._create_vessel(mmsi)
@@ -779,11 +910,16 @@ class DBusConnector(AbstractConnector):
             vessel['latitude'] = latitude
             vessel['longitude'] = longitude
             vessel['last_position_update'] = now
+        else:
+            # the index and distance follow the position kept, not the less precise one received
+            distance = self._vessel_index.distance_to(vessel['latitude'], vessel['longitude'])
         
         # Always update SOG and COG (they come with position data)
         vessel['sog'] = nmea_message["fields"]["SOG"]
         vessel['cog'] = nmea_message["fields"]["COG"] * (180.0 / math.pi)  # Convert radians to degrees
         vessel['distance'] = distance   # keep distance for easier pruning
+        self._vessel_index.update(mmsi, vessel['latitude'], vessel['longitude'], distance)
+        vessel['bearing'] = self._vessel_index.bearing(mmsi)
         
         # Update heading if available
         if "Heading" in nmea_message["fields"]:
@@ -836,29 +972,35 @@ class DBusConnector(AbstractConnector):
 
 
 
+    def _update_vessel_distances(self):
+        """Recomputes distances and bearings of all tracked vessels from the current own boat position.
+        Reports only come every few seconds to minutes while the boat swings, so stored distances go stale otherwise"""
+        for mmsi, distance, bearing in self._vessel_index.recompute():
+            vessel = self._vessels[mmsi]
+            vessel['distance'] = distance
+            vessel['bearing'] = bearing
+
+
     def _prune_vessels(self):
         """Prune vessels that are too far away"""
-        gps_position = self.controller.get_gps_position()
+        gps_position = self.controller.get_gps_snapshot().position
         if gps_position is None:
             return
 
+        # If the vessel is too far away, remove it. Only the vessels beyond the limit are visited
+        for mmsi in self._vessel_index.pop_beyond(self._settings['DistanceToVessel']):
+            self._remove_vessel(mmsi)
+
         now = int(time.time())
         
         for mmsi in list(self._vessels.keys()):
             if mmsi == 'self':
                 continue
 
-            vessel = self._vessels[mmsi]
-
-            tracks = vessel['tracks']
+            tracks = self._vessels[mmsi]['tracks']
             if (len(tracks) > 0 and now - tracks[-1]['timestamp'] >= self._settings['PruneInterval']):
                 # If the last track is older than the prune interval, remove the vessel
                 self._remove_vessel(mmsi)
-                continue
-
-            # If the vessel is too far away, remove it
-            if vessel['distance'] > self._settings['DistanceToVessel']:
-                self._remove_vessel(mmsi)
 
 
 if __name__ == "__main__":
@@ -904,7 +1046,7 @@ if __name__ == "__main__":
     controller.trigger_chain_out    = MagicMock(side_effect=lambda: logger.info("Trigger chain out"))
     controller.trigger_mute_alarm   = MagicMock(side_effect=lambda: logger.info("Trigger mute alarm"))
 
-    controller.get_gps_position = MagicMock(return_value=GPSPosition(12.00131893157959, -61.73062515258789))  # Mock GPS position
+    controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(12.00131893157959, -61.73062515258789)))  # Mock GPS position
     dbus_connector.set_controller(controller)
 
     # code to test notifications to Cerbo
@@ -28,6 +28,7 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 sys.path.insert(1, os.path.join(sys.path[0], '../ext'))
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmState
 
 # Web Push imports
@@ -54,6 +55,9 @@ class DBusDWPConnector(AbstractConnector):
     
     def __init__(self, timer_provider, settings_provider, dbus_service):
         super().__init__(timer_provider, settings_provider)
+
+        # only reacts to state changes
+        self.update_policy = UPDATE_ON_CHANGE
         
         self._dbus_service = dbus_service
         self._vapid_keys_file = os.path.join(os.path.dirname(__file__), '..', 'vapid_keys.json')
@@ -28,6 +28,7 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_controller import AnchorAlarmController
 from anchor_alarm_controller import GPSPosition
 from anchor_alarm_model import AnchorAlarmState
@@ -40,6 +41,9 @@ class DBusRelayConnector(AbstractConnector):
     def __init__(self, timer_provider, settings_provider):
         super().__init__(timer_provider, settings_provider)
 
+        # only reacts to state changes
+        self.update_policy = UPDATE_ON_CHANGE
+
         self._timer_ids = {
        
         }
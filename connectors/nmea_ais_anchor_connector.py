@@ -24,6 +24,7 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmState
 from abstract_gps_provider import GPSPosition
 
@@ -35,10 +36,15 @@ class NMEAAISAnchorConnector(AbstractConnector):
     def __init__(self, timer_provider, settings_provider, nmea_bridge):
         super().__init__(timer_provider, settings_provider)
 
+        # only reacts to state changes
+        self.update_policy = UPDATE_ON_CHANGE
+
         self._timer_ids = {
             'advertise_timer': None
         }
 
+        self._bridge = nmea_bridge
+
         self._init_settings()
 
         self._MMSI = 0
@@ -49,9 +55,10 @@ class NMEAAISAnchorConnector(AbstractConnector):
         self._anchor_position = self._DISABLED_POSITION
         self._anchor_heading = 0
 
-        self._bridge = nmea_bridge
+        # only needed when advertising the anchor target, every few seconds
+        self._bridge.add_pgn_handler(127250, self._on_heading_change, throttle=2)
 
-        self._bridge.add_pgn_handler(127250, self._on_heading_change, throttle=True)
+        self._register_templates()
 
     
     def _init_settings(self):
@@ -76,6 +83,10 @@ class NMEAAISAnchorConnector(AbstractConnector):
         if self._settings['AdvertiseInterval'] != 0:
             self._add_timer('advertise_timer', self._advertise_ais_target, self._settings['AdvertiseInterval']*1000, False)
 
+        # the target is also advertised on each state change, most of the time unchanged : only the advertisements repeat it
+        self._bridge.enable_change_suppression(129039, self._settings['AdvertiseInterval'])
+        self._bridge.enable_change_suppression(129809, self._settings['AdvertiseInterval'])
+
 
     # called when a state changes
     def on_state_changed(self, current_state:AnchorAlarmState):
@@ -93,31 +104,23 @@ class NMEAAISAnchorConnector(AbstractConnector):
         self._advertise_ais_target()
 
 
-    def _advertise_ais_target(self):
-        if self._settings['AdvertiseInterval'] == 0:
-            # do not advertise at all, stop timer
-            return False
-
-        
-        # { "pgn": 129039, "fields": {"Message ID": "Standard Class B position report", "Repeat Indicator": "Initial", "User ID": 368299999, "Longitude": -60.9595577, "Latitude": 14.0829979, "Position Accuracy": "Low", "RAIM": "not in use", "Time Stamp": "45", "COG": 0, "SOG": 0, "AIS Transceiver information": "Channel B VDL reception", "Heading": 0, "Regional Application B": 0, "Unit type": "SOTDMA", "Integrated Display": "No", "DSC": "No", "Band": "Top 525 kHz of marine band", "Can handle Msg 22": "No", "AIS mode": "Autonomous", "AIS communication state": "SOTDMA"}, "description": "AIS Class B Position Report"}
-        # { 'pgn': 129809, 'fields': {'Message ID': 'Static data report', 'Repeat Indicator': 'Initial', 'User ID': 244024607, 'Name': 'COSI', 'AIS Transceiver information': 'Channel B VDL reception'}, 'description': 'AIS Class B static data (msg 24 Part A)'}
-
-        
-        position_nmea_message = { 
+    def _register_templates(self):
+        # only the position, heading and name change, the bridge keeps the rest
+        self._bridge.register_template('ais_anchor_position', { 
             "pgn": 129039, 
             "fields": {
                 "Message ID": "Standard Class B position report", 
                 "Repeat Indicator": "Initial", 
                 "User ID": self._MMSI, 
-                "Longitude": self._anchor_position.longitude, 
-                "Latitude": self._anchor_position.latitude, 
+                "Longitude": self._DISABLED_POSITION.longitude, 
+                "Latitude": self._DISABLED_POSITION.latitude, 
                 "Position Accuracy": "Low", 
                 "RAIM": "not in use", 
                 "Time Stamp": "45", 
-                "COG": self._anchor_heading, 
+                "COG": 0, 
                 "SOG": 0, 
                 "AIS Transceiver information": "Channel B VDL reception", 
-                "Heading": self._anchor_heading, 
+                "Heading": 0, 
                 "Regional Application B": 0, 
                 "Unit type": "SOTDMA", 
                 "Integrated Display": "No", 
@@ -128,26 +131,47 @@ class NMEAAISAnchorConnector(AbstractConnector):
                 "AIS communication state": "SOTDMA"
             }, 
             "description": "AIS Class B Position Report"
-        }
-
-    
-        logger.debug("advertising anchor position", position_nmea_message)
-        self._bridge.send_nmea(position_nmea_message)
+        })
 
-        name_nmea_message = { 
+        self._bridge.register_template('ais_anchor_name', { 
             'pgn': 129809, 
             'fields': {
                 'Message ID': 'Static data report', 
                 'Repeat Indicator': 'Initial', 
                 'User ID': self._MMSI, 
-                'Name': self._settings['Name'], 
+                'Name': "", 
                 'AIS Transceiver information': 'Channel B VDL reception'
             }, 
             'description': 'AIS Class B static data (msg 24 Part A)'
-        }
+        })
+
+
+    def _advertise_ais_target(self):
+        if self._settings['AdvertiseInterval'] == 0:
+            # do not advertise at all, stop timer
+            return False
+
         
-        logger.debug("advertising anchor name", name_nmea_message)
-        self._bridge.send_nmea(name_nmea_message)
+        # { "pgn": 129039, "fields": {"Message ID": "Standard Class B position report", "Repeat Indicator": "Initial", "User ID": 368299999, "Longitude": -60.9595577, "Latitude": 14.0829979, "Position Accuracy": "Low", "RAIM": "not in use", "Time Stamp": "45", "COG": 0, "SOG": 0, "AIS Transceiver information": "Channel B VDL reception", "Heading": 0, "Regional Application B": 0, "Unit type": "SOTDMA", "Integrated Display": "No", "DSC": "No", "Band": "Top 525 kHz of marine band", "Can handle Msg 22": "No", "AIS mode": "Autonomous", "AIS communication state": "SOTDMA"}, "description": "AIS Class B Position Report"}
+        # { 'pgn': 129809, 'fields': {'Message ID': 'Static data report', 'Repeat Indicator': 'Initial', 'User ID': 244024607, 'Name': 'COSI', 'AIS Transceiver information': 'Channel B VDL reception'}, 'description': 'AIS Class B static data (msg 24 Part A)'}
+
+        
+        position_fields = {
+            "Longitude": self._anchor_position.longitude, 
+            "Latitude": self._anchor_position.latitude, 
+            "COG": self._anchor_heading, 
+            "Heading": self._anchor_heading
+        }
+
+        logger.debug("advertising anchor position", position_fields)
+        self._bridge.send_template('ais_anchor_position', position_fields)
+
+        name_fields = {
+            'Name': self._settings['Name']
+        }
+
+        logger.debug("advertising anchor name", name_fields)
+        self._bridge.send_template('ais_anchor_name', name_fields)
 
         return True # we want to repeat that
 
@@ -23,6 +23,7 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmState
 
 import logging
@@ -31,9 +32,14 @@ logger = logging.getLogger(__name__)
 class NMEAAlertConnector(AbstractConnector):
     def __init__(self, timer_provider, settings_provider, nmea_bridge):
         super().__init__(timer_provider, settings_provider)
-        
+
+        self._bridge = nmea_bridge
+
         self._init_settings()
 
+        # update_state is called when the state changed, or every KeepaliveInterval seconds
+        self.update_policy = UPDATE_ON_CHANGE
+
         # TODO XXX : move to settings ?
         self._ALERT_ID = "54321"
         self._NETWORK_ID = "54321"
@@ -52,19 +58,29 @@ class NMEAAlertConnector(AbstractConnector):
             'Emergency Alarm': None
         }
 
-        self._bridge = nmea_bridge
         self._bridge.add_pgn_handler(126984, self._on_nmea_message)
 
+        self._register_templates()
+
 
     def _init_settings(self):
         # create the setting that are needed
         settingsList = {
             # Duration an info (Caution) message will be automatically dismissed after
-            "AutoAcknowledgeInterval":     ["/Settings/AnchorAlarm/NMEA/Alert/AutoAcknowledgeInterval", 5, 1, 90]
+            "AutoAcknowledgeInterval":     ["/Settings/AnchorAlarm/NMEA/Alert/AutoAcknowledgeInterval", 5, 1, 90],
+
+            # Interval the alert text message is sent again when nothing changed
+            "KeepaliveInterval":           ["/Settings/AnchorAlarm/NMEA/Alert/KeepaliveInterval", 10, 1, 300]
         }
 
-        # we don't care about getting notified if settings are updated
-        self._settings = self._settings_provider(settingsList, None)
+        self._settings = self._settings_provider(settingsList, self._on_setting_changed)
+        self._on_setting_changed(None, None, None)
+
+    def _on_setting_changed(self, key, old_value, new_value):
+        self.update_keepalive_interval = self._settings['KeepaliveInterval']
+
+        # a state change with the same text does not send it again, only the keepalive repeats it
+        self._bridge.enable_change_suppression(126985, self._settings['KeepaliveInterval'])
 
 
     def _on_nmea_message(self, nmea_message):
@@ -118,9 +134,7 @@ class NMEAAlertConnector(AbstractConnector):
 
     # called every second to update state
     def update_state(self, current_state:AnchorAlarmState):
-        """Called by controller every second with updated state"""
-       
-       # TODO XXX : do not send a message every second when nothing is happening
+        """Called by controller when state changed or every KeepaliveInterval seconds"""
         type = self._type_for_alarm_state(current_state.level)
         self._send_alert_text_message(type, current_state.message)
 
@@ -156,16 +170,13 @@ class NMEAAlertConnector(AbstractConnector):
                 self._send_alert_payload(t['type'], "Normal")
                               
 
-    def _send_alert_payload(self, type, state):
-        # update type's state
-        t = next(item for item in self._types_states if item["type"] == type)
-        t['state'] = state
-
-        nmea_message = {
+    def _register_templates(self):
+        # only the type, state and text change, the bridge keeps the rest
+        self._bridge.register_template('alert_payload', {
             "pgn": 126983,
             "Alert ID": self._ALERT_ID,
-            "Alert Type": type,
-            "Alert State": state,
+            "Alert Type": "Caution",
+            "Alert State": "Normal",
             "Alert Category": "Technical",
             "Alert System": 5,
             "Alert Sub-System": 0,
@@ -182,16 +193,12 @@ class NMEAAlertConnector(AbstractConnector):
             "Trigger Condition": 2,
             "Threshold Status": 1,
             "Alert Priority": 0
-        }
+        })
 
-        logger.debug("Sending alert payload", nmea_message)
-        self._bridge.send_nmea(nmea_message)
-
-    def _send_alert_text_message(self, type, message):
-        nmea_message = {
+        self._bridge.register_template('alert_text', {
             "pgn": 126985,
             "Alert ID": self._ALERT_ID,
-            "Alert Type": type,
+            "Alert Type": "Caution",
             "Alert Category": "Technical",
             "Alert System": 5,
             "Alert Sub-System": 0,
@@ -200,11 +207,30 @@ class NMEAAlertConnector(AbstractConnector):
             "Data Source Index-Source": 0,
             "Alert Occurrence Number": 0,
             "Language ID": 0,
+            "Alert Text Description": ""
+        })
+
+    def _send_alert_payload(self, type, state):
+        # update type's state
+        t = next(item for item in self._types_states if item["type"] == type)
+        t['state'] = state
+
+        fields = {
+            "Alert Type": type,
+            "Alert State": state
+        }
+
+        logger.debug("Sending alert payload", fields)
+        self._bridge.send_template('alert_payload', fields)
+
+    def _send_alert_text_message(self, type, message):
+        fields = {
+            "Alert Type": type,
             "Alert Text Description": message
         }
 
-        logger.debug("Sending alert text", nmea_message)
-        self._bridge.send_nmea(nmea_message)
+        logger.debug("Sending alert text", fields)
+        self._bridge.send_template('alert_text', fields)
 
 
 
@@ -25,6 +25,7 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmState
 
 import logging
@@ -34,15 +35,19 @@ class NMEADSConnector(AbstractConnector):
     def __init__(self, timer_provider, settings_provider, nmea_bridge):
         super().__init__(timer_provider, settings_provider)
 
+        # switches only change with the state, advertising has its own timer
+        self.update_policy = UPDATE_ON_CHANGE
+
         self._timer_ids = {
             'advertise_timer': None
         }
 
         self._switches_status = {}
 
+        self._bridge = nmea_bridge
+
         self._init_settings()
 
-        self._bridge = nmea_bridge
         self._bridge.add_pgn_handler(127502, self._on_ds_change)
 
 
@@ -135,6 +140,9 @@ class NMEADSConnector(AbstractConnector):
         if self._settings['AdvertiseInterval'] != 0:
             self._add_timer('advertise_timer', self._advertise_ds, self._settings['AdvertiseInterval']*1000, False)
 
+        # the bank status is also sent on each state change, most of the time unchanged : only the advertisements repeat it
+        self._bridge.enable_change_suppression(127501, self._settings['AdvertiseInterval'])
+
 
     def _on_ds_change(self, nmea_message):
         """Called when a new Digital Switching NMEA message arrives."""
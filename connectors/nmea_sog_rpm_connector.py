@@ -23,6 +23,7 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmState
 
 import logging
@@ -31,6 +32,9 @@ logger = logging.getLogger(__name__)
 class NMEASOGRPMConnector(AbstractConnector):
     def __init__(self, timer_provider, settings_provider, nmea_bridge):
         super().__init__(timer_provider, settings_provider)
+
+        # only reacts to state changes
+        self.update_policy = UPDATE_ON_CHANGE
         
         self._init_settings()
 
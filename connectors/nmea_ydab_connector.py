@@ -24,7 +24,9 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from abstract_connector import AbstractConnector
+from abstract_connector import UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmState
+from bridge_scheduler import PRIORITY_ALARM
 
 import logging
 logger = logging.getLogger(__name__)
@@ -33,6 +35,9 @@ class NMEAYDABConnector(AbstractConnector):
     def __init__(self, timer_provider, settings_provider, nmea_bridge):
         super().__init__(timer_provider, settings_provider)
 
+        # only reacts to state changes
+        self.update_policy = UPDATE_ON_CHANGE
+
         self._timer_ids = {
             'config_command_timeout': None
         }
@@ -182,7 +187,7 @@ class NMEAYDABConnector(AbstractConnector):
         }
 
         logger.debug("Sending config command", nmea_message)
-        self._bridge.send_nmea(nmea_message)
+        self._bridge.send_nmea(nmea_message, priority=PRIORITY_ALARM)
 
 
     def _send_ds_command_for_state(self, state):
@@ -201,7 +206,7 @@ class NMEAYDABConnector(AbstractConnector):
             nmea_message['fields'][self._switch_name_for(state)] = "On"
 
         logger.debug("Sending DS message", nmea_message)
-        self._bridge.send_nmea(nmea_message)
+        self._bridge.send_nmea(nmea_message, priority=PRIORITY_ALARM)
 
     def _switch_name_for(self, state):
         mapping = {
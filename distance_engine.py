@@ -0,0 +1,172 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+import math
+
+# bundle our dependencies
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'ext'))
+
+from geopy.distance import geodesic
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# WGS84 ellipsoid
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+
+# returned when coordinates are invalid, same as what the model always used
+INVALID_DISTANCE = 999
+
+
+def geodesic_distance(origin, position):
+    """Exact (Karney) distance in meters between two GPSPosition, INVALID_DISTANCE if coordinates are invalid"""
+    try:
+        return geodesic((origin.latitude, origin.longitude), (position.latitude, position.longitude)).meters
+    except Exception:
+        return INVALID_DISTANCE
+
+
+class LocalTangentPlane(object):
+    """Local planar projection around an origin point.
+    Scale factors (meters per degree) are computed once from the WGS84 curvature radii at the origin latitude,
+    with a first order correction of the longitude scale for the latitude of the projected point.
+    Accurate to a few centimeters under 2km, which is more than enough for an anchorage."""
+
+    def __init__(self, origin):
+        self.origin = origin
+
+        self._latitude = float(origin.latitude)
+        self._longitude = float(origin.longitude)
+
+        if self._latitude < -90 or self._latitude > 90:
+            raise ValueError("Invalid origin latitude "+ str(origin.latitude))
+
+        phi = math.radians(self._latitude)
+        sin_phi = math.sin(phi)
+        cos_phi = math.cos(phi)
+        w = 1 - _WGS84_E2 * sin_phi * sin_phi
+
+        meridional_radius = _WGS84_A * (1 - _WGS84_E2) / (w * math.sqrt(w))
+        normal_radius = _WGS84_A / math.sqrt(w)
+
+        deg = math.pi / 180
+
+        # meters per degree of latitude, and its variation per degree to account for the ellipsoid flattening
+        self._k_lat = meridional_radius * deg
+        self._k_lat_slope = 3 * _WGS84_E2 * sin_phi * cos_phi / w * self._k_lat * deg
+
+        # meters per degree of longitude at origin, and its variation per degree of latitude
+        self._k_lon = normal_radius * cos_phi * deg
+        self._k_lon_slope = normal_radius * sin_phi * deg * deg
+
+    def to_xy(self, latitude, longitude):
+        """Returns (east, north) offsets in meters from the origin"""
+        d_lat = latitude - self._latitude
+        d_lon = longitude - self._longitude
+
+        # handle antimeridian
+        if d_lon > 180:
+            d_lon -= 360
+        elif d_lon < -180:
+            d_lon += 360
+
+        half_lat = d_lat * 0.5
+        north = d_lat * (self._k_lat + self._k_lat_slope * half_lat)
+        east = d_lon * (self._k_lon - self._k_lon_slope * half_lat)
+        return east, north
+
+    def from_xy(self, east, north):
+        """Returns (latitude, longitude) of a point given its (east, north) offsets in meters from the origin"""
+        d_lat = north / self._k_lat
+        for i in range(2):
+            d_lat = north / (self._k_lat + self._k_lat_slope * d_lat * 0.5)
+
+        d_lon = east / (self._k_lon - self._k_lon_slope * d_lat * 0.5)
+
+        longitude = self._longitude + d_lon
+        if longitude > 180:
+            longitude -= 360
+        elif longitude < -180:
+            longitude += 360
+
+        return self._latitude + d_lat, longitude
+
+    def distance(self, latitude, longitude):
+        """Planar distance in meters from the origin"""
+        east, north = self.to_xy(latitude, longitude)
+        return math.sqrt(east * east + north * north)
+
+
+class DistanceEngine(object):
+    """Computes distances from a drop point.
+    Uses a precomputed LocalTangentPlane on the hot path and only falls back to an exact geodesic
+    when the planar result is within geodesic_band meters of the alarm boundary, where the exact value
+    decides the state transition."""
+
+    def __init__(self, geodesic_band=5):
+        self.geodesic_band = geodesic_band
+        self._plane = None
+
+        # counters, useful to monitor how often we fall back on the geodesic
+        self.planar_count = 0
+        self.geodesic_count = 0
+
+    def set_origin(self, origin):
+        """Precomputes scale factors for a new drop point. origin can be None to clear it"""
+        self._plane = None
+        if origin is None:
+            return
+
+        try:
+            self._plane = LocalTangentPlane(origin)
+        except (ValueError, TypeError):
+            logger.error("Invalid drop point "+ str(origin) +", will use geodesic distances")
+
+    def distance(self, origin, position, boundary=None):
+        """Distance in meters between origin and position.
+        If boundary is given and the planar distance is within geodesic_band of it, returns the exact geodesic distance"""
+        if self._plane is None or self._plane.origin != origin:
+            self.set_origin(origin)
+
+        if self._plane is None:
+            self.geodesic_count += 1
+            return geodesic_distance(origin, position)
+
+        try:
+            latitude = float(position.latitude)
+            longitude = float(position.longitude)
+        except (ValueError, TypeError):
+            return INVALID_DISTANCE
+
+        if latitude < -90 or latitude > 90 or longitude < -180 or longitude > 180:
+            return INVALID_DISTANCE
+
+        distance = self._plane.distance(latitude, longitude)
+
+        if boundary is not None and abs(distance - boundary) <= self.geodesic_band:
+            self.geodesic_count += 1
+            return geodesic_distance(origin, position)
+
+        self.planar_count += 1
+        return distance
@@ -25,15 +25,48 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 from utils import AbstractTimerUtils
 
 from collections import namedtuple
-GPSPosition = namedtuple('GPSPosition', ['latitude', 'longitude'])
+# accuracy : estimated horizontal accuracy in meters, None if the provider does not know it
+GPSPosition = namedtuple('GPSPosition', ['latitude', 'longitude', 'accuracy'], defaults=[None])
+
+# sog : speed over ground in m/s, cog : course over ground in radians
+GPSVelocity = namedtuple('GPSVelocity', ['sog', 'cog'])
+
+# GPS position shared by the controller with all consumers for a tick or a fix
+# position : GPSPosition or None, source : id of the provider source, epoch : increased every time a snapshot is taken
+# timestamp : monotonic time the snapshot was taken, age : seconds since timestamp when the snapshot was handed out
+GPSSnapshot = namedtuple('GPSSnapshot', ['position', 'source', 'epoch', 'timestamp', 'age'], defaults=[None, 0, None, None])
 
 class AbstractGPSProvider(AbstractTimerUtils):
     def __init__(self, timer_provider):
         super().__init__(timer_provider)
 
+        # set by the controller, called with (provider, GPSPosition) when a new fix arrives, or (provider, None) when the fix is lost
+        self.on_gps_position = None
+
+        # seconds a pushed fix is valid for if no other one comes, None if the provider always pushes None when it loses the fix
+        self.fix_timeout = None
+
     def get_gps_position(self):
         """Returns the last verified GPS position as a GPSPosition namedtuple
         Provider should invalidate the GPS position if it becomes outdated by returning None
         """
 
-        return None
\ No newline at end of file
+        return None
+
+    def get_gps_velocity(self):
+        """Returns the last speed and course over ground as a GPSVelocity namedtuple, None if unknown or outdated"""
+        return None
+
+    def get_fix_id(self):
+        """Changes with every new fix behind the position returned by get_gps_position, so the same fix returned
+        on several calls can be told apart from a new one. None if the provider can't tell"""
+        return None
+
+    def get_source_id(self):
+        """Identifies where the last position returned by get_gps_position comes from"""
+        return type(self).__name__
+
+    def _notify_gps_position(self, gps_position):
+        """Pushes a new fix to the controller, if it registered for it"""
+        if self.on_gps_position is not None:
+            self.on_gps_position(self, gps_position)
\ No newline at end of file
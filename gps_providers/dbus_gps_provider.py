@@ -50,6 +50,13 @@ class DBusGPSProvider(AbstractGPSProvider):
         self._gpses = set()
         self._current_service = None
 
+        # increased whenever the position of the current service changes
+        self._fix_count = 0
+
+        self._timer_ids = {
+            'notify_gps_position': None
+        }
+
         
         self._dbusmonitor = self._create_dbus_monitor(monitorlist, valueChangedCallback=self._dbus_value_changed,
 			deviceAddedCallback=self._device_added, deviceRemovedCallback=self._device_removed)
@@ -76,11 +83,24 @@ class DBusGPSProvider(AbstractGPSProvider):
         return gps_position
 
 
+    def get_fix_id(self):
+        return self._fix_count
+
+    def get_source_id(self):
+        return str(self._current_service)
+
     def _dbus_value_changed(self, dbusServiceName, dbusPath, dict, changes, deviceInstance):
-#        logger.info("_dbus_value_changed called "+ dbusServiceName +"/"+dbusPath)
-#        logger.info(dict)
-#        logger.info(changes)
-        pass
+        if dbusServiceName != self._current_service or dbusPath not in ['/Position/Latitude', '/Position/Longitude']:
+            return
+
+        self._fix_count += 1
+
+        # latitude and longitude are updated separately, push the fix once both got a chance to be updated
+        self._add_timer('notify_gps_position', self._on_position_updated, 0)
+
+    def _on_position_updated(self):
+        if self._current_service is not None:
+            self._notify_gps_position(self.get_gps_position())
 
     def _device_added(self, service, instance):
         if service.startswith('com.victronenergy.gps.'):
@@ -100,11 +120,15 @@ class DBusGPSProvider(AbstractGPSProvider):
             fix = self._dbusmonitor.get_value(service, '/Fix')
             if fix:
                 logger.info('got fixed GPS service on '+ service)
+                if service != self._current_service:
+                    self._fix_count += 1
                 self._current_service = service
                 break
         else:
             logger.info('no GPS service found')
-            self._current_service = None
+            if self._current_service is not None:
+                self._current_service = None
+                self._notify_gps_position(None)
 
 
 
@@ -20,6 +20,8 @@
 
 import sys
 import os
+import time
+import math
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 
@@ -29,31 +31,90 @@ import logging
 
 from abstract_gps_provider import AbstractGPSProvider
 from abstract_gps_provider import GPSPosition
+from abstract_gps_provider import GPSVelocity
+from distance_engine import LocalTangentPlane
 
 logger = logging.getLogger(__name__)
 
+# User Equivalent Range Error in meters for each 129029 Method, multiplied by the DOP to get an estimated accuracy
+# https://canboat.github.io/canboat/canboat.html#lookup-GNS_METHOD
+_METHOD_UERE = {
+    "GNSS fix":                 5,
+    "DGNSS fix":                1.5,
+    "Precise GNSS":             1.5,
+    "RTK float":                0.5,
+    "RTK Fixed Integer":        0.05,
+    "Estimated (DR) mode":      50,
+    "Manual Input":             50,
+    "Simulate mode":            50,
+}
+_DEFAULT_UERE = 5
+_DEFAULT_DOP = 2
+
+# fixes computed with less satellites than that get their accuracy degraded
+_MIN_SVS = 5
+
+
 class NMEAGPSProvider(AbstractGPSProvider):
-    def __init__(self, timer_provider, nmea_bridge):
+    def __init__(self, timer_provider, nmea_bridge, clock=time.monotonic, settings_provider=None):
         super().__init__(timer_provider)
 
         self._INVALIDATE_DURATION = 2000
+        self.fix_timeout = self._INVALIDATE_DURATION / 1000
 
-        self._timer_ids = {
-            'invalidate': None
-        }
-
+        # positions older than _INVALIDATE_DURATION are ignored, no need for a timer per fix
+        self._clock = clock
         self._gps_positions = {}
+        self._received_times = {}
+
+        # increased on every fix received, by source
+        self._fix_count = 0
+        self._fix_ids = {}
 
         self._current_gps_src = None
 
+        # fused when a fix is received, get_gps_position only returns the last fused position
+        self._fusion = False
+        self._outlier_distance = 15
+        self._fused_position = None
+        self._fused_fix_id = None
+        self._fused_time = None
+        self._fused_srcs = []
+
+        self._gps_velocity = None
+        self._gps_velocity_time = None
+
+        self._settings_provider = settings_provider
+        if settings_provider is not None:
+            self._init_settings()
+
         self._bridge = nmea_bridge
 
         # we do not rely on 129025 because they might keep sending the last known position
         # even if source lost the GPS fix
-        self._bridge.add_pgn_handler(129029, self._on_gnss_position_data)
+        self._bridge.add_pgn_handler(129029, self._on_gnss_position_data, fields=["Latitude", "Longitude", "Method", "HDOP", "PDOP", "Number of SVs"])
+        # the position filter reads the latest velocity once per tick, no need for every rapid update
+        self._bridge.add_pgn_handler(129026, self._on_cog_sog, throttle=True, fields=["COG Reference", "COG", "SOG"])
 
-        
-        
+
+    def _init_settings(self):
+        # create the setting that are needed
+        settingsList = {
+            # Combine all sources with a fix, weighted by their accuracy, instead of sticking to the first one
+            "Fusion":           ["/Settings/AnchorAlarm/NMEA/GPS/Fusion", 0, 0, 1],
+
+            # Sources further than that from the fused position are ignored, in meters
+            "OutlierDistance":  ["/Settings/AnchorAlarm/NMEA/GPS/OutlierDistance", 15, 1, 100]
+        }
+
+        self._settings = self._settings_provider(settingsList, self._on_setting_changed)
+        self._on_setting_changed(None, None, None)
+
+    def _on_setting_changed(self, key, old_value, new_value):
+        self._fusion = self._settings['Fusion'] == 1
+        self._outlier_distance = self._settings['OutlierDistance']
+        self._fused_position = None
+        self._fused_fix_id = None
 
     def _on_gnss_position_data(self, nmea_message):
         if "fields" not in nmea_message:
@@ -81,18 +142,100 @@ class NMEAGPSProvider(AbstractGPSProvider):
 
 
         if has_fix:
-            self._gps_positions[nmea_message['src']] = GPSPosition(nmea_message["fields"]["Latitude"], nmea_message["fields"]["Longitude"])
-            self._add_timer('invalidate_'+ str(nmea_message['src']), lambda: self._gps_positions.pop(nmea_message['src'], None), self._INVALIDATE_DURATION)
-        else:
-            self._gps_positions.pop(nmea_message['src'], None)
+            accuracy = self._estimate_accuracy(nmea_message["fields"])
+            gps_position = GPSPosition(nmea_message["fields"]["Latitude"], nmea_message["fields"]["Longitude"], accuracy)
+            self._gps_positions[nmea_message['src']] = gps_position
+            self._received_times[nmea_message['src']] = self._clock()
+            self._fix_count += 1
+            self._fix_ids[nmea_message['src']] = self._fix_count
+
+            if self._fusion:
+                self._notify_gps_position(self._fuse_gps_positions())
+
+            # only push fixes coming from the preferred source
+            elif self.get_gps_position() is gps_position:
+                self._notify_gps_position(gps_position)
+        elif nmea_message['src'] in self._gps_positions:
+            self._remove_gps_position(nmea_message['src'])
+
+            if self._fusion and len(self._gps_positions):
+                self._fuse_gps_positions()
+
+            # other sources will push their next fix
+            if len(self._gps_positions) == 0:
+                self._notify_gps_position(None)
+
+
+    def _on_cog_sog(self, nmea_message):
+        # {'canId': 167248387, 'prio': 2, 'src': 3, 'dst': 255, 'pgn': 129026, 'timestamp': '2025-05-16T13:51:59.279Z', 'fields': {'SID': 208, 'COG Reference': 'True', 'COG': 0.2787, 'SOG': 0.07}, 'description': 'COG & SOG, Rapid Update'}
+        if "fields" not in nmea_message or "SOG" not in nmea_message["fields"] or "COG" not in nmea_message["fields"]:
+            return
+
+        if nmea_message["fields"].get("COG Reference") not in [None, "True"]:
+            return
+
+        # only use the source we get positions from
+        if self._fusion or nmea_message.get("src") == self._current_gps_src:
+            self._gps_velocity = GPSVelocity(nmea_message["fields"]["SOG"], nmea_message["fields"]["COG"])
+            self._gps_velocity_time = self._clock()
+
+    def get_gps_velocity(self):
+        if self._gps_velocity is None or self._clock() - self._gps_velocity_time >= self._INVALIDATE_DURATION / 1000:
+            return None
+
+        return self._gps_velocity
+
+    def _estimate_accuracy(self, fields):
+        """Estimated horizontal accuracy in meters (1 sigma) from the 129029 Method, HDOP (or PDOP) and number of SVs"""
+        uere = _METHOD_UERE.get(fields["Method"], _DEFAULT_UERE)
+
+        dop = _DEFAULT_DOP
+        for key in ("HDOP", "PDOP"):
+            if isinstance(fields.get(key), (int, float)) and fields[key] > 0:
+                dop = fields[key]
+                break
+
+        accuracy = uere * dop
+        svs = fields.get("Number of SVs")
+        if isinstance(svs, int) and svs < _MIN_SVS:
+            accuracy = accuracy * 2
+
+        return accuracy
 
+    def _remove_gps_position(self, src):
+        self._gps_positions.pop(src, None)
+        self._received_times.pop(src, None)
+        self._fix_ids.pop(src, None)
 
+    def _remove_outdated_gps_positions(self):
+        outdated_time = self._clock() - self._INVALIDATE_DURATION / 1000
+        for src in [src for src, received_time in self._received_times.items() if received_time <= outdated_time]:
+            self._remove_gps_position(src)
+
+
+    def get_fix_id(self):
+        # the fused position is a new one whenever a fix is received
+        if self._fusion:
+            return self._fused_fix_id
+
+        return self._fix_ids.get(self._current_gps_src)
+
+    def get_source_id(self):
+        if self._fusion:
+            return "NMEA fused "+ ",".join(str(src) for src in self._fused_srcs)
+
+        return "NMEA "+ str(self._current_gps_src)
 
     def get_gps_position(self):
+        self._remove_outdated_gps_positions()
+
         if len(self._gps_positions) == 0:
             logger.info("No 129029 PGN source with Fix")
             return None
 
+        if self._fusion:
+            return self._fused_position
+
         # if we started returning a position from a source, keep this source to avoid bouncing effect
         # between multiple slightly different gps coordinates, eg when antennas are not in the same place
         if self._current_gps_src and self._current_gps_src in self._gps_positions:
@@ -104,6 +247,60 @@ class NMEAGPSProvider(AbstractGPSProvider):
         return self._gps_positions[self._current_gps_src]
 
 
+    def _fuse_gps_positions(self):
+        """Inverse variance weighted mean of all sources, ignoring the ones too far from the consensus"""
+        self._remove_outdated_gps_positions()
+        weights = {src: 1 / (position.accuracy * position.accuracy) for src, position in self._gps_positions.items()}
+
+        # consensus is the last fused position if still valid, the most accurate source otherwise
+        reference = self._fused_position
+        if reference is None or self._clock() - self._fused_time >= self._INVALIDATE_DURATION / 1000:
+            reference = self._gps_positions[max(weights, key=weights.get)]
+
+        srcs = self._select_gps_sources(reference)
+        if len(srcs) == 0:
+            # everybody moved away from the last fused position, start again from the most accurate source
+            srcs = self._select_gps_sources(self._gps_positions[max(weights, key=weights.get)])
+
+        total_weight = 0
+        d_lat = 0
+        d_lon = 0
+        for src in srcs:
+            position = self._gps_positions[src]
+            offset_lon = position.longitude - reference.longitude
+            if offset_lon > 180:
+                offset_lon -= 360
+            elif offset_lon < -180:
+                offset_lon += 360
+
+            total_weight += weights[src]
+            d_lat += weights[src] * (position.latitude - reference.latitude)
+            d_lon += weights[src] * offset_lon
+
+        longitude = reference.longitude + d_lon / total_weight
+        if longitude > 180:
+            longitude -= 360
+        elif longitude < -180:
+            longitude += 360
+
+        self._fused_srcs = srcs
+        self._fused_time = self._clock()
+        self._fused_fix_id = self._fix_count
+        self._fused_position = GPSPosition(reference.latitude + d_lat / total_weight, longitude, math.sqrt(1 / total_weight))
+        return self._fused_position
+
+    def _select_gps_sources(self, reference):
+        plane = LocalTangentPlane(reference)
+
+        srcs = []
+        for src, position in self._gps_positions.items():
+            if plane.distance(position.latitude, position.longitude) <= self._outlier_distance:
+                srcs.append(src)
+            else:
+                logger.debug("Ignoring outlier source "+ str(src))
+
+        return srcs
+
 
 
 
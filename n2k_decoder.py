@@ -0,0 +1,353 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import socket
+import struct
+from collections import namedtuple
+from decimal import Decimal
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# bit offset and length in the payload, resolution and lookup table as in canboat pgns.json.
+# Only the fields the service uses, and the simple ones around them, are decoded
+Field = namedtuple('Field', ['name', 'offset', 'length', 'signed', 'resolution', 'lookup'], defaults=[False, 1, None])
+
+# PGN definition. fields is a list of Field, or a function decoding the payload for PGNs with variable length fields
+PGNDefinition = namedtuple('PGNDefinition', ['description', 'fast_packet', 'fields'])
+
+
+_DIRECTION_REFERENCE = {0: 'True', 1: 'Magnetic', 2: 'Error'}
+_OFF_ON = {0: 'Off', 1: 'On'}
+_NO_YES = {0: 'No', 1: 'Yes'}
+_AIS_MESSAGE_ID = {18: 'Standard Class B position report', 19: 'Extended Class B position report', 24: 'Static data report'}
+_AIS_REPEAT = {0: 'Initial', 1: 'First retransmission', 2: 'Second retransmission', 3: 'Final retransmission'}
+_AIS_TRANSCEIVER = {0: 'Channel A VDL reception', 1: 'Channel B VDL reception', 2: 'Channel A VDL transmission', 3: 'Channel B VDL transmission', 4: 'Own information not broadcast', 5: 'Reserved'}
+_GNS = {0: 'GPS', 1: 'GLONASS', 2: 'GPS+GLONASS', 3: 'GPS+SBAS/WAAS', 4: 'GPS+SBAS/WAAS+GLONASS', 5: 'Chayka', 6: 'integrated', 7: 'surveyed', 8: 'Galileo'}
+_GNS_METHOD = {0: 'no GNSS', 1: 'GNSS fix', 2: 'DGNSS fix', 3: 'Precise GNSS', 4: 'RTK Fixed Integer', 5: 'RTK float', 6: 'Estimated (DR) mode', 7: 'Manual Input', 8: 'Simulate mode'}
+_GNS_INTEGRITY = {0: 'No integrity checking', 1: 'Safe', 2: 'Caution'}
+_ENGINE_INSTANCE = {0: 'Single Engine or Dual Engine Port', 1: 'Dual Engine Starboard'}
+_WIND_REFERENCE = {0: 'True (ground referenced to North)', 1: 'Magnetic (ground referenced to Magnetic North)', 2: 'Apparent', 3: 'True (boat referenced)', 4: 'True (water referenced)'}
+_ALERT_TYPE = {1: 'Emergency Alarm', 2: 'Alarm', 5: 'Warning', 8: 'Caution'}
+_ALERT_CATEGORY = {0: 'Navigational', 1: 'Technical'}
+_ALERT_RESPONSE_COMMAND = {0: 'Acknowledge', 1: 'Temporary Silence', 2: 'Test Command off', 3: 'Test Command on'}
+
+
+def _decode_configuration_information(data):
+    """126998 is three STRING_LAU : length including the 2 header bytes, encoding (0 UTF-16, 1 ASCII), characters"""
+    fields = {}
+    offset = 0
+    for name in ['Installation Description #1', 'Installation Description #2', 'Manufacturer Information']:
+        if offset + 2 > len(data):
+            break
+
+        length = max(data[offset], 2)
+        encoding = 'utf-16-le' if data[offset + 1] == 0 else 'latin-1'
+        value = data[offset + 2:offset + length].decode(encoding, errors='replace').rstrip('\x00\xff')
+        offset += length
+
+        if value:
+            fields[name] = value
+
+    return fields
+
+
+_PGNS = {
+    126984: PGNDefinition('Alert Response', True, [
+        Field('Alert Type', 0, 4, lookup=_ALERT_TYPE),
+        Field('Alert Category', 4, 4, lookup=_ALERT_CATEGORY),
+        Field('Alert System', 8, 8),
+        Field('Alert Sub-System', 16, 8),
+        Field('Alert ID', 24, 16),
+        Field('Data Source Network ID NAME', 40, 64),
+        Field('Data Source Instance', 104, 8),
+        Field('Data Source Index-Source', 112, 8),
+        Field('Alert Occurrence Number', 120, 8),
+        Field('Acknowledge Source Network ID NAME', 128, 64),
+        Field('Response Command', 192, 2, lookup=_ALERT_RESPONSE_COMMAND),
+    ]),
+    126998: PGNDefinition('Configuration Information', True, _decode_configuration_information),
+    127250: PGNDefinition('Vessel Heading', False, [
+        Field('SID', 0, 8),
+        Field('Heading', 8, 16, resolution=0.0001),
+        Field('Deviation', 24, 16, True, 0.0001),
+        Field('Variation', 40, 16, True, 0.0001),
+        Field('Reference', 56, 2, lookup=_DIRECTION_REFERENCE),
+    ]),
+    127488: PGNDefinition('Engine Parameters, Rapid Update', False, [
+        Field('Instance', 0, 8, lookup=_ENGINE_INSTANCE),
+        Field('Speed', 8, 16, resolution=0.25),
+        Field('Boost Pressure', 24, 16, resolution=100),
+        Field('Tilt/Trim', 40, 8, True),
+    ]),
+    127502: PGNDefinition('Switch Bank Control', False,
+        [Field('Instance', 0, 8)] + [Field('Switch'+ str(i), 8 + (i - 1) * 2, 2, lookup=_OFF_ON) for i in range(1, 29)]),
+    128267: PGNDefinition('Water Depth', False, [
+        Field('SID', 0, 8),
+        Field('Depth', 8, 32, resolution=0.01),
+        Field('Offset', 40, 16, True, 0.001),
+        Field('Range', 56, 8, resolution=10),
+    ]),
+    129026: PGNDefinition('COG & SOG, Rapid Update', False, [
+        Field('SID', 0, 8),
+        Field('COG Reference', 8, 2, lookup=_DIRECTION_REFERENCE),
+        Field('COG', 16, 16, resolution=0.0001),
+        Field('SOG', 32, 16, resolution=0.01),
+    ]),
+    129029: PGNDefinition('GNSS Position Data', True, [
+        Field('SID', 0, 8),
+        Field('Latitude', 56, 64, True, 1e-16),
+        Field('Longitude', 120, 64, True, 1e-16),
+        Field('Altitude', 184, 64, True, 1e-6),
+        Field('GNSS type', 248, 4, lookup=_GNS),
+        Field('Method', 252, 4, lookup=_GNS_METHOD),
+        Field('Integrity', 256, 2, lookup=_GNS_INTEGRITY),
+        Field('Number of SVs', 264, 8),
+        Field('HDOP', 272, 16, True, 0.01),
+        Field('PDOP', 288, 16, True, 0.01),
+        Field('Geoidal Separation', 304, 32, True, 0.01),
+        Field('Reference Stations', 336, 8),
+    ]),
+    129039: PGNDefinition('AIS Class B Position Report', True, [
+        Field('Message ID', 0, 6, lookup=_AIS_MESSAGE_ID),
+        Field('Repeat Indicator', 6, 2, lookup=_AIS_REPEAT),
+        Field('User ID', 8, 32),
+        Field('Longitude', 40, 32, True, 1e-7),
+        Field('Latitude', 72, 32, True, 1e-7),
+        Field('Position Accuracy', 104, 1, lookup={0: 'Low', 1: 'High'}),
+        Field('RAIM', 105, 1, lookup={0: 'not in use', 1: 'in use'}),
+        Field('Time Stamp', 106, 6),
+        Field('COG', 112, 16, resolution=0.0001),
+        Field('SOG', 128, 16, resolution=0.01),
+        Field('AIS Transceiver information', 163, 5, lookup=_AIS_TRANSCEIVER),
+        Field('Heading', 168, 16, resolution=0.0001),
+    ]),
+    129810: PGNDefinition('AIS Class B static data (msg 24 Part B)', True, [
+        Field('Message ID', 0, 6, lookup=_AIS_MESSAGE_ID),
+        Field('Repeat Indicator', 6, 2, lookup=_AIS_REPEAT),
+        Field('User ID', 8, 32),
+        Field('Type of ship', 40, 8),
+        Field('Length', 160, 16, resolution=0.1),
+        Field('Beam', 176, 16, resolution=0.1),
+        Field('Position reference from Starboard', 192, 16, resolution=0.1),
+        Field('Position reference from Bow', 208, 16, resolution=0.1),
+        Field('Mothership User ID', 224, 32),
+    ]),
+    130306: PGNDefinition('Wind Data', False, [
+        Field('SID', 0, 8),
+        Field('Wind Speed', 8, 16, resolution=0.01),
+        Field('Wind Angle', 24, 16, resolution=0.0001),
+        Field('Reference', 40, 3, lookup=_WIND_REFERENCE),
+    ]),
+}
+
+# PGNs N2KDecoder knows about
+SUPPORTED_PGNS = frozenset(_PGNS)
+
+
+def _compile_field(field):
+    # (name, offset, end, mask, sign bit, resolution, decimals, lookup), decimals rounding like canboatjs does
+    decimals = max(0, -Decimal(str(field.resolution)).as_tuple().exponent) if field.resolution != 1 else None
+    sign_bit = 1 << (field.length - 1) if field.signed else 0
+    return (field.name, field.offset, field.offset + field.length, (1 << field.length) - 1, sign_bit, field.resolution, decimals, field.lookup)
+
+_COMPILED_FIELDS = {pgn: [_compile_field(field) for field in definition.fields] for pgn, definition in _PGNS.items() if not callable(definition.fields)}
+
+
+def decode_can_id(can_id):
+    """Returns (prio, pgn, src, dst) of a 29 bits NMEA 2000 CAN identifier"""
+    prio = (can_id >> 26) & 0x7
+    pgn = (can_id >> 8) & 0x3FFFF
+    src = can_id & 0xFF
+
+    # PDU1 : the PS byte is the destination address, not part of the PGN
+    if (pgn >> 8) & 0xFF < 240:
+        return prio, pgn & 0x3FF00, src, pgn & 0xFF
+
+    return prio, pgn, src, 255
+
+
+def decode_fields(pgn, data):
+    """Decodes the payload of a supported PGN in the same fields canboatjs gives. Missing values are left out"""
+    definition = _PGNS[pgn]
+    if callable(definition.fields):
+        return definition.fields(data)
+
+    fields = {}
+    value = int.from_bytes(data, 'little')
+    available_bits = len(data) * 8
+
+    for name, offset, end, mask, sign_bit, resolution, decimals, lookup in _COMPILED_FIELDS[pgn]:
+        if end > available_bits:
+            break
+
+        raw = (value >> offset) & mask
+
+        if sign_bit:
+            # the highest positive value means not available
+            if raw == sign_bit - 1:
+                continue
+            if raw & sign_bit:
+                raw -= mask + 1
+        elif lookup is not None and raw in lookup:
+            fields[name] = lookup[raw]
+            continue
+        elif raw == mask and mask != 1:
+            # all bits set means not available
+            continue
+
+        if decimals is None:
+            fields[name] = raw
+        else:
+            fields[name] = round(raw * resolution, decimals)
+
+    return fields
+
+
+class FastPacketAssembler(object):
+    """Reassembles fast packet PGNs : a first frame with the sequence, frame counter and total length followed by
+    6 bytes, then frames with the sequence, frame counter and 7 bytes.
+    A packet with a lost or out of order frame is dropped."""
+
+    def __init__(self):
+        # (src, pgn) -> [sequence, total length, data, next frame counter]
+        self._packets = {}
+        self.dropped_packets = 0
+
+    def feed(self, pgn, src, frame):
+        """Returns the complete payload when frame is the last one of its packet, None otherwise"""
+        if len(frame) < 2:
+            return None
+
+        sequence = frame[0] >> 5
+        counter = frame[0] & 0x1F
+        key = (src, pgn)
+
+        if counter == 0:
+            if key in self._packets:
+                self.dropped_packets += 1
+
+            length = frame[1]
+            if length <= 6:
+                self._packets.pop(key, None)
+                return bytes(frame[2:2 + length])
+
+            self._packets[key] = [sequence, length, bytearray(frame[2:]), 1]
+            return None
+
+        packet = self._packets.get(key)
+        if packet is None:
+            return None
+
+        if packet[0] != sequence or packet[3] != counter:
+            del self._packets[key]
+            self.dropped_packets += 1
+            return None
+
+        packet[2] += frame[1:]
+        packet[3] += 1
+
+        if len(packet[2]) >= packet[1]:
+            del self._packets[key]
+            return bytes(packet[2][:packet[1]])
+
+        return None
+
+
+class N2KDecoder(object):
+    """Decodes raw NMEA 2000 frames of the PGNs the service listens to, in the same messages nmea_bridge.js sends.
+    Only PGNs in pgns are decoded, others are ignored before any work is done."""
+
+    def __init__(self, pgns=None):
+        self.pgns = set(SUPPORTED_PGNS if pgns is None else pgns) & SUPPORTED_PGNS
+        self._fast_packets = FastPacketAssembler()
+
+    def can_decode(self, pgn):
+        return pgn in SUPPORTED_PGNS
+
+    def decode_frame(self, can_id, frame):
+        """Returns the decoded message, None if the PGN is not wanted or the frame is not the last of a fast packet"""
+        prio, pgn, src, dst = decode_can_id(can_id)
+        if pgn not in self.pgns:
+            return None
+
+        definition = _PGNS[pgn]
+        if definition.fast_packet:
+            frame = self._fast_packets.feed(pgn, src, frame)
+            if frame is None:
+                return None
+
+        return {'prio': prio, 'pgn': pgn, 'src': src, 'dst': dst, 'fields': decode_fields(pgn, frame), 'description': definition.description}
+
+    def get_dropped_packets(self):
+        return self._fast_packets.dropped_packets
+
+
+# (1715000000.123456) can0 0DF20E43#00FFFF3FFFFFFFFF
+_CANDUMP_LOG = re.compile(r'^\s*\((?P<timestamp>[\d.]+)\)\s+\S+\s+(?P<id>[0-9A-Fa-f]+)#(?P<data>[0-9A-Fa-f]*)\s*$')
+
+#   can0  0DF20E43   [8]  00 FF FF 3F FF FF FF FF
+_CANDUMP_DEFAULT = re.compile(r'^\s*(?:\((?P<timestamp>[\d.]+)\)\s+)?\S+\s+(?P<id>[0-9A-Fa-f]+)\s+\[\d\]\s+(?P<data>(?:[0-9A-Fa-f]{2}\s*)*)$')
+
+
+def parse_candump_line(line):
+    """Returns (timestamp, can_id, data) from a candump line, in the -L log format or the default one.
+    timestamp is None when candump was not started with a timestamp option. Returns None for anything else"""
+    match = _CANDUMP_LOG.match(line) or _CANDUMP_DEFAULT.match(line)
+    if match is None:
+        return None
+
+    timestamp = match.group('timestamp')
+    return float(timestamp) if timestamp else None, int(match.group('id'), 16), bytes.fromhex(match.group('data'))
+
+
+def read_candump(lines):
+    """Yields (timestamp, can_id, data) for each frame of a candump output"""
+    for line in lines:
+        frame = parse_candump_line(line)
+        if frame is not None:
+            yield frame
+
+
+# struct can_frame : id, length, padding, data
+_CAN_FRAME = struct.Struct('=IB3x8s')
+
+
+def open_socketcan(can_id):
+    """Non blocking raw SocketCAN socket receiving every frame of can_id"""
+    can_socket = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+    can_socket.bind((can_id,))
+    can_socket.setblocking(False)
+    return can_socket
+
+
+def read_socketcan(can_socket, max_frames):
+    """Yields (can_id, data) for the extended frames waiting in the socket, at most max_frames"""
+    for i in range(max_frames):
+        try:
+            raw = can_socket.recv(_CAN_FRAME.size)
+        except BlockingIOError:
+            return
+
+        can_id, length, data = _CAN_FRAME.unpack(raw)
+        if can_id & socket.CAN_EFF_FLAG and not can_id & (socket.CAN_RTR_FLAG | socket.CAN_ERR_FLAG):
+            yield can_id & socket.CAN_EFF_MASK, data[:length]
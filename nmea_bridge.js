@@ -30,17 +30,32 @@ const parser = new canboatjs.FromPgn()
 
 
 // Store filters for NMEA messages
-let activeFilters = [];
-let throttledPGNs = new Set();
+let activeFilters = new Set();
+let throttledPGNs = new Map(); // pgn -> throttle interval in ms
+let fieldProjections = new Map(); // pgn -> field names to send, all fields when not set
+let templates = new Map(); // template name -> message registered with registerTemplate
+
+// stdout framing, JSON lines until initCAN asks for binary frames
+// binary frame : 12 bytes header (payload length, kind, prio, src, dst, pgn) followed by a JSON payload, see bridge_framing.py
+const FRAME_EVENT = 0; // payload is the same object as in JSON mode
+const FRAME_NMEA = 1;  // payload only contains the decoded fields
+const FRAME_HEADER_SIZE = 12;
+let framing = 'json';
 
 // Throttling configuration
-const THROTTLE_INTERVAL_MS = 1000; // 1 messages per second max
-const throttleState = new Map(); // pgn -> lastSentTimestamp
+// a throttled PGN is delivered at most once per interval for each source, the most recent message at the end of the interval
+// messages are throttled before parsing, only throttle single frame PGNs
+const THROTTLE_INTERVAL_MS = 1000; // used when filter throttle is true
+const throttleState = new Map(); // "pgn:src" -> { lastSent, pending, timer }
 
-function createSimpleCan(canId) {
+// counters returned by getStats. received : messages matching a filter, throttled : replaced by a more recent one before being delivered,
+// unparsed : canboatjs could not parse them, backpressure : stdout writes done while the service was not reading fast enough
+const stats = { received: 0, delivered: 0, throttled: 0, unparsed: 0, backpressure: 0 };
+
+function createSimpleCan(canId, address) {
   return new canboatjs.SimpleCan({
       canDevice: canId,
-      preferredAddress: 66,
+      preferredAddress: address !== undefined ? address : 66,
       disableDefaultTransmitPGNs: true,
       transmitPGNs: [126983, 126985],
       app: {
@@ -78,20 +93,18 @@ function createSimpleCan(canId) {
               }
           }
 
-          if ( ! activeFilters.includes(data.pgn.pgn) )
+          if ( ! activeFilters.has(data.pgn.pgn) )
               return; // we don't care about that message
+
+          stats.received++;
       
           // Check throttling before parsing
-          if (throttledPGNs.has(data.pgn.pgn) && shouldThrottlePGN(data.pgn.pgn)) {
-              return; // Message throttled
+          if (throttledPGNs.has(data.pgn.pgn)) {
+              throttleMessage(data, throttledPGNs.get(data.pgn.pgn));
+              return;
           }
 
-          pgnData = parser.parse(data)
-          //console.log("received message", data, pgnData)
-
-          if ( pgnData ) {
-              sendResponse({ event: 'on_NMEA_message', message: pgnData });
-          }
+          deliverMessage(data);
       }
 
   })
@@ -112,32 +125,166 @@ const rl = readline.createInterface({
 
 // Utility function to send JSON responses to stdout
 function sendResponse(response) {
-  process.stdout.write(JSON.stringify(response) + '\n');
+  if (framing === 'binary') {
+    writeFrame(FRAME_EVENT, 0, 0, 0, 0, JSON.stringify(response));
+  } else {
+    writeStdout(JSON.stringify(response) + '\n');
+  }
+}
+
+function writeStdout(data) {
+  if (!process.stdout.write(data)) {
+    stats.backpressure++;
+  }
+}
+
+function sendNMEAMessage(pgnData) {
+  if (framing === 'binary') {
+    writeFrame(FRAME_NMEA, pgnData.prio || 0, pgnData.src || 0, pgnData.dst || 0, pgnData.pgn, JSON.stringify(pgnData.fields || {}));
+  } else {
+    sendResponse({ event: 'on_NMEA_message', message: pgnData });
+  }
+}
+
+// Only keep the fields handlers asked for, and drop input and description nobody uses
+function projectFields(pgnData) {
+  const projection = fieldProjections.get(pgnData.pgn);
+  if (!projection || !pgnData.fields) {
+    return pgnData;
+  }
+
+  const fields = {};
+  for (const name of projection) {
+    if (name in pgnData.fields) {
+      fields[name] = pgnData.fields[name];
+    }
+  }
+
+  return { canId: pgnData.canId, prio: pgnData.prio, src: pgnData.src, dst: pgnData.dst, pgn: pgnData.pgn, timestamp: pgnData.timestamp, fields };
 }
 
-// Throttling logic
-function shouldThrottlePGN(pgn) {
+function writeFrame(kind, prio, src, dst, pgn, payload) {
+  const length = Buffer.byteLength(payload);
+  const frame = Buffer.allocUnsafe(FRAME_HEADER_SIZE + length);
+  frame.writeUInt32BE(length, 0);
+  frame.writeUInt8(kind, 4);
+  frame.writeUInt8(prio & 0xff, 5);
+  frame.writeUInt8(src & 0xff, 6);
+  frame.writeUInt8(dst & 0xff, 7);
+  frame.writeUInt32BE(pgn, 8);
+  frame.write(payload, FRAME_HEADER_SIZE);
+  writeStdout(frame);
+}
+
+function deliverMessage(data) {
+  const pgnData = parser.parse(data);
+  //console.log("received message", data, pgnData)
+
+  if ( pgnData ) {
+    stats.delivered++;
+    sendNMEAMessage(projectFields(pgnData));
+  } else {
+    stats.unparsed++;
+  }
+}
+
+// Throttling logic : first message delivered right away, then the latest one at the end of each interval
+function throttleMessage(data, interval) {
+  const key = data.pgn.pgn + ':' + data.pgn.src;
   const now = Date.now();
-  const lastSent = throttleState.get(pgn) || 0;
-  
-  if (now - lastSent >= THROTTLE_INTERVAL_MS) {
-    throttleState.set(pgn, now);
-    return false; // Don't throttle, allow message
+
+  let state = throttleState.get(key);
+  if (!state) {
+    state = { lastSent: 0, pending: null, timer: null };
+    throttleState.set(key, state);
+  }
+
+  if (!state.timer && now - state.lastSent >= interval) {
+    state.lastSent = now;
+    deliverMessage(data);
+    return;
   }
-  return true; // Throttle this message
+
+  if (state.pending) {
+    stats.throttled++;
+  }
+
+  state.pending = data;
+  if (!state.timer) {
+    state.timer = setTimeout(() => {
+      state.timer = null;
+      if (state.pending) {
+        const pending = state.pending;
+        state.pending = null;
+        state.lastSent = Date.now();
+        deliverMessage(pending);
+      }
+    }, interval - (now - state.lastSent));
+  }
+}
+
+function clearThrottleState(pgn) {
+  throttleState.forEach((state, key) => {
+    if (pgn === undefined || key.startsWith(pgn + ':')) {
+      if (state.timer) {
+        clearTimeout(state.timer);
+      }
+      throttleState.delete(key);
+    }
+  });
+}
+
+// Filters handling, a filter is { pgn, throttle, fields }
+function addFilter(filterObj) {
+  removeFilter(filterObj.pgn);
+
+  activeFilters.add(filterObj.pgn);
+  if (filterObj.throttle === true) {
+    throttledPGNs.set(filterObj.pgn, THROTTLE_INTERVAL_MS);
+  } else if (typeof filterObj.throttle === 'number' && filterObj.throttle > 0) {
+    throttledPGNs.set(filterObj.pgn, filterObj.throttle);
+  }
+  if (Array.isArray(filterObj.fields)) {
+    fieldProjections.set(filterObj.pgn, filterObj.fields);
+  }
+}
+
+function removeFilter(pgn) {
+  activeFilters.delete(pgn);
+  throttledPGNs.delete(pgn);
+  fieldProjections.delete(pgn);
+  clearThrottleState(pgn);
+}
+
+// message of a template with its variable fields, must match merge_template in bridge_scheduler.py
+function mergeTemplate(template, fields) {
+  if (template.fields) {
+    return Object.assign({}, template, { fields: Object.assign({}, template.fields, fields) });
+  }
+
+  return Object.assign({}, template, fields);
+}
+
+function filtersResponse(event, id) {
+  return { event, id, filters: Array.from(activeFilters), throttled: Object.fromEntries(throttledPGNs), projected: Array.from(fieldProjections.keys()) };
 }
 
 // Function to handle incoming commands
 function handleCommand(command) {
-  const { id, command: cmd, message, filter, canId, throttle } = command;
+  const { id, command: cmd, message, filter, canId, throttle, framing: requestedFraming, add, remove, template, fields, address } = command;
 
   switch (cmd) {
     case 'initCAN': 
       if(canId) {
         try {
-          simpleCan = createSimpleCan(canId)
+          // address is the one claimed before the service restarted us, if any
+          simpleCan = createSimpleCan(canId, address)
           simpleCan.start()
-          sendResponse({ event: 'on_initCAN', id, canId: canId });
+
+          // the answer is still a JSON line, everything after it uses the negotiated framing
+          const acceptedFraming = requestedFraming === 'binary' ? 'binary' : 'json';
+          sendResponse({ event: 'on_initCAN', id, canId: canId, framing: acceptedFraming });
+          framing = acceptedFraming;
         } catch(e) {
           console.error(e)
           sendResponse({ event: 'on_initCAN', id, canId: canId, error: e.message });
@@ -160,25 +307,55 @@ function handleCommand(command) {
       }
       break;
 
+    case 'registerTemplate':
+      if (template && message) {
+        templates.set(template, message);
+        sendResponse({ event: 'on_registerTemplate', id, template });
+      } else {
+        sendResponse({ event: 'error', id, result: 1, error: 'template or message is missing in registerTemplate call' });
+      }
+      break;
+
+    case 'sendTemplate':
+      if ( ! simpleCan ) {
+        sendResponse({ event: 'error', id, result: 1, error: 'CAN device not initialized in sendTemplate call' });
+      }
+      else if (templates.has(template)) {
+        simpleCan.sendPGN(mergeTemplate(templates.get(template), fields || {}));
+        sendResponse({ event: 'on_sendTemplate', id, result: 0 });
+      } else {
+        sendResponse({ event: 'error', id, result: 1, error: `Unknown template ${template} in sendTemplate call` });
+      }
+      break;
+
     case 'filterPGN':
       if (Array.isArray(filter)) {
-        // Extract PGNs and throttled PGNs from filter objects
-        activeFilters = [];
-        throttledPGNs = new Set();
-        
-        filter.forEach(filterObj => {
-          activeFilters.push(filterObj.pgn);
-          if (filterObj.throttle === true) {
-            throttledPGNs.add(filterObj.pgn);
-          }
-        });
+        // Replace all filters
+        activeFilters.forEach(pgn => removeFilter(pgn));
+        filter.forEach(addFilter);
         
-        sendResponse({ event: 'on_filterPGN', id, filters: activeFilters, throttled: Array.from(throttledPGNs) });
+        sendResponse(filtersResponse('on_filterPGN', id));
       } else {
         sendResponse({ event: 'error', id, result: 1, error: 'invalid filter format in filterPGN call' });
       }
       break;
 
+    case 'updateFilterPGN':
+      // incremental update, filters in add replace existing ones for the same PGN
+      if (Array.isArray(add) && Array.isArray(remove)) {
+        remove.forEach(removeFilter);
+        add.forEach(addFilter);
+
+        sendResponse(filtersResponse('on_updateFilterPGN', id));
+      } else {
+        sendResponse({ event: 'error', id, result: 1, error: 'invalid add or remove in updateFilterPGN call' });
+      }
+      break;
+
+    case 'getStats':
+      sendResponse({ event: 'on_getStats', id, stats });
+      break;
+
     default:
       sendResponse({ event: 'error', id, error: `Unknown command: ${cmd}` });
       break;
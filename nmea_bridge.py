@@ -20,59 +20,220 @@
 
 import json
 import uuid
+import time
+import fcntl
+import termios
+import array
 from subprocess import Popen, PIPE
+from collections import deque
 from gi.repository import GLib
 
 import logging
 logger = logging.getLogger(__name__)
 
 from utils import exit_on_error, handle_stdin, find_n2k_can
+from bridge_framing import StreamDecoder, FRAME_NMEA, FRAMING_BINARY, FRAMING_JSON
+from n2k_decoder import N2KDecoder, open_socketcan, read_socketcan
+from bridge_scheduler import OutboundScheduler, ChangeSuppressor, MessageTemplate, get_nmea_priority, PRIORITY_CONTROL
+from bridge_replay import CaptureWriter
+from bridge_supervisor import RestartBackoff
+from bridge_stats import BridgeStats, CommandStats, ReadStats, handler_name
+from bridge_throttle import HandlerThrottle
 import os
 
+
+# stdout is drained in chunks of that size, at most _MAX_READ_PER_WAKEUP bytes per main loop wakeup to keep the loop responsive
+_READ_CHUNK_SIZE = 65536
+_MAX_READ_PER_WAKEUP = 1024 * 1024
+
+# SocketCAN frames decoded per main loop wakeup with native decoding
+_MAX_CAN_FRAMES_PER_WAKEUP = 500
+
+# commands waiting for the bridge to be ready, for the child to read its stdin or for their priority class rate limit.
+# When full, the lowest priority commands are dropped first
+_MAX_QUEUED_COMMANDS = 100
+
+# bytes written to the child stdin but not read yet. Above that, commands wait in the queue
+_MAX_WRITE_BUFFER = 65536
+
+# a command not acknowledged after _ACK_TIMEOUT seconds is considered lost.
+# The child is restarted after _MAX_ACK_TIMEOUTS lost commands in a row, or if it didn't read its stdin for _WEDGED_TIMEOUT seconds
+_ACK_TIMEOUT = 5
+_MAX_ACK_TIMEOUTS = 3
+_WEDGED_TIMEOUT = 15
+
+# milliseconds between checks that a child killed because it closed its stdout exited, the main loop never waits for it
+_EXIT_POLL_INTERVAL = 100
+
+# nmea_bridge.js counters are asked every that many seconds
+_NODEJS_STATS_INTERVAL = 10
+
+# these commands are rebuilt from our own state when the child restarts, or not worth sending again. Others are sent again if they were never answered
+_REHYDRATED_COMMANDS = ["initCAN", "filterPGN", "updateFilterPGN", "registerTemplate", "getStats"]
+
+# interval in seconds used when a handler asks for throttle=True
+DEFAULT_THROTTLE_INTERVAL = 1
+
+
 class NMEABridge:
 
-    def __init__(self, can_id = "can0", js_gateway_path=None, max_restart_attempts=3, ready_timeout=30):
+    def __init__(self, can_id = "can0", js_gateway_path=None, max_restart_attempts=10, ready_timeout=30, binary_framing=False, native_decoding=False, capture_path=None):
         if js_gateway_path is None:
             js_gateway_path = os.path.join(os.path.dirname(__file__), 'nmea_bridge.js') # assume same folder
 
         self._can_id = can_id
 
+        # binary framing is asked at initCAN, stdout stays JSON lines until nmea_bridge.js accepts it
+        self._framing = FRAMING_BINARY if binary_framing else FRAMING_JSON
+
         self._js_gateway_path = js_gateway_path
-        self._max_restart_attempts = max_restart_attempts
 
         self._nodejs_process = None
         self._watch_id = None
         self._err_id = None
-        self._restart_attempts = 0
+
+        # restarts as soon as the child exits, then with an increasing delay. We give up after max_restart_attempts restarts in a row that never got stable
+        self._backoff = RestartBackoff(max_restart_attempts)
+        self._restart_timer_id = None
 
         self._ready = False
         self._ready_timeout = ready_timeout
         self._ready_timeout_id = None
 
-        self._queue = []
+        # commands not written yet, bytes not accepted by the child stdin yet, and command id -> (command, time) waiting for an ack
+        self._scheduler = OutboundScheduler(_MAX_QUEUED_COMMANDS)
+        self._rate_timer_id = None
+
+        # identical messages of PGNs enabled with enable_change_suppression are only sent again after their keepalive
+        self._suppressor = ChangeSuppressor()
+
+        # template name -> MessageTemplate registered with register_template, registered again when the child restarts
+        self._templates = {}
+        self._write_buffer = bytearray()
+        self._stdin_watch_id = None
+        self._in_flight = {}
+        self._last_write_time = time.monotonic()
+
+        # time commands were queued, by id until buffered, then by the offset their line ends at in the bytes ever buffered
+        self._queued_times = {}
+        self._buffered_ends = deque()
+        self._buffered_bytes = 0
+        self._written_bytes = 0
+        self._consecutive_timeouts = 0
+        self._command_stats = CommandStats()
+
+        # ids of commands sent again after a restart, never sent a third time in case they are what made the child exit
+        self._requeued_ids = set()
 
         self._handlers = {}
 
+        # pgn -> throttle interval in seconds asked to nmea_bridge.js, 0 if not throttled
+        self._throttle_intervals = {}
+
+        # pgn -> filter nmea_bridge.js knows about, changes are sent as diffs from an idle callback
+        self._sent_filters = {}
+        self._filters_update_id = None
+
+        # reused for every stdout read, incomplete messages are kept by the decoder until the next read
+        self._read_buffer = bytearray(_READ_CHUNK_SIZE)
+        self._stdout_decoder = StreamDecoder()
+        self._read_stats = ReadStats()
+
+        # message rates, parse, handlers and commands durations, see get_bridge_stats
+        self._stats = BridgeStats()
+        self._last_nodejs_stats_time = time.monotonic()
+
         self.error_handler = None
         self._unrecoverable_error = False
         self._was_once_ready = False
 
+        # PGNs N2KDecoder knows are read from SocketCAN and decoded here instead of nmea_bridge.js. Messages are still sent by nmea_bridge.js
+        self._native_decoder = None
+        self._can_socket = None
+        self._address = None
+        if native_decoding:
+            self._start_native_decoding(can_id)
+
+        # inbound messages are appended to a capture file that bridge_replay.ReplayBridge can replay
+        self._capture = None
+        if capture_path:
+            self.start_capture(capture_path)
+
         self._start_nodejs_process()
-        GLib.timeout_add_seconds(1, exit_on_error, self._check_process_status)
+        GLib.timeout_add_seconds(1, exit_on_error, self._check_pipeline)
 
 
-    def send_nmea(self, nmea_message):
-        """Sends an NMEA message to the Node.js process."""
+    def send_nmea(self, nmea_message, priority=None):
+        """Sends an NMEA message to the Node.js process.
+        priority is one of the bridge_scheduler PRIORITY_ classes, guessed from the PGN if None"""
+        if not self._suppressor.should_send(nmea_message):
+            return
+
         command = {
             "id": str(uuid.uuid4()),
             "command": "sendPGN",
             "message": nmea_message
         }
+
+        if priority is None:
+            priority = get_nmea_priority(nmea_message)
+
+        self._send_command(command, priority=priority)
+
+    def register_template(self, name, nmea_message):
+        """Registers a message sent later with send_template. The constant fields are serialized and sent
+        to the Node.js process only once, registering the same name again replaces the template.
+        nmea_bridge.js merges and encodes the complete message on each send, canboatjs has no API for partially encoded frames"""
+        self._templates[name] = MessageTemplate(name, nmea_message)
+        self._send_template_command(name)
+
+    def send_template(self, name, fields=None, priority=None):
+        """Sends a message registered with register_template, fields overriding the template ones.
+        Same as send_nmea(merge_template(template, fields), priority) without sending the constant fields"""
+        template = self._templates[name]
+        fields = fields or {}
+        if not self._suppressor.should_send_template(template, fields):
+            return
+
+        command = {
+            "id": str(uuid.uuid4()),
+            "command": "sendTemplate",
+            "template": name,
+            "fields": fields
+        }
+
+        if priority is None:
+            priority = get_nmea_priority(template.message)
+
+        self._send_command(command, priority=priority)
+
+    def _send_template_command(self, name):
+        command = {
+            "id": str(uuid.uuid4()),
+            "command": "registerTemplate",
+            "template": name,
+            "message": self._templates[name].message
+        }
         self._send_command(command)
 
+    def enable_change_suppression(self, pgn, keepalive):
+        """Messages of that PGN identical to the last one sent for the same destination and instance
+        are only sent again after keepalive seconds, the interval the caller repeats them at. 0 disables it"""
+        self._suppressor.enable(pgn, keepalive)
+
+    def get_suppression_stats(self):
+        """Returns SuppressionStats with sent vs suppressed message counts"""
+        return self._suppressor.get_stats()
+
+
+    def add_pgn_handler(self, pgn, handler, throttle=False, fields=None):
+        """Sets NMEA filters.
+        throttle is False to get every message, True for at most one message per second, or the minimum interval in seconds
+        between two messages of the same source. The first message is delivered right away, then the most recent one at the end of each interval.
+        fields is the optional list of field names the handler uses, the bridge then only sends those.
+        A handler can't rely on other fields being present"""
+        throttle = self._get_throttle_interval(throttle)
 
-    def add_pgn_handler(self, pgn, handler, throttle=False):
-        """Sets NMEA filters."""
         if pgn not in self._handlers:
             self._handlers[pgn] = []
 
@@ -86,11 +247,16 @@ class NMEABridge:
         if existing_handler:
             # Update throttle setting for existing handler
             existing_handler['throttle'] = throttle
+            existing_handler['throttler'].interval = throttle
+            existing_handler['fields'] = fields
         else:
-            # Add new handler
-            self._handlers[pgn].append({'handler': handler, 'throttle': throttle})
+            # Add new handler. throttler coalesces messages for handlers slower than nmea_bridge.js throttles their PGN
+            handler_info = {'handler': handler, 'throttle': throttle, 'fields': fields,
+                            'histogram': self._stats.handler_histogram(handler_name(handler))}
+            handler_info['throttler'] = HandlerThrottle(throttle, lambda message: self._call_handler(handler_info, message), GLib, time.monotonic)
+            self._handlers[pgn].append(handler_info)
         
-        self._send_filters()
+        self._schedule_filters_update()
 
     def remove_pgn_handler(self, pgn, handler):
         """Removes NMEA handler."""
@@ -98,47 +264,162 @@ class NMEABridge:
             return
         
         # Find and remove the handler
+        for h in self._handlers[pgn]:
+            if h['handler'] == handler:
+                h['throttler'].cancel()
         self._handlers[pgn] = [h for h in self._handlers[pgn] if h['handler'] != handler]
         
         # If no handlers left, remove the PGN entirely
         if not self._handlers[pgn]:
             del self._handlers[pgn]
         
+        self._schedule_filters_update()
+
+    def _start_native_decoding(self, can_id):
+        try:
+            self._can_socket = open_socketcan(can_id)
+        except (OSError, AttributeError) as e:
+            logger.error("Unable to open "+ can_id +" for native decoding, all PGNs will be decoded by nmea_bridge.js: "+ str(e))
+            return
+
+        # only PGNs with handlers are decoded, see _get_filters
+        self._native_decoder = N2KDecoder([])
+        GLib.io_add_watch(self._can_socket, GLib.IO_IN, self._on_can_data)
+        logger.info("Native decoding from "+ can_id)
+
+    def _stop_native_decoding(self):
+        self._native_decoder = None
+        try:
+            self._can_socket.close()
+        except OSError:
+            pass
+        self._can_socket = None
+
+        # PGNs decoded natively were not in nmea_bridge.js filters
         self._send_filters()
+
+    def _is_native(self, pgn):
+        return self._native_decoder is not None and self._native_decoder.can_decode(pgn)
+
+    def _on_can_data(self, source, condition):
+        try:
+            frames = list(read_socketcan(self._can_socket, _MAX_CAN_FRAMES_PER_WAKEUP))
+        except OSError as e:
+            # eg ENETDOWN when the interface goes down, without nmea_bridge.js decoding those PGNs again we would silently stop receiving them
+            logger.error("Native decoding from "+ self._can_id +" failed, all PGNs will be decoded by nmea_bridge.js: "+ str(e))
+            self._stop_native_decoding()
+            return False
+
+        for can_id, data in frames:
+            start = time.perf_counter()
+            message = self._native_decoder.decode_frame(can_id, data)
+            self._stats.parse.record(time.perf_counter() - start)
+
+            # broadcast or for us, like nmea_bridge.js does
+            if message is not None and (message['dst'] == 255 or message['dst'] == self._address):
+                self._on_nmea_message(message)
+
+        return True
+
+    def _get_throttle_interval(self, throttle):
+        if throttle is True:
+            return DEFAULT_THROTTLE_INTERVAL
+
+        if not throttle or throttle < 0:
+            return 0
+
+        return throttle
         
 
-    def _send_filters(self):
-        filters = []
+    def _get_filters(self):
+        """Returns pgn -> filter for the current handlers"""
+        filters = {}
+        self._throttle_intervals = {}
         for pgn, handlers in self._handlers.items():
-            # If ANY handler for this PGN has throttle=False, don't throttle the PGN
-            should_throttle = all(h['throttle'] for h in handlers)
-            
-            filters.append({
+            if self._is_native(pgn):
+                # decoded from SocketCAN, every handler is throttled in _on_nmea_message
+                self._throttle_intervals[pgn] = 0
+                continue
+
+            # If ANY handler for this PGN has throttle=False, don't throttle the PGN. Otherwise throttle at the fastest interval asked
+            throttle_interval = min(h['throttle'] for h in handlers)
+            self._throttle_intervals[pgn] = throttle_interval
+
+            pgn_filter = {
                 'pgn': pgn,
-                'throttle': should_throttle
-            })
-        
-        if len(filters):
+                'throttle': round(throttle_interval * 1000)
+            }
+
+            # only project fields if every handler told which ones it needs
+            if all(h['fields'] is not None for h in handlers):
+                pgn_filter['fields'] = sorted(set().union(*[h['fields'] for h in handlers]))
+
+            filters[pgn] = pgn_filter
+
+        if self._native_decoder is not None:
+            self._native_decoder.pgns = {pgn for pgn in self._handlers if self._is_native(pgn)}
+
+        return filters
+
+    def _send_filters(self):
+        """Sends the whole filter list, replacing the one nmea_bridge.js has"""
+        if self._filters_update_id is not None:
+            GLib.source_remove(self._filters_update_id)
+            self._filters_update_id = None
+
+        self._sent_filters = self._get_filters()
+        if len(self._sent_filters):
             command = {
                 "id": str(uuid.uuid4()),
                 "command": "filterPGN",
-                "filter": filters
+                "filter": list(self._sent_filters.values())
+            }
+            self._send_command(command)
+
+    def _schedule_filters_update(self):
+        """Handlers changes made during the same main loop iteration are sent together"""
+        if self._filters_update_id is None:
+            self._filters_update_id = GLib.idle_add(exit_on_error, self._send_filters_update)
+
+    def _send_filters_update(self):
+        """Sends only the filters added, changed or removed since the last update"""
+        self._filters_update_id = None
+
+        filters = self._get_filters()
+        added = [pgn_filter for pgn, pgn_filter in filters.items() if self._sent_filters.get(pgn) != pgn_filter]
+        removed = [pgn for pgn in self._sent_filters if pgn not in filters]
+        self._sent_filters = filters
+
+        if len(added) or len(removed):
+            command = {
+                "id": str(uuid.uuid4()),
+                "command": "updateFilterPGN",
+                "add": added,
+                "remove": removed
             }
             self._send_command(command)
 
+        return False
+
 
     def _init_can(self, can_id):
         command = {
                 "id": str(uuid.uuid4()),
                 "command": "initCAN",
-                "canId": can_id
+                "canId": can_id,
+                "framing": self._framing
             }
+
+        # claiming the address we had before a restart is faster, it is most likely still free
+        if self._address is not None:
+            command["address"] = self._address
         self._send_command(command, True)
 
 
-    def _on_init_can(self, can_id, error):
+    def _on_init_can(self, can_id, error, framing):
         if error is None:
-            logger.info("Found CAN device "+ can_id)
+            logger.info("Found CAN device "+ can_id +", using "+ str(framing or FRAMING_JSON) +" framing")
+            self._stdout_decoder.binary = framing == FRAMING_BINARY
         else:
             logger.error(error)
             self._unrecoverable_error = True
@@ -151,28 +432,34 @@ class NMEABridge:
     def _start_nodejs_process(self):
         """Starts the Node.js process."""
         self._ready = False
+        self._restart_timer_id = None
         try:
-
-            if self._watch_id is not None:
-                GLib.source_remove(self._watch_id)
-
-            if self._err_id is not None:
-                GLib.source_remove(self._err_id)
+            self._remove_watches()
 
             self._nodejs_process = Popen(
                 ['node', self._js_gateway_path],
                 stdin=PIPE, stdout=PIPE, stderr=PIPE, text=True
             )
 
-#            GLib.io_add_watch(self._nodejs_process.stdout, GLib.IO_HUP, self._check_process_status) # TODO XXX : doens't work
-            
-            self._watch_id = GLib.io_add_watch(self._nodejs_process.stdout, GLib.IO_IN, self._on_stdout_data)
-            self._err_id = GLib.io_add_watch(self._nodejs_process.stderr, GLib.IO_IN, self._on_stderr_data)
+            # commands are written raw without blocking, see _write_pending
+            os.set_blocking(self._nodejs_process.stdin.fileno(), False)
+            self._reset_pipeline()
+
+            # stdout is read raw and drained on every wakeup, see _on_stdout_data
+            os.set_blocking(self._nodejs_process.stdout.fileno(), False)
+            self._stdout_decoder.reset()
+
+            # IO_HUP tells right away the child exited, see _on_stdout_data
+            self._watch_id = GLib.io_add_watch(self._nodejs_process.stdout, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self._on_stdout_data)
+            self._err_id = GLib.io_add_watch(self._nodejs_process.stderr, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self._on_stderr_data)
 
             logger.info("Node.js process started, waiting for ready")
 
             self._send_filters()   
 
+            for name in self._templates:
+                self._send_template_command(name)
+
             if self._ready_timeout_id:
                 GLib.source_remove(self._ready_timeout_id)
 
@@ -201,91 +488,227 @@ class NMEABridge:
 
     def _stop_nodejs_process(self):
         """Stops the Node.js process."""
+        self._remove_watches()
         if self._nodejs_process:
             self._nodejs_process.terminate()
             self._nodejs_process = None
             logger.info("Node.js process stopped")
 
+    def _remove_watches(self):
+        if self._watch_id is not None:
+            GLib.source_remove(self._watch_id)
+            self._watch_id = None
+
+        if self._err_id is not None:
+            GLib.source_remove(self._err_id)
+            self._err_id = None
+
     def _on_stdout_data(self, source, condition):
-        """Handles stdout data from the Node.js process."""
-        if condition == GLib.IO_IN:
-            line = source.readline().strip()
-            if line:
-                self._handle_nodejs_message(line)
-            return True
-        
-        return False
+        """Handles stdout data from the Node.js process.
+        Reads everything available in the pipe and dispatches all complete messages at once"""
+        if condition & GLib.IO_IN:
+            backlog = self._get_pipe_backlog(source)
+            self._read_stdout(source)
+
+            count = 0
+            for kind, pgn, src, dst, prio, payload in self._stdout_decoder.messages():
+                count += 1
+                if kind == FRAME_NMEA:
+                    self._handle_nmea_frame(pgn, src, dst, prio, payload)
+                else:
+                    self._handle_nodejs_message(payload.decode('utf-8', errors='replace'))
+
+            self._record_read(count, backlog)
+
+        if condition & (GLib.IO_HUP | GLib.IO_ERR):
+            # the child closed its stdout, it exited or is about to
+            self._watch_id = None
+            self._on_process_exit()
+            return False
+
+        return True
+
+    def _read_stdout(self, source):
+        """Reads the non blocking pipe until empty into the decoder"""
+        raw = source.buffer.raw
+        view = memoryview(self._read_buffer)
+        read = 0
+        while read < _MAX_READ_PER_WAKEUP:
+            try:
+                count = raw.readinto(view)
+            except BlockingIOError:
+                count = None
+
+            if not count:
+                break   # pipe is empty (None) or closed (0)
+
+            self._stdout_decoder.feed(view[:count])
+            read += count
+
+    def _get_pipe_backlog(self, source):
+        """Number of bytes waiting in the pipe"""
+        try:
+            available = array.array('i', [0])
+            fcntl.ioctl(source.fileno(), termios.FIONREAD, available)
+            return available[0]
+        except OSError:
+            return 0
+
+    def _record_read(self, messages, backlog):
+        stats = self._read_stats
+        self._read_stats = ReadStats(
+            wakeups=        stats.wakeups + 1,
+            messages=       stats.messages + messages,
+            last_messages=  messages,
+            max_messages=   max(stats.max_messages, messages),
+            last_backlog=   backlog,
+            max_backlog=    max(stats.max_backlog, backlog),
+            partial_bytes=  self._stdout_decoder.pending_bytes())
+
+        if messages > 1:
+            logger.debug("read "+ str(messages) +" messages, "+ str(backlog) +" bytes were waiting")
+
+    def get_read_stats(self):
+        """Returns ReadStats describing how much stdout data each main loop wakeup handles"""
+        return self._read_stats
     
     def _on_stderr_data(self, source, condition):
         """Handles stderr data from the Node.js process."""
-        if condition == GLib.IO_IN:
-            line = source.readline().strip()
+        if condition & GLib.IO_IN:
+            line = source.readline()
             if line:
-                logger.error("STDERR " + line)
+                logger.error("STDERR " + line.strip())
+                return True
 
-            return True
-        
+        self._err_id = None
         return False
 
     def _check_process_status(self, source=None, condition=None):
-        """Checks if the Node.js process is still running and restarts if it crashes."""
+        """Checks if the Node.js process is still running and restarts if it crashes.
+        Exits are normally noticed from stdout IO_HUP, this is only a fallback"""
         if self._nodejs_process and self._nodejs_process.poll() is not None:
-            logger.info("Node.js process crashed")
-            self._restart_attempts += 1
-            if self._restart_attempts <= self._max_restart_attempts:
-                logger.info(f"Attempting to restart Node.js process (Attempt {self._restart_attempts}/{self._max_restart_attempts})...")
-                self._start_nodejs_process()
-            else:
-                logger.info("Max restart attempts reached. Exiting.")
-                self._stop_nodejs_process()
-
-                self._unrecoverable_error = True
-                if self.error_handler is not None:
-                    if self._was_once_ready:
-                        self.error_handler("Lost connection to NMEA bridge")
-                    else:
-                        self.error_handler("Unable to start NMEA bridge")
-                
-                #from os import _exit as os_exit
-                #os_exit(1)
-                return False
+            self._on_process_exit()
 
-        return True
+        return not self._unrecoverable_error
+
+    def _on_process_exit(self):
+        """Schedules a restart of the child that just exited, or gives up"""
+        if self._nodejs_process is None:
+            return
+
+        process = self._nodejs_process
+        self._remove_watches()
+        self._nodejs_process = None
+        self._ready = False
+
+        if self._ready_timeout_id:
+            GLib.source_remove(self._ready_timeout_id)
+            self._ready_timeout_id = None
+
+        returncode = process.poll()
+        if returncode is None:
+            # useless without its stdout, the restart waits until it is collected
+            process.kill()
+            GLib.timeout_add(_EXIT_POLL_INTERVAL, exit_on_error, self._on_process_killed, process)
+            return
+
+        self._on_process_exited(returncode)
+
+    def _on_process_killed(self, process):
+        returncode = process.poll()
+        if returncode is None:
+            return True
+
+        self._on_process_exited(returncode)
+        return False
+
+    def _on_process_exited(self, returncode):
+        logger.info("Node.js process exited with code "+ str(returncode))
+
+        delay = self._backoff.on_exit()
+        if delay is not None:
+            logger.info(f"Restarting Node.js process in {delay}s (Attempt {self._backoff.attempts}/{self._backoff.max_attempts})...")
+            self._restart_timer_id = GLib.timeout_add(int(delay * 1000), exit_on_error, self._start_nodejs_process)
+        else:
+            logger.info("Max restart attempts reached. Exiting.")
+
+            self._unrecoverable_error = True
+            if self.error_handler is not None:
+                if self._was_once_ready:
+                    self.error_handler("Lost connection to NMEA bridge")
+                else:
+                    self.error_handler("Unable to start NMEA bridge")
+
+    def get_restart_count(self):
+        """Number of times the Node.js process was restarted"""
+        return self._backoff.restarts
+
+    def _handle_nmea_frame(self, pgn, src, dst, prio, payload):
+        """Handles a binary NMEA frame, fields are only decoded if someone listens to that PGN"""
+        if pgn not in self._handlers:
+            return
+
+        start = time.perf_counter()
+        try:
+            fields = json.loads(payload)
+        except json.JSONDecodeError:
+            logger.error(f"Invalid fields in binary frame for PGN {pgn}: {payload}")
+            return
+        self._stats.parse.record(time.perf_counter() - start)
+
+        self._on_nmea_message({'pgn': pgn, 'src': src, 'dst': dst, 'prio': prio, 'fields': fields})
 
     def _handle_nodejs_message(self, message):
         """Handles messages from the Node.js process."""
-        logger.debug("received "+ message)
+        # formatted only when debug is enabled, this is called for every message
+        logger.debug("received %s", message)
 
         try:
+            start = time.perf_counter()
             data = json.loads(message)
+            self._stats.parse.record(time.perf_counter() - start)
+
             if data.get("event") == "on_initCAN":
-                self._on_init_can(data.get("canId"), data.get("error"))
+                self._on_init_can(data.get("canId"), data.get("error"), data.get("framing"))
 
             elif data.get("event") == "on_bridge_ready":
+                self._address = data.get("address")
                 if self._ready_timeout_id:
                     GLib.source_remove(self._ready_timeout_id)
+                    self._ready_timeout_id = None
 
                 self._on_bridge_ready()
 
             elif data.get("event") == "on_NMEA_message":
                 self._on_nmea_message(data.get("message"))
 
-            elif data.get("event") == "on_sendPGN":
+            elif data.get("event") in ["on_sendPGN", "on_sendTemplate"]:
                 logger.debug(f"NMEA message sent: {data}")
 
-            elif data.get("event") == "on_filterPGN":
-                logger.debug(f"Filters updated: {data}")
-            
-            elif data.get("event") == "on_error":
+            elif data.get("event") == "on_registerTemplate":
+                logger.debug(f"Template registered: {data}")
+
+            elif data.get("event") == "on_getStats":
+                self._stats.nodejs = data.get("stats", {})
+
+            elif data.get("event") in ["on_error", "error"]:
                 logger.error(f"got error from NodeJS: {data}")
-                
+
+            elif data.get("event") in ["on_filterPGN", "on_updateFilterPGN"]:
+                logger.debug(f"Filters updated: {data}")
+
+            # every answer to a command carries its id
+            if data.get("id") is not None:
+                self._on_command_acked(data.get("id"))
+
 
         except json.JSONDecodeError:
             logger.error(f"Invalid JSON from Node.js: {message}")
 
 
-    def _send_command(self, command, force=False):
-        """Sends a command to the Node.js process."""
+    def _send_command(self, command, force=False, priority=PRIORITY_CONTROL):
+        """Sends a command to the Node.js process.
+        Never blocks : commands wait in a bounded priority queue until the bridge is ready and the child reads its stdin"""
         self._check_process_status()
 
         # do not accept any more commands if we're in an unrecoverable state
@@ -293,35 +716,232 @@ class NMEABridge:
             logger.debug("In unrecoverable state, ignoring command "+ json.dumps(command))
             return
 
-        if self._ready or force:
-            try:
-                # TODO XXX : make sure \n are escaped !
-                self._nodejs_process.stdin.write(json.dumps(command) + "\n")
-                self._nodejs_process.stdin.flush()
-                logger.debug("sent "+ json.dumps(command))
-            except Exception as e:
-                logger.error(f"Failed to send command: {e}")
-                self._check_process_status()
-                
-        else:
-            logger.debug(f"Queuing: {command}")
-            self._queue.append(command)
+        # forced commands (initCAN) go first, others are written by priority class
+        if force:
+            self._write_command(command)
+            return
+
+        if "id" in command:
+            self._queued_times[command["id"]] = time.monotonic()
+
+        dropped = self._scheduler.push(command, priority)
+        if dropped is not None:
+            self._on_command_dropped(dropped)
+
+        self._flush_queue()
+
+    def _on_command_dropped(self, dropped):
+        logger.warning("Command queue full, dropping "+ str(dropped.get("command")) +" "+ str(dropped.get("message", {}).get("pgn", "")))
+        if "message" in dropped:
+            self._suppressor.forget(dropped["message"])
+        elif "template" in dropped:
+            self._suppressor.forget_template(self._templates[dropped["template"]], dropped["fields"])
+
+        self._requeued_ids.discard(dropped.get("id"))
+        self._queued_times.pop(dropped.get("id"), None)
+        self._command_stats = self._command_stats._replace(dropped=self._command_stats.dropped + 1)
+
+    def _write_command(self, command):
+        # json.dumps escapes \n in strings, a command is always a single line. The constant part of templates is serialized once
+        template = self._templates.get(command.get("template")) if command.get("command") == "sendTemplate" else None
+        data = template.serialize_command(command) if template is not None else json.dumps(command)
+        line = (data + "\n").encode('utf-8')
+        self._write_buffer += line
+        self._buffered_bytes += len(line)
+        if "id" in command:
+            self._in_flight[command["id"]] = (command, time.monotonic())
+
+            queued_time = self._queued_times.pop(command["id"], None)
+            if queued_time is not None:
+                self._buffered_ends.append((self._buffered_bytes, queued_time))
+
+        self._command_stats = self._command_stats._replace(sent=self._command_stats.sent + 1)
+        logger.debug("sent %s", data)
+        self._write_pending()
+
+    def _write_pending(self):
+        """Writes as much as the child stdin accepts, waits for IO_OUT for the rest"""
+        try:
+            while len(self._write_buffer):
+                written = os.write(self._nodejs_process.stdin.fileno(), self._write_buffer)
+                del self._write_buffer[:written]
+                self._last_write_time = time.monotonic()
+                self._record_written(written)
+        except BlockingIOError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to send command: {e}")
+            self._clear_write_buffer()
+            self._check_process_status()
+            return
+
+        if len(self._write_buffer) and self._stdin_watch_id is None:
+            self._stdin_watch_id = GLib.io_add_watch(self._nodejs_process.stdin, GLib.IO_OUT, self._on_stdin_writable)
+
+    def _record_written(self, written):
+        self._written_bytes += written
+        while len(self._buffered_ends) and self._buffered_ends[0][0] <= self._written_bytes:
+            self._stats.writes.record(self._last_write_time - self._buffered_ends.popleft()[1])
+
+    def _clear_write_buffer(self):
+        self._write_buffer = bytearray()
+        self._buffered_ends.clear()
+        self._written_bytes = self._buffered_bytes
+
+    def _on_stdin_writable(self, source, condition):
+        self._write_pending()
+        self._flush_queue()
+
+        if len(self._write_buffer) == 0:
+            self._stdin_watch_id = None
+            return False
+
+        return True
+
+    def _flush_queue(self):
+        while self._ready and len(self._write_buffer) < _MAX_WRITE_BUFFER:
+            command = self._scheduler.pop()
+            if command is None:
+                break
+
+            self._write_command(command)
 
+        # rate limited commands left, come back when their class has a token
+        delay = self._scheduler.next_delay()
+        if self._ready and delay is not None and self._rate_timer_id is None and len(self._write_buffer) < _MAX_WRITE_BUFFER:
+            self._rate_timer_id = GLib.timeout_add(max(1, int(delay * 1000)), exit_on_error, self._on_rate_timer)
+
+    def _on_rate_timer(self):
+        self._rate_timer_id = None
+        self._flush_queue()
+        return False
+
+    def _on_command_acked(self, command_id):
+        self._requeued_ids.discard(command_id)
+        in_flight = self._in_flight.pop(command_id, None)
+        if in_flight is not None:
+            self._stats.commands.record(time.monotonic() - in_flight[1])
+            self._consecutive_timeouts = 0
+            self._command_stats = self._command_stats._replace(acked=self._command_stats.acked + 1)
+
+    def _reset_pipeline(self):
+        """New child, nothing written or in flight anymore. Queued commands are kept,
+        messages the previous child never acknowledged are queued again ahead of them"""
+        # the new child knows nothing, send everything again
+        self._suppressor.clear()
+
+        for command, sent_time in reversed(list(self._in_flight.values())):
+            if command.get("command") in _REHYDRATED_COMMANDS:
+                continue
+
+            if command["id"] in self._requeued_ids:
+                logger.warning("Node.js process exited twice before answering, not sending again "+ json.dumps(command))
+                self._requeued_ids.discard(command["id"])
+                continue
+
+            self._requeued_ids.add(command["id"])
+            dropped = self._scheduler.requeue(command, self._get_command_priority(command))
+            if dropped is not None:
+                self._on_command_dropped(dropped)
+
+        if self._stdin_watch_id is not None:
+            GLib.source_remove(self._stdin_watch_id)
+            self._stdin_watch_id = None
+
+        self._clear_write_buffer()
+        self._in_flight = {}
+        self._consecutive_timeouts = 0
+        self._last_write_time = time.monotonic()
+
+    def _get_command_priority(self, command):
+        if "message" in command:
+            return get_nmea_priority(command["message"])
+
+        if "template" in command and command["template"] in self._templates:
+            return get_nmea_priority(self._templates[command["template"]].message)
+
+        return PRIORITY_CONTROL
+
+    def _check_pipeline(self):
+        """Called every second, restarts the child if it crashed or stopped answering"""
+        now = time.monotonic()
+        self._backoff.check_stable()
+        for command_id, (command, sent_time) in list(self._in_flight.items()):
+            if now - sent_time >= _ACK_TIMEOUT:
+                logger.warning("No answer from Node.js for "+ json.dumps(command))
+                del self._in_flight[command_id]
+                self._requeued_ids.discard(command_id)
+                self._consecutive_timeouts += 1
+                self._command_stats = self._command_stats._replace(timeouts=self._command_stats.timeouts + 1)
+
+        wedged = len(self._write_buffer) and now - self._last_write_time >= _WEDGED_TIMEOUT
+        if self._nodejs_process and (wedged or self._consecutive_timeouts >= _MAX_ACK_TIMEOUTS):
+            # never wait for it, the next check will notice it exited and restart it
+            logger.error("Node.js process is not answering, killing it")
+            self._nodejs_process.kill()
+
+        if self._capture is not None:
+            self._capture.flush()
+
+        if self._ready and now - self._last_nodejs_stats_time >= _NODEJS_STATS_INTERVAL:
+            self._last_nodejs_stats_time = now
+            self._send_command({"id": str(uuid.uuid4()), "command": "getStats"})
+
+        return self._check_process_status()
+
+    def get_bridge_stats(self):
+        """Returns a bridge_stats.BridgeSnapshot of what was measured since the previous call, and starts a new measure"""
+        return self._stats.snapshot()
+
+    def get_command_stats(self):
+        """Returns CommandStats describing the commands sent to the Node.js process"""
+        return self._command_stats._replace(queued=len(self._scheduler), in_flight=len(self._in_flight), write_buffer=len(self._write_buffer))
+
+
+    def start_capture(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        """Records every message received from now on to path, rotated every max_bytes.
+        Only messages matching handlers filters are received, so this is what connectors saw"""
+        self.stop_capture()
+        try:
+            self._capture = CaptureWriter(path, max_bytes, backup_count)
+            logger.info("Recording NMEA messages to "+ path)
+        except OSError as e:
+            logger.error("Unable to record NMEA messages to "+ path +": "+ str(e))
+
+    def stop_capture(self):
+        if self._capture is not None:
+            self._capture.close()
+            self._capture = None
 
     def _on_nmea_message(self, message):
+        if self._capture is not None:
+            self._capture.write(message)
+
         pgn = message['pgn']
+        self._stats.count_message(pgn, message.get('src'))
+
         if pgn in self._handlers:
+            pgn_interval = self._throttle_intervals.get(pgn, 0)
             for handler_info in self._handlers[pgn]:
-                handler_info['handler'](message)
+                # nmea_bridge.js throttles at the fastest interval of all handlers, or not at all with native decoding
+                if handler_info['throttle'] > pgn_interval:
+                    handler_info['throttler'].push(message)
+                else:
+                    self._call_handler(handler_info, message)
+
+    def _call_handler(self, handler_info, message):
+        start = time.perf_counter()
+        handler_info['handler'](message)
+        handler_info['histogram'].record(time.perf_counter() - start)
 
     def _on_bridge_ready(self):
         logger.info("NMEA Bridge ready, flushing queued commands")
-        while len(self._queue) > 0:
-            self._send_command(self._queue.pop(0), True)
 
-        # only set _ready to True after we flushed other commands to keep correct order
+        # new commands are queued behind the ones being flushed to keep correct order
         self._ready = True
         self._was_once_ready = True
+        self._backoff.on_ready()
+        self._flush_queue()
 
 
 
@@ -349,7 +969,7 @@ if __name__ == '__main__':
 
     
 
-    print("NMEA Bridge test program. Enter show:text to send Alert PGN.\nhide to hide message.\nyd:command to send YDAB command\nds:BankInstance,BankChannel,On|Off to send a DigitalSwitching command\nfilter:<PGN> to filter and print received PGNS (no throttling)\nthrottle:<PGN> to filter and print received PGNS (with throttling)\nraw:{JSON object with at least pgn and fields parameter} to send a raw message\nkill to kill the underlying nodeJS program\nexit to exit\n")
+    print("NMEA Bridge test program. Enter show:text to send Alert PGN.\nhide to hide message.\nyd:command to send YDAB command\nds:BankInstance,BankChannel,On|Off to send a DigitalSwitching command\nfilter:<PGN> to filter and print received PGNS (no throttling)\nthrottle:<PGN> to filter and print received PGNS (with throttling)\nraw:{JSON object with at least pgn and fields parameter} to send a raw message\nkill to kill the underlying nodeJS program\nstats to show stdout read statistics\nexit to exit\n")
 
     def handle_command(command, text):
         mapping = {
@@ -496,6 +1116,15 @@ if __name__ == '__main__':
         elif command == "kill":
             bridge._nodejs_process.terminate()
 
+        elif command == "stats":
+            print(bridge.get_read_stats())
+
+        elif command == "record":
+            bridge.start_capture(text)
+
+        elif command == "stoprecord":
+            bridge.stop_capture()
+
         else:
             print("Unknown command "+ command)
 
@@ -0,0 +1,166 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+import math
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'gps_providers'))
+from abstract_gps_provider import GPSPosition
+
+from distance_engine import LocalTangentPlane
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# accuracy used for positions that don't carry one, in meters
+DEFAULT_ACCURACY = 5
+
+# accuracy of 129026 SOG, in m/s
+VELOCITY_ACCURACY = 0.2
+
+# filter is restarted when no fix came for that long, in seconds
+MAX_GAP = 10
+
+# plane is moved to the estimate when it gets further than that from its origin, in meters
+MAX_ORIGIN_DISTANCE = 1000
+
+
+class _AxisFilter(object):
+    """Constant velocity Kalman filter along one axis of the local plane.
+    State is (position, velocity), covariance is [[pp, pv], [pv, vv]]"""
+
+    def __init__(self, position, variance, velocity_variance):
+        self.position = position
+        self.velocity = 0
+        self.pp = variance
+        self.pv = 0
+        self.vv = velocity_variance
+
+    def predict(self, dt, process_noise):
+        self.position += self.velocity * dt
+        self.pp += 2 * self.pv * dt + self.vv * dt * dt + process_noise * dt * dt * dt / 3
+        self.pv += self.vv * dt + process_noise * dt * dt / 2
+        self.vv += process_noise * dt
+
+    def update_position(self, measurement, variance):
+        s = self.pp + variance
+        k_p = self.pp / s
+        k_v = self.pv / s
+        innovation = measurement - self.position
+
+        self.position += k_p * innovation
+        self.velocity += k_v * innovation
+        self.vv -= k_v * self.pv
+        self.pv *= 1 - k_p
+        self.pp *= 1 - k_p
+
+    def update_velocity(self, measurement, variance):
+        s = self.vv + variance
+        k_p = self.pv / s
+        k_v = self.vv / s
+        innovation = measurement - self.velocity
+
+        self.position += k_p * innovation
+        self.velocity += k_v * innovation
+        self.pp -= k_p * self.pv
+        self.pv *= 1 - k_v
+        self.vv *= 1 - k_v
+
+
+class PositionFilter(object):
+    """Streaming constant velocity Kalman filter over GPS fixes, in a local tangent plane.
+    East and north axes are filtered independently, each update is O(1).
+    process_noise is the acceleration spectral density in m²/s³, higher values follow the boat faster but smooth less."""
+
+    def __init__(self, process_noise=0.01):
+        self.process_noise = process_noise
+        self.reset()
+
+    def reset(self):
+        self._plane = None
+        self._east = None
+        self._north = None
+        self._time = None
+
+    def is_initialized(self):
+        return self._plane is not None
+
+    def update(self, gps_position, timestamp, gps_velocity=None):
+        """Feeds a GPSPosition (and optionally a GPSVelocity) measured at monotonic timestamp, returns the filtered GPSPosition.
+        accuracy of the returned position is the filtered standard deviation in meters"""
+        variance = (gps_position.accuracy if gps_position.accuracy is not None else DEFAULT_ACCURACY) ** 2
+
+        if self._plane is not None and timestamp - self._time > MAX_GAP:
+            logger.info("No fix for "+ str(round(timestamp - self._time)) +"s, restarting position filter")
+            self.reset()
+
+        if self._plane is None:
+            self._plane = LocalTangentPlane(gps_position)
+            self._east = _AxisFilter(0, variance, 1)
+            self._north = _AxisFilter(0, variance, 1)
+            self._time = timestamp
+        else:
+            dt = max(0, timestamp - self._time)
+            self._time = timestamp
+            self._east.predict(dt, self.process_noise)
+            self._north.predict(dt, self.process_noise)
+
+            east, north = self._plane.to_xy(gps_position.latitude, gps_position.longitude)
+            self._east.update_position(east, variance)
+            self._north.update_position(north, variance)
+
+        if gps_velocity is not None:
+            velocity_variance = VELOCITY_ACCURACY ** 2
+            self._east.update_velocity(gps_velocity.sog * math.sin(gps_velocity.cog), velocity_variance)
+            self._north.update_velocity(gps_velocity.sog * math.cos(gps_velocity.cog), velocity_variance)
+
+        position = self.get_position()
+
+        # keep the plane close to the boat so the projection stays accurate
+        if math.hypot(self._east.position, self._north.position) > MAX_ORIGIN_DISTANCE:
+            self._plane = LocalTangentPlane(position)
+            self._east.position = 0
+            self._north.position = 0
+
+        return position
+
+    def get_position(self):
+        """Filtered GPSPosition, None if no fix was fed yet"""
+        if self._plane is None:
+            return None
+
+        latitude, longitude = self._plane.from_xy(self._east.position, self._north.position)
+        return GPSPosition(latitude, longitude, math.sqrt((self._east.pp + self._north.pp) / 2))
+
+    def get_covariance(self):
+        """Position covariance matrix in m², ((east, east-north), (north-east, north)), None if no fix was fed yet"""
+        if self._plane is None:
+            return None
+
+        return ((self._east.pp, 0), (0, self._north.pp))
+
+    def get_velocity(self):
+        """Filtered (east, north) velocity in m/s, None if no fix was fed yet"""
+        if self._plane is None:
+            return None
+
+        return (self._east.velocity, self._north.velocity)
@@ -0,0 +1,88 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class StateMachine(object):
+    """Minimal replacement for transitions.Machine, compiled once into a (state, trigger) lookup table.
+    Takes the same states and transitions declarations, adds the trigger methods to the model and
+    calls, in this order : on_exit_<source>, on_enter_<dest>, the transition 'after' callbacks then after_state_change.
+    Arguments given to a trigger are passed to every callback.
+    Invalid triggers are ignored and return False, like transitions with ignore_invalid_triggers=True."""
+
+    def __init__(self, model, states, transitions, initial, after_state_change=None):
+        self.model = model
+        self.states = [state['name'] if isinstance(state, dict) else state for state in states]
+        self.transitions = transitions
+        self._after_state_change = after_state_change
+
+        self._table = {}
+        for transition in transitions:
+            sources = self.states if transition['source'] == '*' else transition['source']
+            if isinstance(sources, str):
+                sources = [sources]
+
+            for source in sources:
+                self._table[(source, transition['trigger'])] = self._compile(source, transition)
+
+        for trigger in set(transition['trigger'] for transition in transitions):
+            setattr(model, trigger, self._create_trigger(trigger))
+
+        model.state = initial
+
+    def _compile(self, source, transition):
+        dest = transition['dest']
+
+        after = transition.get('after', [])
+        if not isinstance(after, list):
+            after = [after]
+
+        on_exit = getattr(self.model, 'on_exit_'+ source, None)
+
+        callbacks = [getattr(self.model, 'on_enter_'+ dest, None)]
+        callbacks += [getattr(self.model, callback) if isinstance(callback, str) else callback for callback in after]
+        callbacks.append(self._after_state_change)
+
+        return dest, on_exit, tuple(callback for callback in callbacks if callback is not None)
+
+    def _create_trigger(self, trigger):
+        model = self.model
+        table = self._table
+
+        def _trigger(*args, **kwargs):
+            compiled = table.get((model.state, trigger))
+            if compiled is None:
+                logger.debug("Ignoring trigger "+ trigger +" in state "+ model.state)
+                return False
+
+            dest, on_exit, callbacks = compiled
+            if on_exit is not None:
+                on_exit(*args, **kwargs)
+
+            model.state = dest
+            for callback in callbacks:
+                callback(*args, **kwargs)
+
+            return True
+
+        _trigger.__name__ = trigger
+        return _trigger
@@ -0,0 +1,189 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+sys.path.insert(1, os.path.join(sys.path[0], '../gps_providers'))
+
+import math
+import random
+import unittest
+
+from ais_index import VesselIndex, bounding_box_degrees, NUMPY_AVAILABLE
+from distance_engine import LocalTangentPlane
+from abstract_gps_provider import GPSPosition
+
+
+class TestVesselIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.origin = GPSPosition(14.0829979, -60.9595577)
+        self.plane = LocalTangentPlane(self.origin)
+
+        self.index = VesselIndex(cell_size=100)
+        self.index.set_origin(self.origin)
+
+    def add(self, mmsi, east, north):
+        latitude, longitude = self.plane.from_xy(east, north)
+        self.index.update(mmsi, latitude, longitude)
+        return latitude, longitude
+
+
+    def test_queries_match_brute_force(self):
+        rnd = random.Random(42)
+        positions = {}
+        for i in range(500):
+            positions[str(i)] = (rnd.uniform(-3000, 3000), rnd.uniform(-3000, 3000))
+            self.add(str(i), *positions[str(i)])
+
+        # some vessels move, some leave
+        for i in range(0, 500, 7):
+            positions[str(i)] = (rnd.uniform(-3000, 3000), rnd.uniform(-3000, 3000))
+            self.add(str(i), *positions[str(i)])
+        for i in range(0, 500, 11):
+            self.index.remove(str(i))
+            del positions[str(i)]
+
+        self.assertEqual(len(self.index), len(positions))
+
+        for i in range(50):
+            east, north = rnd.uniform(-3000, 3000), rnd.uniform(-3000, 3000)
+            latitude, longitude = self.plane.from_xy(east, north)
+            distances = sorted((math.hypot(x - east, y - north), mmsi) for mmsi, (x, y) in positions.items())
+
+            nearest = self.index.nearest(latitude, longitude)
+            self.assertEqual(nearest[0], distances[0][1])
+            self.assertAlmostEqual(nearest[1], distances[0][0], delta=0.01)
+
+            within = self.index.within(latitude, longitude, 400)
+            self.assertEqual([mmsi for mmsi, distance in within], [mmsi for distance, mmsi in distances if distance <= 400])
+
+        farthest = max(positions, key=lambda mmsi: math.hypot(*positions[mmsi]))
+        self.assertEqual(self.index.farthest()[0], farthest)
+
+
+    def test_farthest_and_pop_beyond(self):
+        self.add('1', 100, 0)
+        self.add('2', 0, 300)
+        self.add('3', -200, 0)
+        self.assertEqual(self.index.farthest()[0], '2')
+
+        # given distances take precedence over planar ones
+        self.index.set_distance('1', 500)
+        self.assertEqual(self.index.farthest(), ('1', 500))
+        self.assertEqual(self.index.distance('1'), 500)
+
+        self.index.remove('1')
+        self.assertNotIn('1', self.index)
+        self.assertEqual(self.index.farthest()[0], '2')
+
+        self.assertEqual(self.index.pop_beyond(150), ['2', '3'])
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.farthest())
+        self.assertIsNone(self.index.nearest(self.origin.latitude, self.origin.longitude))
+
+
+    def test_heap_compaction(self):
+        self.add('1', 100, 0)
+        for i in range(1000):
+            self.index.set_distance('1', i)
+
+        self.assertLess(len(self.index._heap), 100)
+        self.assertEqual(self.index.farthest(), ('1', 999))
+
+
+    def test_rebase(self):
+        latitude, longitude = self.add('1', 50, 50)
+
+        # small own ship moves keep the plane, distances follow own ship
+        moved = GPSPosition(*self.plane.from_xy(50, 0))
+        self.index.set_origin(moved)
+        self.index.update('2', *self.plane.from_xy(50, -100))
+        self.assertAlmostEqual(self.index.distance('2'), 100, delta=0.01)
+
+        # far moves re-center the grid
+        far = GPSPosition(*self.plane.from_xy(5000, 0))
+        self.index.set_origin(far)
+        self.assertAlmostEqual(self.index.nearest(latitude, longitude)[1], 0, delta=0.01)
+        self.assertEqual([mmsi for mmsi, distance in self.index.within(latitude, longitude, 200)], ['1', '2'])
+
+
+    def check_recompute(self, index):
+        index.set_origin(self.origin)
+        rnd = random.Random(42)
+        positions = {}
+        for i in range(200):
+            positions[str(i)] = (rnd.uniform(-3000, 3000), rnd.uniform(-3000, 3000))
+            index.update(str(i), *self.plane.from_xy(*positions[str(i)]), distance=10000)
+        for i in range(0, 200, 3):
+            index.remove(str(i))
+            del positions[str(i)]
+
+        # reused slots
+        positions['new'] = (500, 0)
+        index.update('new', *self.plane.from_xy(500, 0))
+
+        own_east, own_north = 100, -200
+        index.set_origin(GPSPosition(*self.plane.from_xy(own_east, own_north)))
+        results = index.recompute()
+        self.assertEqual(len(results), len(positions))
+
+        for mmsi, distance, bearing in results:
+            east, north = positions[mmsi]
+            self.assertAlmostEqual(distance, math.hypot(east - own_east, north - own_north), delta=0.01)
+            self.assertAlmostEqual(bearing, math.degrees(math.atan2(east - own_east, north - own_north)) % 360, delta=0.01)
+            self.assertEqual(index.distance(mmsi), distance)
+            self.assertEqual(index.bearing(mmsi), bearing)
+
+        farthest = max(positions, key=lambda mmsi: math.hypot(positions[mmsi][0] - own_east, positions[mmsi][1] - own_north))
+        self.assertEqual(index.farthest()[0], farthest)
+        self.assertEqual(len(index._heap), len(positions))
+
+        self.assertAlmostEqual(index.bearing('new'), math.degrees(math.atan2(400, 200)), delta=0.01)
+
+
+    def test_recompute(self):
+        self.check_recompute(VesselIndex(cell_size=100, use_numpy=False))
+
+
+    @unittest.skipUnless(NUMPY_AVAILABLE, "numpy not installed")
+    def test_recompute_numpy(self):
+        self.check_recompute(VesselIndex(cell_size=100, use_numpy=True))
+
+
+    def test_bounding_box(self):
+        rnd = random.Random(42)
+
+        for latitude in (0, 45, -70):
+            origin = GPSPosition(latitude, 10)
+            plane = LocalTangentPlane(origin)
+            d_lat, d_lon = bounding_box_degrees(latitude, 5000)
+
+            for i in range(200):
+                angle = rnd.uniform(0, 2 * math.pi)
+                position = plane.from_xy(5000 * math.cos(angle), 5000 * math.sin(angle))
+                self.assertLessEqual(abs(position[0] - latitude), d_lat)
+                self.assertLessEqual(abs(position[1] - 10), d_lon)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -40,6 +40,7 @@ sys.path.insert(1, os.path.join(sys.path[0], '../gps_providers'))
 
 from dbus_connector import DBusConnector
 from abstract_gps_provider import GPSPosition
+from abstract_gps_provider import GPSSnapshot
 
 from mock_dbus_monitor import MockDbusMonitor
 from mock_dbus_service import MockDbusService
@@ -68,7 +69,7 @@ class TestAISVesselTracking(unittest.TestCase):
         
         # Create mock controller with GPS position
         self.mock_controller = MagicMock()
-        self.mock_controller.get_gps_position = MagicMock(return_value=GPSPosition(14.0829979, -60.9595577))
+        self.mock_controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(14.0829979, -60.9595577)))
         
         # Create mock bridge
         self.mock_bridge = MagicMock()
@@ -368,7 +369,7 @@ class TestAISVesselTracking(unittest.TestCase):
         """Test pruning when GPS is not available"""
         
         # Set controller to return no GPS
-        self.mock_controller.get_gps_position.return_value = None
+        self.mock_controller.get_gps_snapshot.return_value = GPSSnapshot(None)
         
         # Create vessel
         mmsi = "368081510"
@@ -474,7 +475,7 @@ class TestAISVesselTracking(unittest.TestCase):
         """Test AIS processing when GPS position is unavailable"""
         
         # Set controller to return no GPS
-        self.mock_controller.get_gps_position.return_value = None
+        self.mock_controller.get_gps_snapshot.return_value = GPSSnapshot(None)
         
         # Should not crash and should not create vessels (except 'self')
         self.connector._on_ais_message(self.valid_ais_message)
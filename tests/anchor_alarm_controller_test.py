@@ -23,6 +23,7 @@ import os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from anchor_alarm_controller import AnchorAlarmController
+from anchor_alarm_controller import UPDATE_EVERY_TICK, UPDATE_ON_CHANGE
 from anchor_alarm_model import AnchorAlarmConfiguration, AnchorAlarmState
 from collections import namedtuple
 
@@ -33,6 +34,7 @@ from unittest.mock import call
 
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../gps_providers'))
 from abstract_gps_provider import GPSPosition
+from nmea_gps_provider import NMEAGPSProvider
 
 
 from glib_timer_mock import GLibTimerMock
@@ -219,7 +221,7 @@ class TestAnchorAlarmController(unittest.TestCase):
         connector.update_state =  MagicMock(return_value=None)
         connector.show_error =  MagicMock(return_value=None)
 
-        mock_state_disabled = AnchorAlarmState('DISABLED', ANY, ANY, ANY, ANY, ANY)
+        mock_state_disabled = AnchorAlarmState('DISABLED', ANY, ANY, ANY, ANY, ANY, ANY)
 
         controller.register_connector(connector)
         connector.on_state_changed.assert_called_with(mock_state_disabled)
@@ -250,7 +252,7 @@ class TestAnchorAlarmController(unittest.TestCase):
         connector.update_state =  MagicMock(return_value=None)
         connector.show_error =  MagicMock(return_value=None)
 
-        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY)
+        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY, ANY)
 
         controller.register_connector(connector)
         connector.on_state_changed.assert_called_with(mock_state_in_radius)
@@ -276,9 +278,9 @@ class TestAnchorAlarmController(unittest.TestCase):
 
 
     def test_connector_mock(self):
-        mock_state_disabled = AnchorAlarmState('DISABLED', ANY, ANY, ANY, ANY, ANY)
-        mock_state_drop_point_set = AnchorAlarmState('DROP_POINT_SET', ANY, ANY, ANY, ANY, ANY)
-        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY)
+        mock_state_disabled = AnchorAlarmState('DISABLED', ANY, ANY, ANY, ANY, ANY, ANY)
+        mock_state_drop_point_set = AnchorAlarmState('DROP_POINT_SET', ANY, ANY, ANY, ANY, ANY, ANY)
+        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY, ANY)
 
         gps_provider = MagicMock()
         gps_provider.get_gps_position = MagicMock(return_value=None)
@@ -357,7 +359,7 @@ class TestAnchorAlarmController(unittest.TestCase):
         connector.update_state =  MagicMock(return_value=None)
         connector.show_message = MagicMock(return_value=None)
 
-        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY)
+        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY, ANY)
         controller.register_connector(connector)
         connector.on_state_changed.assert_called_with(mock_state_in_radius)
 
@@ -365,14 +367,14 @@ class TestAnchorAlarmController(unittest.TestCase):
 
         # should not happen because it only works when DISABLED
         controller.trigger_mooring_mode()
-        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY)
+        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY, ANY)
         connector.show_message.assert_called_once()
 
         controller.trigger_anchor_up()
-        mock_state_in_radius = AnchorAlarmState('DISABLED', ANY, ANY, ANY, ANY, ANY)
+        mock_state_in_radius = AnchorAlarmState('DISABLED', ANY, ANY, ANY, ANY, ANY, ANY)
 
         controller.trigger_mooring_mode()
-        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY)
+        mock_state_in_radius = AnchorAlarmState('IN_RADIUS', ANY, ANY, ANY, ANY, ANY, ANY)
 
         self.assertEqual(controller._settings['Latitude'],  20)
         self.assertEqual(controller._settings['Longitude'], 21)
@@ -408,5 +410,304 @@ class TestAnchorAlarmController(unittest.TestCase):
         self.assertEqual(controller.get_gps_position(), self.gps_position_16m)
 
 
+    def test_event_driven_evaluation(self):
+        now = 0
+        def _clock():
+            return now
+
+        gps_provider_1 = MagicMock()
+        gps_provider_1.get_gps_position = MagicMock(return_value=self.gps_position_anchor_down)
+        gps_provider_1.fix_timeout = 2
+        gps_provider_2 = MagicMock()
+        gps_provider_2.get_gps_position = MagicMock(return_value=self.gps_position_anchor_down)
+        gps_provider_2.fix_timeout = 2
+
+        controller = AnchorAlarmController(lambda: timer_provider, MockSettingsDevice, _clock)
+        controller.register_gps_provider(gps_provider_1)
+        controller.register_gps_provider(gps_provider_2)
+        controller._settings['EventDrivenEvaluation'] = 1
+
+        controller.trigger_anchor_down()
+        controller.trigger_chain_out()
+        self.assertEqual(controller._anchor_alarm.state, 'IN_RADIUS')
+
+        on_timer_tick = MagicMock(wraps=controller._anchor_alarm.on_timer_tick)
+        controller._anchor_alarm.on_timer_tick = on_timer_tick
+
+        # fix evaluated as soon as it arrives, no need to wait for the tick
+        now = 0.2
+        controller._on_gps_position(gps_provider_1, self.gps_position_21m)
+        on_timer_tick.assert_called_once_with(self.gps_position_21m)
+        self.assertEqual(controller._anchor_alarm.state, 'ALARM_DRAGGING')
+        self.assertEqual(controller.get_gps_snapshot().position, self.gps_position_21m)
+
+        # fixes from a lower priority provider are ignored
+        on_timer_tick.reset_mock()
+        now = 0.4
+        controller._on_gps_position(gps_provider_2, self.gps_position_anchor_down)
+        on_timer_tick.assert_not_called()
+
+        # timer tick doesn't evaluate again when a fix arrived during the last second
+        controller._on_timer_tick()
+        on_timer_tick.assert_not_called()
+
+        now = 3
+        controller._on_gps_position(gps_provider_1, self.gps_position_21m)
+        on_timer_tick.assert_called_once_with(self.gps_position_21m)
+        self.assertEqual(controller._anchor_alarm.get_current_state().params['out_of_radius_count'], 3)
+
+        # gps providers are never polled, the timer tick only keeps the last fix counting
+        gps_provider_1.get_gps_position.reset_mock()
+        gps_provider_2.get_gps_position.reset_mock()
+        on_timer_tick.reset_mock()
+        now = 4
+        controller._on_timer_tick()
+        on_timer_tick.assert_called_once_with(self.gps_position_21m)
+        self.assertEqual(controller._anchor_alarm.get_current_state().params['out_of_radius_count'], 4)
+
+        # no fix anymore, the timer tick detects the GPS loss
+        on_timer_tick.reset_mock()
+        now = 5
+        controller._on_timer_tick()
+        on_timer_tick.assert_called_once_with(None)
+        self.assertEqual(controller._anchor_alarm.get_current_state().params['no_gps_count'], 1)
+        self.assertIsNone(controller.get_gps_snapshot().position)
+        gps_provider_1.get_gps_position.assert_not_called()
+        gps_provider_2.get_gps_position.assert_not_called()
+
+        # then any provider is used
+        on_timer_tick.reset_mock()
+        now = 5.5
+        controller._on_gps_position(gps_provider_2, self.gps_position_16m)
+        on_timer_tick.assert_called_once_with(self.gps_position_16m)
+
+        # until a higher priority one has a fix again
+        on_timer_tick.reset_mock()
+        controller._on_gps_position(gps_provider_1, self.gps_position_21m)
+        controller._on_gps_position(gps_provider_2, self.gps_position_16m)
+        on_timer_tick.assert_called_once_with(self.gps_position_21m)
+
+        # a provider telling it lost the fix is evaluated right away
+        on_timer_tick.reset_mock()
+        now = 6
+        controller._on_gps_position(gps_provider_2, None)
+        on_timer_tick.assert_not_called()
+        controller._on_gps_position(gps_provider_1, None)
+        on_timer_tick.assert_called_once_with(None)
+        self.assertIsNone(controller.get_gps_snapshot().position)
+
+        # disabled, positions are not evaluated
+        on_timer_tick.reset_mock()
+        controller._settings['EventDrivenEvaluation'] = 0
+        now = 7
+        controller._on_gps_position(gps_provider_1, self.gps_position_21m)
+        on_timer_tick.assert_not_called()
+
+
+    def test_timer_stats(self):
+        now = 0
+        def _clock():
+            return now
+
+        controller = AnchorAlarmController(lambda: timer_provider, MockSettingsDevice, _clock)
+        self.assertEqual(controller.get_timer_stats().ticks, 0)
+
+        for interval in [0, 1, 1, 3, 1.2, 0.8]:
+            now += interval
+            controller._on_timer_tick()
+
+        stats = controller.get_timer_stats()
+        self.assertEqual(stats.ticks, 5)
+        self.assertAlmostEqual(stats.last_interval, 0.8)
+        self.assertAlmostEqual(stats.average_drift, 0.4)
+        self.assertAlmostEqual(stats.max_drift, 2)
+        self.assertEqual(stats.late_ticks, 1)
+
+
+    def test_connector_update_policy(self):
+        now = 0
+        def _clock():
+            return now
+
+        gps_provider = MagicMock()
+        gps_provider.get_gps_position = MagicMock(return_value=self.gps_position_anchor_down)
+
+        controller = AnchorAlarmController(lambda: timer_provider, MockSettingsDevice, _clock)
+        controller.register_gps_provider(gps_provider)
+
+        every_tick_connector = MagicMock()
+        every_tick_connector.update_policy = UPDATE_EVERY_TICK
+        on_change_connector = MagicMock()
+        on_change_connector.update_policy = UPDATE_ON_CHANGE
+        on_change_connector.update_keepalive_interval = None
+        keepalive_connector = MagicMock()
+        keepalive_connector.update_policy = UPDATE_ON_CHANGE
+        keepalive_connector.update_keepalive_interval = 5
+
+        for connector in [every_tick_connector, on_change_connector, keepalive_connector]:
+            controller.register_connector(connector)
+
+        controller.trigger_anchor_down()
+        controller.trigger_chain_out()
+
+        for i in range(10):
+            now += 1
+            controller._on_timer_tick()
+
+        # nothing changed while sitting in radius
+        self.assertEqual(every_tick_connector.update_state.call_count, 10)
+        self.assertEqual(on_change_connector.update_state.call_count, 1)
+        self.assertEqual(keepalive_connector.update_state.call_count, 2)
+
+        # boat moved
+        gps_provider.get_gps_position = MagicMock(return_value=self.gps_position_16m)
+        now += 1
+        controller._on_timer_tick()
+        now += 1
+        controller._on_timer_tick()
+        self.assertEqual(every_tick_connector.update_state.call_count, 12)
+        self.assertEqual(on_change_connector.update_state.call_count, 2)
+        self.assertEqual(keepalive_connector.update_state.call_count, 4)    # keepalive + change
+
+
+    def test_gps_snapshot(self):
+        now = 0
+        def _clock():
+            return now
+
+        gps_provider = MagicMock()
+        gps_provider.get_gps_position = MagicMock(return_value=self.gps_position_anchor_down)
+        gps_provider.get_source_id = MagicMock(return_value="NMEA 3")
+
+        controller = AnchorAlarmController(lambda: timer_provider, MockSettingsDevice, _clock)
+        controller.register_gps_provider(gps_provider)
+
+        now = 1
+        controller._on_timer_tick()
+        gps_provider.get_gps_position.reset_mock()
+
+        # consumers share the snapshot taken during the tick
+        now = 1.5
+        for i in range(100):
+            snapshot = controller.get_gps_snapshot()
+        gps_provider.get_gps_position.assert_not_called()
+
+        self.assertEqual(snapshot.position, self.gps_position_anchor_down)
+        self.assertEqual(snapshot.source, "NMEA 3")
+        self.assertEqual(snapshot.epoch, 1)
+        self.assertEqual(snapshot.timestamp, 1)
+        self.assertEqual(snapshot.age, 0.5)
+
+        gps_provider.get_gps_position = MagicMock(return_value=None)
+        now = 2
+        controller._on_timer_tick()
+        gps_provider.get_gps_position.assert_called_once()
+
+        snapshot = controller.get_gps_snapshot()
+        self.assertIsNone(snapshot.position)
+        self.assertIsNone(snapshot.source)
+        self.assertEqual(snapshot.epoch, 2)
+        self.assertEqual(snapshot.age, 0)
+
+
+    def test_position_filter(self):
+        now = 0
+        def _clock():
+            return now
+
+        gps_provider = MagicMock()
+        gps_provider.get_gps_position = MagicMock(return_value=self.gps_position_anchor_down)
+
+        controller = AnchorAlarmController(lambda: timer_provider, MockSettingsDevice, _clock)
+        controller.register_gps_provider(gps_provider)
+
+        # disabled by default, positions used as is
+        controller._on_timer_tick()
+        self.assertIs(controller.get_gps_snapshot().position, self.gps_position_anchor_down)
+
+        controller._settings['PositionFilter'] = 1
+        controller.trigger_anchor_down()
+        controller.trigger_chain_out()
+
+        position_filter = controller.get_position_filter()
+        update = MagicMock(wraps=position_filter.update)
+        position_filter.update = update
+
+        for i in range(1, 30):
+            now = i
+            gps_provider.get_gps_position = MagicMock(return_value=self.gps_position_anchor_down._replace(accuracy=3))
+            gps_provider.get_fix_id = MagicMock(return_value=i)
+            controller._on_timer_tick()
+
+        self.assertEqual(update.call_count, 29)
+        self.assertIsNotNone(controller.get_gps_snapshot().position.accuracy)
+        self.assertLess(controller.get_gps_snapshot().position.accuracy, 3)
+
+        # a single jump doesn't trigger the alarm
+        now = 30
+        gps_provider.get_gps_position = MagicMock(return_value=self.gps_position_21m._replace(accuracy=3))
+        gps_provider.get_fix_id = MagicMock(return_value=30)
+        controller._on_timer_tick()
+        self.assertEqual(controller._anchor_alarm.state, 'IN_RADIUS')
+
+        # same fix returned again, not fed twice
+        update.reset_mock()
+        now = 31
+        controller._on_timer_tick()
+        update.assert_not_called()
+
+        # GPS loss is not hidden by the filter
+        gps_provider.get_gps_position = MagicMock(return_value=None)
+        now = 32
+        controller._on_timer_tick()
+        self.assertIsNone(controller.get_gps_snapshot().position)
+        self.assertEqual(controller._anchor_alarm.get_current_state().params['no_gps_count'], 1)
+
+
+    def test_position_filter_fused_fixes(self):
+        now = 0
+        def _clock():
+            return now
+
+        handlers = {}
+        mock_bridge = MagicMock()
+        mock_bridge.add_pgn_handler = MagicMock(side_effect=lambda pgn, handler, **kwargs: handlers.__setitem__(pgn, handler))
+
+        # fused positions are new objects on every call, and equal values can still be new fixes
+        gps_provider = NMEAGPSProvider(lambda: timer_provider, mock_bridge, _clock, MockSettingsDevice)
+        gps_provider._settings['Fusion'] = 1
+
+        controller = AnchorAlarmController(lambda: timer_provider, MockSettingsDevice, _clock)
+        controller.register_gps_provider(gps_provider)
+        controller._settings['PositionFilter'] = 1
+
+        position_filter = controller.get_position_filter()
+        update = MagicMock(wraps=position_filter.update)
+        position_filter.update = update
+
+        def fix(src):
+            return {'src': src, 'pgn': 129029, 'fields': {'Latitude': 18.5060715, 'Longitude': -64.3725071, 'Method': 'GNSS fix', 'HDOP': 1, 'Number of SVs': 10}}
+
+        for i in range(10):
+            now = i
+            handlers[129029](fix(1 + i % 2))
+            controller._on_timer_tick()
+            now = i + 0.5
+            controller._on_timer_tick()
+
+        self.assertEqual(update.call_count, 10)
+
+        # the same fixes with a non fused provider
+        gps_provider._settings['Fusion'] = 0
+        update.reset_mock()
+        for i in range(10, 20):
+            now = i
+            handlers[129029](fix(1))
+            controller._on_timer_tick()
+            controller._on_timer_tick()
+
+        self.assertEqual(update.call_count, 10)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
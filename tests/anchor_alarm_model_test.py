@@ -33,6 +33,18 @@ from unittest.mock import ANY
 from abstract_gps_provider import GPSPosition
 
 
+class TickingAnchorAlarmModel(AnchorAlarmModel):
+    """Advances a fake monotonic clock by one second on every tick, like the GLib timer would"""
+
+    def __init__(self, on_state_change_fn):
+        self.now = 0
+        super().__init__(on_state_change_fn, lambda: self.now)
+
+    def on_timer_tick(self, gps_position):
+        self.now += 1
+        super().on_timer_tick(gps_position)
+
+
 class TestAnchorAlarmModel(unittest.TestCase):
 
     def setUp(self):
@@ -59,7 +71,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
         self.last_state_change = state.state
 
     def assertState(self, anchor_alarm, expected_state_change, anchor_alarm_state):
-        self.assertEqual(anchor_alarm.get_current_state()._asdict(), anchor_alarm_state._asdict())
+        self.assertEqual(anchor_alarm.get_current_state()._asdict(), anchor_alarm_state._replace(version=ANY)._asdict())
         self.assertEqual(self.last_state_change, expected_state_change)
         self.last_state_change = None
 
@@ -424,7 +436,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_complete_cycle(self):
 
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -495,7 +507,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_anchor_up_from_disabled(self):
         # from DISABLED
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -510,7 +522,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_anchor_up_from_drop_point_set(self):
         # from DROP_POINT_SET
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -527,7 +539,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
 
     def test_anchor_up_from_with_radius_set(self):
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -549,7 +561,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_anchor_up_after_a_few_ticks(self):
         # anchor_up after a few ticks
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -577,7 +589,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
 
     def test_anchor_up_alarm_no_gps(self):
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -608,7 +620,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
 
     def test_anchor_up_alarm_no_gps_muted(self):
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -646,7 +658,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
 
     def test_anchor_up_alarm_dragging(self):
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -677,7 +689,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     
     def test_anchor_up_alarm_dragging_muted(self):
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
@@ -712,7 +724,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_params_exceptions(self):
         self.out_of_radius_count         = 0
 
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5)) 
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
 
@@ -756,7 +768,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_reset_state(self):
         self.out_of_radius_count         = 0
 
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5)) 
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
 
@@ -779,7 +791,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
 
 
     def test_config_updated(self):
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state) 
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state) 
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(5, 3, 5))
         self.assertEqual(5, anchor_alarm._radius_tolerance)
         self.assertEqual(3, anchor_alarm._no_gps_count_threshold)
@@ -788,7 +800,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
     def test_tolerance_increased(self):
         # test that when anchor is dragging or muted and tolerance is increased enough, it goes back to IN_RADIUS state
         self.out_of_radius_count         = 0
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 3, 5))
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, {"state": 'DISABLED', "radius_tolerance": self.tolerance, "drop_point": None, "radius": None, "no_gps_count": 0, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
         self._out_of_sequence_calls(anchor_alarm)
@@ -833,7 +845,7 @@ class TestAnchorAlarmModel(unittest.TestCase):
 
 
     def test_wrong_coordinates(self):
-        anchor_alarm =  AnchorAlarmModel(self._update_last_state)
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
         self.assertState(anchor_alarm, None, AnchorAlarmState('DISABLED', ANY, ANY, "info", False, ANY))
 
         anchor_alarm.reset_state(self.gps_position_anchor_down, 21)
@@ -853,6 +865,99 @@ class TestAnchorAlarmModel(unittest.TestCase):
         # test that when no_gps_count_threshold is increased, state goes to alarm
 
 
+    def test_durations_with_lagging_timer(self):
+        now = 0
+        anchor_alarm =  AnchorAlarmModel(self._update_last_state, lambda: now)
+        anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 30, 30))
+
+        anchor_alarm.reset_state(self.gps_position_anchor_down, 21)
+        self.assertState(anchor_alarm, "IN_RADIUS", AnchorAlarmState('IN_RADIUS', ANY, ANY, "info", False, ANY))
+
+        # main loop stalls, only 2 ticks during 31 seconds without GPS
+        now = 15
+        anchor_alarm.on_timer_tick(None)
+        self.assertEqual(anchor_alarm.get_current_state().params['no_gps_count'], 15)
+        self.assertEqual(self.last_state_change, None)
+
+        now = 31
+        anchor_alarm.on_timer_tick(None)
+        self.assertState(anchor_alarm, 'ALARM_NO_GPS', AnchorAlarmState('ALARM_NO_GPS', ANY, ANY, "emergency", False, {"state": 'ALARM_NO_GPS', "radius_tolerance": self.tolerance, "drop_point": self.gps_position_anchor_down, "radius": 21, "no_gps_count": 31, "out_of_radius_count": 0, "alarm_muted_count": 0, "current_radius": None}))
+
+        # mute lasts 30 seconds whatever the number of ticks
+        anchor_alarm.mute_alarm()
+        self.assertEqual(self.last_state_change, 'ALARM_NO_GPS_MUTED')
+        self.last_state_change = None
+
+        now = 51
+        anchor_alarm.on_timer_tick(None)
+        self.assertState(anchor_alarm, None, AnchorAlarmState('ALARM_NO_GPS_MUTED', ANY, ANY, "emergency", True, {"state": 'ALARM_NO_GPS_MUTED', "radius_tolerance": self.tolerance, "drop_point": self.gps_position_anchor_down, "radius": 21, "no_gps_count": 51, "out_of_radius_count": 0, "alarm_muted_count": 20, "current_radius": None}))
+
+        now = 62
+        anchor_alarm.on_timer_tick(None)
+        self.assertEqual(self.last_state_change, 'ALARM_NO_GPS')
+        self.last_state_change = None
+
+        # dragging duration measured from the last in radius position
+        now = 90
+        anchor_alarm.on_timer_tick(self.gps_position_16m)
+        self.assertEqual(self.last_state_change, 'IN_RADIUS')
+        self.last_state_change = None
+
+        now = 100
+        anchor_alarm.on_timer_tick(self.gps_position_124m)
+        self.assertState(anchor_alarm, 'ALARM_DRAGGING', AnchorAlarmState('ALARM_DRAGGING', ANY, ANY, "emergency", False, {"state": 'ALARM_DRAGGING', "radius_tolerance": self.tolerance, "drop_point": self.gps_position_anchor_down, "radius": 21, "no_gps_count": 0, "out_of_radius_count": 10, "alarm_muted_count": 0, "current_radius": 124}))
+
+
+    def test_state_version(self):
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
+        state = anchor_alarm.get_current_state()
+
+        # nothing changed, same state object
+        self.assertIs(anchor_alarm.get_current_state(), state)
+
+        anchor_alarm.reset_state(self.gps_position_anchor_down, 21)
+        in_radius_state = anchor_alarm.get_current_state()
+        self.assertGreater(in_radius_state.version, state.version)
+
+        # same position, state unchanged
+        anchor_alarm.on_timer_tick(self.gps_position_21m)
+        self.assertIs(anchor_alarm.get_current_state(), in_radius_state)
+
+        anchor_alarm.on_timer_tick(self.gps_position_16m)
+        self.assertEqual(anchor_alarm.get_current_state().version, in_radius_state.version + 1)
+        self.assertEqual(anchor_alarm.get_current_state().params['current_radius'], 16)
+
+
+    def test_confidence(self):
+        anchor_alarm =  TickingAnchorAlarmModel(self._update_last_state)
+        anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 30, 30, 5, 99))
+        anchor_alarm.reset_state(self.gps_position_anchor_down, 21)
+        self.last_state_change = None
+
+        # 64m away but with a 15m accuracy, can't be sure we're out of the 41m radius
+        uncertain_position = self.gps_position_64m._replace(accuracy=15)
+        anchor_alarm.on_timer_tick(uncertain_position)
+        self.assertEqual(anchor_alarm.state, 'IN_RADIUS')
+        self.assertEqual(anchor_alarm.get_current_state().params['current_radius'], 64)
+
+        # accurate enough
+        anchor_alarm.on_timer_tick(self.gps_position_64m._replace(accuracy=5))
+        self.assertEqual(self.last_state_change, 'ALARM_DRAGGING')
+        anchor_alarm.anchor_up()
+
+        # no accuracy, position used as is
+        anchor_alarm.reset_state(self.gps_position_anchor_down, 21)
+        anchor_alarm.on_timer_tick(self.gps_position_64m)
+        self.assertEqual(anchor_alarm.state, 'ALARM_DRAGGING')
+        anchor_alarm.anchor_up()
+
+        # no confidence
+        anchor_alarm.update_configuration(AnchorAlarmConfiguration(self.tolerance, 30, 30, 5, 0))
+        anchor_alarm.reset_state(self.gps_position_anchor_down, 21)
+        anchor_alarm.on_timer_tick(uncertain_position)
+        self.assertEqual(anchor_alarm.state, 'ALARM_DRAGGING')
+
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,97 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import json
+import unittest
+
+from bridge_framing import StreamDecoder, encode_frame, FRAME_EVENT, FRAME_NMEA
+
+
+class TestStreamDecoder(unittest.TestCase):
+
+    def test_json_lines(self):
+        decoder = StreamDecoder()
+
+        decoder.feed(b'{"event": "on_filterPGN"}\n\n{"event": "on_in')
+        self.assertEqual(list(decoder.messages()), [(FRAME_EVENT, 0, 0, 0, 0, b'{"event": "on_filterPGN"}')])
+        self.assertEqual(decoder.pending_bytes(), len(b'{"event": "on_in'))
+
+        decoder.feed(b'itCAN"}\r\n')
+        self.assertEqual(list(decoder.messages()), [(FRAME_EVENT, 0, 0, 0, 0, b'{"event": "on_initCAN"}')])
+        self.assertEqual(decoder.pending_bytes(), 0)
+
+
+    def test_switch_to_binary(self):
+        decoder = StreamDecoder()
+        fields = json.dumps({'Latitude': 14.08, 'Name': 'Océane'}).encode()
+
+        frame = encode_frame(FRAME_NMEA, fields, 129039, 43, 255, 4)
+        decoder.feed(b'{"event": "on_initCAN", "framing": "binary"}\n' + frame + frame[:5])
+
+        messages = []
+        for message in decoder.messages():
+            messages.append(message)
+            # like NMEABridge does when it gets on_initCAN
+            decoder.binary = True
+
+        self.assertEqual(messages, [
+            (FRAME_EVENT, 0, 0, 0, 0, b'{"event": "on_initCAN", "framing": "binary"}'),
+            (FRAME_NMEA, 129039, 43, 255, 4, fields)])
+        self.assertEqual(json.loads(messages[1][5])['Name'], 'Océane')
+
+        # incomplete frame waits for the rest
+        self.assertEqual(decoder.pending_bytes(), 5)
+        decoder.feed(frame[5:] + encode_frame(FRAME_EVENT, b'{"event": "on_sendPGN"}'))
+        self.assertEqual(list(decoder.messages()), [
+            (FRAME_NMEA, 129039, 43, 255, 4, fields),
+            (FRAME_EVENT, 0, 0, 0, 0, b'{"event": "on_sendPGN"}')])
+        self.assertEqual(decoder.pending_bytes(), 0)
+
+
+    def test_byte_by_byte(self):
+        decoder = StreamDecoder()
+        decoder.binary = True
+
+        frames = [encode_frame(FRAME_NMEA, json.dumps({'index': i}).encode(), 129029, i) for i in range(10)]
+        messages = []
+        for byte in b''.join(frames):
+            decoder.feed(bytes([byte]))
+            messages.extend(decoder.messages())
+
+        self.assertEqual([message[2] for message in messages], list(range(10)))
+
+
+    def test_reset(self):
+        decoder = StreamDecoder()
+        decoder.binary = True
+        decoder.feed(b'\x00\x00')
+        decoder.reset()
+
+        self.assertFalse(decoder.binary)
+        self.assertEqual(decoder.pending_bytes(), 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
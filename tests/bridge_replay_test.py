@@ -0,0 +1,170 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import tempfile
+import unittest
+
+from bridge_replay import CaptureWriter, VirtualClock, ReplayBridge, capture_files, read_capture
+from fake_clock import FakeClock
+
+
+def position(src, latitude):
+    return {'pgn': 129025, 'src': src, 'dst': 255, 'prio': 2, 'fields': {'Latitude': latitude, 'Longitude': -64.37}}
+
+
+class TestCapture(unittest.TestCase):
+
+    def test_write_read(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.log')
+            writer = CaptureWriter(path, clock=clock)
+            for i in range(3):
+                clock.now = 1000.1234 + i
+                writer.write(position(3, 18.5 + i))
+            writer.close()
+
+            with open(path, 'a') as capture:
+                capture.write('[1003.1,129025,3,25')
+
+            messages = list(read_capture(path))
+            self.assertEqual([timestamp for timestamp, message in messages], [1000.123, 1001.123, 1002.123])
+            self.assertEqual(messages[2][1], position(3, 20.5))
+
+
+    def test_rotation(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.log')
+            writer = CaptureWriter(path, max_bytes=300, backup_count=2, clock=clock)
+            for i in range(20):
+                clock.now = i
+                writer.write(position(3, i))
+            writer.close()
+
+            self.assertEqual(capture_files(path), [path +'.2', path +'.1', path])
+            for file_path in capture_files(path):
+                self.assertLessEqual(os.path.getsize(file_path), 300)
+
+            # oldest lines are gone, the others are read in order
+            timestamps = [timestamp for timestamp, message in read_capture(path)]
+            self.assertEqual(timestamps[-1], 19)
+            self.assertGreater(timestamps[0], 0)
+            self.assertEqual(timestamps, sorted(timestamps))
+
+            # appends to an existing capture
+            writer = CaptureWriter(path, max_bytes=300, backup_count=2, clock=clock)
+            writer.write(position(3, 20))
+            writer.close()
+            self.assertEqual(list(read_capture(path))[-1][1], position(3, 20))
+
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def test_timers(self):
+        clock = VirtualClock(100)
+        calls = []
+
+        def repeat(name):
+            calls.append((name, clock()))
+            return True
+
+        clock.timeout_add(1000, repeat, 'repeat')
+        clock.timeout_add_seconds(2.5, lambda: calls.append(('once', clock())))
+        removed = clock.timeout_add(500, repeat, 'removed')
+        clock.source_remove(removed)
+
+        clock.advance_to(103)
+        self.assertEqual(calls, [('repeat', 101), ('repeat', 102), ('once', 102.5), ('repeat', 103)])
+        self.assertEqual(clock(), 103)
+
+        # time never goes back
+        clock.advance_to(50)
+        self.assertEqual(clock(), 103)
+
+
+
+class TestReplayBridge(unittest.TestCase):
+
+    def test_dispatch(self):
+        capture = [(1000 + i * 0.5, position(src, i)) for i in range(10) for src in [3, 43]]
+        bridge = ReplayBridge(capture)
+
+        all_messages = []
+        throttled = []
+        bridge.add_pgn_handler(129025, lambda message: all_messages.append((bridge.clock(), message['src'])))
+        bridge.add_pgn_handler(129025, lambda message: throttled.append((bridge.clock(), message['src'])), throttle=2)
+        bridge.add_pgn_handler(129029, lambda message: self.fail("not in capture"))
+
+        ticks = []
+        bridge.clock.timeout_add(1000, lambda: ticks.append(bridge.clock()) or True)
+
+        self.assertEqual(bridge.run(), 20)
+
+        self.assertEqual(len(all_messages), 20)
+        self.assertEqual(all_messages[-1], (4.5, 43))
+        self.assertEqual(throttled, [(0, 3), (0, 43), (2, 3), (2, 43), (4, 3), (4, 43)])
+        self.assertEqual(ticks, [1, 2, 3, 4])
+
+        # duration, timers still fire up to its end
+        bridge = ReplayBridge(capture)
+        ticks = []
+        bridge.clock.timeout_add(1000, lambda: ticks.append(bridge.clock()) or True)
+        self.assertEqual(bridge.run(2), 10)
+        self.assertEqual(ticks, [1, 2])
+
+
+    def test_send(self):
+        bridge = ReplayBridge([(0, position(3, 0)), (30, position(3, 0))])
+        bridge.enable_change_suppression(127501, 10)
+
+        status = {'pgn': 127501, 'fields': {'Instance': 0, 'Indicator1': 'On'}}
+        bridge.add_pgn_handler(129025, lambda message: [bridge.send_nmea(status), bridge.send_nmea(status)])
+        bridge.register_template('text', {'pgn': 126985, 'fields': {'Alert Text Description': ''}})
+        bridge.clock.timeout_add(5000, lambda: bridge.send_template('text', {'Alert Text Description': 'Drifting'}))
+
+        bridge.run()
+
+        self.assertEqual(bridge.sent, [(0, status),
+                                       (5, {'pgn': 126985, 'fields': {'Alert Text Description': 'Drifting'}}),
+                                       (30, status)])
+        self.assertEqual(bridge.get_suppression_stats().suppressed, 2)
+
+
+    def test_speed(self):
+        capture = [(i * 10, position(3, i)) for i in range(4)]
+        sleeps = []
+        bridge = ReplayBridge(capture, speed=10, sleep=sleeps.append)
+        bridge.run()
+
+        # messages are due 1 second apart at 10x. The injected sleep returns at once, so each one waits from the start
+        self.assertEqual(len(sleeps), 3)
+        for expected, sleep in zip([1, 2, 3], sleeps):
+            self.assertAlmostEqual(sleep, expected, delta=0.1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import json
+import unittest
+
+from bridge_scheduler import OutboundScheduler, ChangeSuppressor, MessageTemplate, TokenBucket, get_nmea_priority, merge_template, PRIORITY_CONTROL, PRIORITY_ALARM, PRIORITY_STATUS, PRIORITY_AIS
+from fake_clock import FakeClock
+
+
+def ais(i):
+    return {"command": "sendPGN", "message": {"pgn": 129039, "i": i}}
+
+def alert(i):
+    return {"command": "sendPGN", "message": {"pgn": 126983, "i": i}}
+
+def status(i):
+    return {"command": "sendPGN", "message": {"pgn": 127501, "i": i}}
+
+
+class TestOutboundScheduler(unittest.TestCase):
+
+    def test_default_priorities(self):
+        self.assertEqual(get_nmea_priority({"pgn": 126983}), PRIORITY_ALARM)
+        self.assertEqual(get_nmea_priority({"pgn": 127502}), PRIORITY_ALARM)
+        self.assertEqual(get_nmea_priority({"pgn": 127501}), PRIORITY_STATUS)
+        self.assertEqual(get_nmea_priority({"pgn": 129809}), PRIORITY_AIS)
+        self.assertEqual(get_nmea_priority({}), PRIORITY_STATUS)
+
+
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 3, clock)
+
+        self.assertTrue(bucket.try_consume())
+        self.assertTrue(bucket.try_consume())
+        self.assertTrue(bucket.try_consume())
+        self.assertFalse(bucket.try_consume())
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+
+        clock.now = 0.5
+        self.assertTrue(bucket.try_consume())
+        self.assertFalse(bucket.try_consume())
+
+        # never more than burst tokens
+        clock.now = 100
+        for i in range(3):
+            self.assertTrue(bucket.try_consume())
+        self.assertFalse(bucket.try_consume())
+
+
+    def test_priority_order(self):
+        scheduler = OutboundScheduler(clock=FakeClock())
+
+        scheduler.push(ais(1), PRIORITY_AIS)
+        scheduler.push(status(1), PRIORITY_STATUS)
+        scheduler.push(ais(2), PRIORITY_AIS)
+        scheduler.push(alert(1), PRIORITY_ALARM)
+        scheduler.push({"command": "filterPGN"}, PRIORITY_CONTROL)
+
+        self.assertEqual(len(scheduler), 5)
+        self.assertEqual(scheduler.pop(), {"command": "filterPGN"})
+        self.assertEqual(scheduler.pop(), alert(1))
+        self.assertEqual(scheduler.pop(), status(1))
+        self.assertEqual(scheduler.pop(), ais(1))
+        self.assertEqual(scheduler.pop(), ais(2))
+        self.assertIsNone(scheduler.pop())
+        self.assertIsNone(scheduler.next_delay())
+
+
+    def test_rate_limit(self):
+        clock = FakeClock()
+        scheduler = OutboundScheduler(rates={PRIORITY_ALARM: None, PRIORITY_AIS: (1, 2)}, clock=clock)
+
+        for i in range(4):
+            scheduler.push(ais(i), PRIORITY_AIS)
+
+        self.assertEqual(scheduler.pop(), ais(0))
+        self.assertEqual(scheduler.pop(), ais(1))
+        self.assertIsNone(scheduler.pop())
+        self.assertAlmostEqual(scheduler.next_delay(), 1)
+
+        # alarms are not limited and do not wait behind rate limited AIS messages
+        for i in range(10):
+            scheduler.push(alert(i), PRIORITY_ALARM)
+        self.assertEqual(scheduler.next_delay(), 0)
+        for i in range(10):
+            self.assertEqual(scheduler.pop(), alert(i))
+
+        clock.now = 1
+        self.assertEqual(scheduler.pop(), ais(2))
+        self.assertIsNone(scheduler.pop())
+
+        stats = scheduler.get_stats()
+        self.assertEqual(stats[PRIORITY_AIS].sent, 3)
+        self.assertEqual(stats[PRIORITY_AIS].queued, 1)
+        self.assertEqual(stats[PRIORITY_ALARM].sent, 10)
+
+
+    def test_drop_policy(self):
+        scheduler = OutboundScheduler(max_queued=3, clock=FakeClock())
+
+        scheduler.push(ais(1), PRIORITY_AIS)
+        scheduler.push(status(1), PRIORITY_STATUS)
+        scheduler.push(ais(2), PRIORITY_AIS)
+
+        # oldest of the lowest class goes first
+        self.assertEqual(scheduler.push(alert(1), PRIORITY_ALARM), ais(1))
+        self.assertEqual(scheduler.push(status(2), PRIORITY_STATUS), ais(2))
+
+        # nothing less important queued, the incoming AIS message is dropped
+        self.assertEqual(scheduler.push(ais(3), PRIORITY_AIS), ais(3))
+        self.assertEqual(scheduler.push(status(3), PRIORITY_STATUS), status(1))
+
+        # alarms are never dropped, even above the limit
+        self.assertEqual(scheduler.push(alert(2), PRIORITY_ALARM), status(2))
+        self.assertEqual(scheduler.push(alert(3), PRIORITY_ALARM), status(3))
+        self.assertIsNone(scheduler.push(alert(4), PRIORITY_ALARM))
+        self.assertEqual(len(scheduler), 4)
+
+        stats = scheduler.get_stats()
+        self.assertEqual(stats[PRIORITY_AIS].dropped, 3)
+        self.assertEqual(stats[PRIORITY_STATUS].dropped, 3)
+        self.assertEqual(stats[PRIORITY_ALARM].dropped, 0)
+
+
+    def test_requeue(self):
+        scheduler = OutboundScheduler(max_queued=4, clock=FakeClock())
+
+        scheduler.push(alert(2), PRIORITY_ALARM)
+        scheduler.push(ais(3), PRIORITY_AIS)
+
+        # unanswered commands go back ahead of their class
+        scheduler.requeue(ais(2), PRIORITY_AIS)
+        scheduler.requeue(alert(1), PRIORITY_ALARM)
+        self.assertEqual([scheduler.pop() for i in range(4)], [alert(1), alert(2), ais(2), ais(3)])
+
+        # the drop policy still applies
+        for i in range(4):
+            scheduler.push(ais(i), PRIORITY_AIS)
+        self.assertEqual(scheduler.requeue(ais(4), PRIORITY_AIS), ais(0))
+        self.assertEqual(scheduler.pop(), ais(4))
+
+
+
+    def test_merge_template(self):
+        position = {'pgn': 129039, 'fields': {'User ID': 0, 'Latitude': 0, 'Longitude': 0, 'SOG': 0}, 'description': 'AIS'}
+        alert = {'pgn': 126983, 'Alert ID': 1, 'Alert Type': 'Caution', 'Alert State': 'Normal'}
+
+        self.assertEqual(merge_template(position, {'Latitude': 10, 'Longitude': 11}),
+                         {'pgn': 129039, 'fields': {'User ID': 0, 'Latitude': 10, 'Longitude': 11, 'SOG': 0}, 'description': 'AIS'})
+        self.assertEqual(merge_template(alert, {'Alert State': 'Active'}),
+                         {'pgn': 126983, 'Alert ID': 1, 'Alert Type': 'Caution', 'Alert State': 'Active'})
+        self.assertIs(merge_template(alert, {}), alert)
+
+        # templates are never modified
+        self.assertEqual(position['fields']['Latitude'], 0)
+        self.assertEqual(alert['Alert State'], 'Normal')
+
+    def test_serialize_template_command(self):
+        template = MessageTemplate('ais "anchor"', {'pgn': 129039, 'fields': {'User ID': 0, 'Latitude': 0}})
+        command = {'id': 'abc', 'command': 'sendTemplate', 'template': 'ais "anchor"', 'fields': {'Latitude': 10.5, 'Name': 'é\n'}}
+
+        line = template.serialize_command(command)
+        self.assertEqual(json.loads(line), command)
+        self.assertNotIn('\n', line)
+
+
+class TestChangeSuppressor(unittest.TestCase):
+
+    def test_suppression(self):
+        clock = FakeClock()
+        suppressor = ChangeSuppressor(clock)
+        suppressor.enable(127501, 10)
+
+        bank_0 = {'pgn': 127501, 'fields': {'Instance': 0, 'Indicator1': 'Off'}}
+        bank_0_on = {'pgn': 127501, 'fields': {'Instance': 0, 'Indicator1': 'On'}}
+        bank_1 = {'pgn': 127501, 'fields': {'Instance': 1, 'Indicator1': 'Off'}}
+
+        self.assertTrue(suppressor.should_send(bank_0))
+        self.assertFalse(suppressor.should_send(dict(bank_0)))
+        self.assertTrue(suppressor.should_send(bank_1))
+
+        clock.now = 5
+        self.assertFalse(suppressor.should_send(bank_0))
+        self.assertTrue(suppressor.should_send(bank_0_on))
+        self.assertTrue(suppressor.should_send(bank_0))
+
+        # keepalive
+        clock.now = 14.4
+        self.assertFalse(suppressor.should_send(bank_0))
+        clock.now = 14.6
+        self.assertTrue(suppressor.should_send(bank_0))
+
+        # other destination, other entry
+        self.assertTrue(suppressor.should_send(dict(bank_0, dst=12)))
+
+        # not enabled PGNs are always sent
+        alert = {'pgn': 126983, 'Alert Type': 'Alarm', 'Alert State': 'Active'}
+        self.assertTrue(suppressor.should_send(alert))
+        self.assertTrue(suppressor.should_send(alert))
+
+        # dropped messages are sent again
+        suppressor.forget(bank_0)
+        self.assertTrue(suppressor.should_send(bank_0))
+
+        stats = suppressor.get_stats()
+        self.assertEqual(stats.suppressed, 3)
+        self.assertEqual(stats.sent, 9)
+        self.assertEqual(stats.cached, 3)
+
+        suppressor.clear()
+        self.assertTrue(suppressor.should_send(bank_0))
+
+
+    def test_disabled(self):
+        clock = FakeClock()
+        suppressor = ChangeSuppressor(clock)
+        suppressor.enable(126985, 0)
+
+        text = {'pgn': 126985, 'Alert Type': 'Alarm', 'Alert Text Description': 'Dragging'}
+        self.assertTrue(suppressor.should_send(text))
+        self.assertTrue(suppressor.should_send(text))
+
+        suppressor.enable(126985, 10)
+        self.assertTrue(suppressor.should_send(text))
+        self.assertFalse(suppressor.should_send(text))
+        self.assertTrue(suppressor.should_send(dict(text, **{'Alert Type': 'Warning'})))
+
+        # each PGN repeats at the interval of its sender
+        suppressor.enable(127501, 5)
+        bank = {'pgn': 127501, 'fields': {'Instance': 0, 'Indicator1': 'Off'}}
+        self.assertTrue(suppressor.should_send(bank))
+        clock.now = 5
+        self.assertTrue(suppressor.should_send(bank))
+        self.assertFalse(suppressor.should_send(dict(text, **{'Alert Type': 'Warning'})))
+
+        suppressor.enable(126985, 0)
+        self.assertTrue(suppressor.should_send(text))
+        self.assertEqual(suppressor.get_stats().cached, 1)
+
+    def test_template(self):
+        clock = FakeClock()
+        suppressor = ChangeSuppressor(clock)
+        suppressor.enable(126985, 10)
+        template = MessageTemplate('alert_text', {'pgn': 126985, 'Alert Type': 'Caution', 'Alert Text Description': ''})
+
+        self.assertTrue(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Dragging'}))
+        self.assertFalse(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Dragging'}))
+        self.assertTrue(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Drifting'}))
+
+        # the instance may be a variable field
+        self.assertTrue(suppressor.should_send_template(template, {'Alert Type': 'Warning', 'Alert Text Description': 'Drifting'}))
+        self.assertFalse(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Drifting'}))
+
+        suppressor.forget_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Drifting'})
+        self.assertTrue(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Drifting'}))
+
+        # keepalive
+        clock.now = 10
+        self.assertTrue(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Drifting'}))
+
+        # a template registered again is not compared with the old one
+        template = MessageTemplate('alert_text', {'pgn': 126985, 'Alert Type': 'Caution', 'Alert Text Description': '', 'Alert ID': 2})
+        self.assertTrue(suppressor.should_send_template(template, {'Alert Type': 'Alarm', 'Alert Text Description': 'Drifting'}))
+        self.assertEqual(suppressor.get_stats(), (6, 2, 2))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import unittest
+
+from bridge_stats import BridgeStats, LatencyHistogram, HistogramStats, handler_name
+from fake_clock import FakeClock
+
+
+class Connector(object):
+    def _on_message(self, message):
+        pass
+
+
+class TestBridgeStats(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.get_stats(), HistogramStats())
+
+        for i in range(95):
+            histogram.record(0.00003)
+        for i in range(5):
+            histogram.record(0.3)
+
+        stats = histogram.get_stats()
+        self.assertEqual(stats.count, 100)
+        self.assertAlmostEqual(stats.total, 1.50285)
+        self.assertAlmostEqual(stats.average, 0.0150285)
+        self.assertEqual(stats.p95, 5e-5)
+        self.assertEqual(stats.max, 0.3)
+
+        # p95 never above the max
+        histogram.reset()
+        histogram.record(0.0015)
+        self.assertEqual(histogram.get_stats().p95, 0.0015)
+
+
+    def test_snapshot(self):
+        clock = FakeClock()
+        stats = BridgeStats(clock)
+
+        handler = stats.handler_histogram(handler_name(Connector()._on_message))
+        self.assertIs(stats.handler_histogram('Connector._on_message'), handler)
+
+        for i in range(20):
+            stats.count_message(129029, 3)
+        stats.count_message(129029, 43)
+        handler.record(0.001)
+        stats.parse.record(0.0001)
+        stats.writes.record(0.002)
+        stats.nodejs = {'throttled': 4}
+
+        clock.now = 10
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot.duration, 10)
+        self.assertEqual(snapshot.rates, {(129029, 3): 2, (129029, 43): 0.1})
+        self.assertEqual(snapshot.handlers['Connector._on_message'].count, 1)
+        self.assertEqual(snapshot.parse.count, 1)
+        self.assertEqual(snapshot.writes.max, 0.002)
+        self.assertEqual(snapshot.nodejs, {'throttled': 4})
+
+        # next one starts from scratch
+        clock.now = 15
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot.duration, 5)
+        self.assertEqual(snapshot.rates, {})
+        self.assertEqual(snapshot.handlers['Connector._on_message'].count, 0)
+
+
+    def test_handler_name(self):
+        def on_message(message):
+            pass
+
+        self.assertEqual(handler_name(Connector()._on_message), 'Connector._on_message')
+        self.assertEqual(handler_name(on_message), 'TestBridgeStats.test_handler_name.<locals>.on_message')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import unittest
+
+from bridge_supervisor import RestartBackoff
+from fake_clock import FakeClock
+
+
+class TestRestartBackoff(unittest.TestCase):
+
+    def test_backoff(self):
+        backoff = RestartBackoff(max_attempts=8, initial_delay=0.25, max_delay=4, clock=FakeClock())
+
+        delays = [backoff.on_exit() for i in range(9)]
+        self.assertEqual(delays, [0, 0.25, 0.5, 1, 2, 4, 4, 4, None])
+        self.assertEqual(backoff.restarts, 8)
+
+
+    def test_stable_period_resets_attempts(self):
+        clock = FakeClock()
+        backoff = RestartBackoff(max_attempts=3, stable_period=60, clock=clock)
+
+        self.assertEqual(backoff.on_exit(), 0)
+        self.assertEqual(backoff.on_exit(), 0.25)
+
+        # ready but crashed again before being stable
+        backoff.on_ready()
+        clock.now = 59
+        backoff.check_stable()
+        self.assertEqual(backoff.on_exit(), 0.5)
+
+        backoff.on_ready()
+        clock.now = 200
+        backoff.check_stable()
+        self.assertEqual(backoff.attempts, 0)
+
+        # not ready, attempts kept
+        self.assertEqual(backoff.on_exit(), 0)
+        clock.now = 500
+        backoff.check_stable()
+        self.assertEqual(backoff.attempts, 1)
+        self.assertEqual(backoff.restarts, 4)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
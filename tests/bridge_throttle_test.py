@@ -0,0 +1,79 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import unittest
+
+from bridge_replay import VirtualClock
+from bridge_throttle import HandlerThrottle
+
+
+def message(src, value):
+    return {'pgn': 127245, 'src': src, 'dst': 255, 'fields': {'Position': value}}
+
+
+class TestHandlerThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.delivered = []
+        self.throttle = HandlerThrottle(1, lambda m: self.delivered.append((self.clock(), m['src'], m['fields']['Position'])), self.clock, self.clock)
+
+    def push(self, time, src, value):
+        self.clock.advance_to(time)
+        self.throttle.push(message(src, value))
+
+    def test_latest_at_window_end(self):
+        for i in range(8):
+            self.push(i / 4, 1, i)
+        self.clock.advance_to(10)
+
+        # first one right away, the most recent one when each window ends, nothing once messages stop
+        self.assertEqual(self.delivered, [(0, 1, 0), (1, 1, 3), (2, 1, 7)])
+        self.assertEqual(self.throttle.throttled, 5)
+
+    def test_per_source(self):
+        self.push(0, 1, 'a')
+        self.push(0.5, 2, 'b')
+        self.push(0.6, 1, 'c')
+        self.push(0.7, 2, 'd')
+        self.clock.advance_to(2)
+
+        self.assertEqual(self.delivered, [(0, 1, 'a'), (0.5, 2, 'b'), (1, 1, 'c'), (1.5, 2, 'd')])
+
+    def test_idle_source_right_away(self):
+        self.push(0, 1, 'a')
+        self.push(3.25, 1, 'b')
+        self.assertEqual(self.delivered, [(0, 1, 'a'), (3.25, 1, 'b')])
+
+    def test_cancel(self):
+        self.push(0, 1, 'a')
+        self.push(0.5, 1, 'b')
+        self.throttle.cancel()
+        self.clock.advance_to(5)
+
+        self.assertEqual(self.delivered, [(0, 1, 'a')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,6 +28,9 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../ext/velib_python/test'))
 
 from anchor_alarm_model import AnchorAlarmState
+from anchor_alarm_controller import TimerStats
+from bridge_stats import BridgeSnapshot, HistogramStats, CommandStats, ReadStats
+from bridge_scheduler import SuppressionStats
 
 import unittest
 from unittest.mock import ANY
@@ -49,6 +52,7 @@ from mock_settings_device import MockSettingsDevice
 from glib_timer_mock import GLibTimerMock
           
 from abstract_gps_provider import GPSPosition
+from abstract_gps_provider import GPSSnapshot
 
 class MockDBusConnector(DBusConnector):
     def _create_dbus_monitor(self, *args, **kwargs):
@@ -96,7 +100,8 @@ class TestDBusConnector(unittest.TestCase):
         controller.trigger_anchor_up    = MagicMock()
         controller.trigger_chain_out    = MagicMock()
         controller.trigger_mute_alarm   = MagicMock()
-        controller.get_gps_position = MagicMock(return_value=GPSPosition(10, 11))
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(10, 11)))
+        controller.get_timer_stats = MagicMock(return_value=TimerStats(10, 1.0004, 0.05, 1.5, 1))
 
         mock_bridge = MagicMock()
         mock_bridge.add_pgn_handler = MagicMock()
@@ -193,6 +198,12 @@ class TestDBusConnector(unittest.TestCase):
         self.assertEqual(service['/Anchor/Distance'], state2.params['current_radius'])
         self.assertEqual(service['/Anchor/Tolerance'], state2.params['radius_tolerance'])
 
+        self.assertEqual(service['/Diagnostics/Timer/Ticks'], 10)
+        self.assertEqual(service['/Diagnostics/Timer/LastInterval'], 1.0)
+        self.assertEqual(service['/Diagnostics/Timer/AverageDrift'], 0.05)
+        self.assertEqual(service['/Diagnostics/Timer/MaxDrift'], 1.5)
+        self.assertEqual(service['/Diagnostics/Timer/LateTicks'], 1)
+
         # make sure alarm feedback didnt change. TODO XXX maybe change that ?
         self.assertEqual(monitor.get_value('com.victronenergy.digitalinput.input01', '/CustomName'), state2.message)
         self.assertEqual(monitor.get_value('com.victronenergy.digitalinput.input01', '/ProductName'), state2.message)
@@ -255,6 +266,48 @@ class TestDBusConnector(unittest.TestCase):
         self.assertEqual(monitor.get_value("com.victronenergy.settings", '/Settings/DigitalInput/1/AlarmSetting'), False)
         self.assertEqual(monitor.get_value("com.victronenergy.settings", '/Settings/DigitalInput/1/InvertAlarm'), False)  
 
+    def test_bridge_diagnostics(self):
+        mock_bridge = MagicMock()
+        mock_bridge.get_bridge_stats = MagicMock(return_value=BridgeSnapshot(10, {(129029, 3): 1.0, (129026, 3): 4.0},
+                                                                           HistogramStats(50, 0.002, 0.00004, 0.00005, 0.0003),
+                                                                           {'NMEAGPSProvider._on_cog_sog': HistogramStats(40, 0.0005, 0.0000125, 0.00002, 0.0001)},
+                                                                           HistogramStats(2, 0.004, 0.002, 0.002, 0.0025),
+                                                                           HistogramStats(12, 0.0036, 0.0003, 0.0005, 0.0011),
+                                                                           {'received': 120, 'throttled': 70, 'unparsed': 1, 'backpressure': 0}))
+        mock_bridge.get_command_stats = MagicMock(return_value=CommandStats(sent=12, acked=10, dropped=1, queued=3, in_flight=2))
+        mock_bridge.get_suppression_stats = MagicMock(return_value=SuppressionStats(sent=12, suppressed=30))
+        mock_bridge.get_read_stats = MagicMock(return_value=ReadStats(max_messages=8, max_backlog=1200))
+        mock_bridge.get_restart_count = MagicMock(return_value=1)
+
+        connector = MockDBusConnector(lambda: timer_provider, lambda settings, cb: MockSettingsDevice(settings, cb), mock_bridge, create_mock_dbus_service())
+        service = connector.mock_service()
+
+        self.assertTrue(connector._write_bridge_diagnostics())
+
+        self.assertEqual(service['/Diagnostics/Bridge/MessagesPerSecond'], 5.0)
+        self.assertEqual(service['/Diagnostics/Bridge/Rates/129029/3'], 1.0)
+        self.assertEqual(service['/Diagnostics/Bridge/Rates/129026/3'], 4.0)
+        self.assertEqual(service['/Diagnostics/Bridge/Parse/Count'], 50)
+        self.assertEqual(service['/Diagnostics/Bridge/Parse/AverageTime'], 0.04)
+        self.assertEqual(service['/Diagnostics/Bridge/Handlers/NMEAGPSProvider__on_cog_sog/Calls'], 40)
+        self.assertEqual(service['/Diagnostics/Bridge/Handlers/NMEAGPSProvider__on_cog_sog/P95Time'], 0.02)
+        self.assertEqual(service['/Diagnostics/Bridge/Handlers/NMEAGPSProvider__on_cog_sog/Load'], 0.01)
+        self.assertEqual(service['/Diagnostics/Bridge/Commands/Queued'], 3)
+        self.assertEqual(service['/Diagnostics/Bridge/Commands/Suppressed'], 30)
+        self.assertEqual(service['/Diagnostics/Bridge/Commands/MaxLatency'], 2.5)
+        self.assertEqual(service['/Diagnostics/Bridge/Commands/AverageWriteDelay'], 0.3)
+        self.assertEqual(service['/Diagnostics/Bridge/Commands/MaxWriteDelay'], 1.1)
+        self.assertEqual(service['/Diagnostics/Bridge/Read/MaxBacklog'], 1200)
+        self.assertEqual(service['/Diagnostics/Bridge/NodeJS/Throttled'], 70)
+        self.assertEqual(service['/Diagnostics/Bridge/NodeJS/Restarts'], 1)
+
+        # a source that went quiet stays at 0
+        mock_bridge.get_bridge_stats.return_value = BridgeSnapshot(10, {(129026, 3): 4.0}, HistogramStats(), {}, HistogramStats(), HistogramStats(), {})
+        connector._write_bridge_diagnostics()
+        self.assertEqual(service['/Diagnostics/Bridge/Rates/129029/3'], 0)
+        self.assertEqual(service['/Diagnostics/Bridge/MessagesPerSecond'], 4.0)
+
+
     def test_reset_state(self):
         pass
 
@@ -267,7 +320,7 @@ class TestDBusConnector(unittest.TestCase):
         controller.trigger_anchor_up    = MagicMock()
         controller.trigger_chain_out    = MagicMock()
         controller.trigger_mute_alarm   = MagicMock()
-        controller.get_gps_position = MagicMock(return_value=GPSPosition(10, 11))
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(10, 11)))
 
 
         mock_bridge = MagicMock()
@@ -793,7 +846,7 @@ class TestDBusConnector(unittest.TestCase):
     def test_ais_vessel_integration(self):
         """Test AIS vessel tracking integration with DBus connector"""
         controller = MagicMock()
-        controller.get_gps_position = MagicMock(return_value=GPSPosition(14.0829979, -60.9595577))
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(14.0829979, -60.9595577)))
 
         mock_bridge = MagicMock()
         mock_bridge.add_pgn_handler = MagicMock()
@@ -840,10 +893,73 @@ class TestDBusConnector(unittest.TestCase):
         self.assertEqual(service[f'/Vessels/{mmsi}/SOG'], 5.2)
 
 
+    def test_vessel_distance_recomputed_on_tick(self):
+        """Test vessel distances follow own boat between AIS reports"""
+        controller = MagicMock()
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(14.0829979, -60.9595577)))
+
+        mock_bridge = MagicMock()
+        connector = MockDBusConnector(lambda: timer_provider, lambda settings, cb: MockSettingsDevice(settings, cb), mock_bridge, create_mock_dbus_service())
+        connector.set_controller(controller)
+        connector._settings['DistanceToVessel'] = 2000
+
+        service = connector.mock_service()
+        mmsi = "368081510"
+        connector._on_ais_message({"fields": {"User ID": 368081510, "Longitude": -60.9494, "Latitude": 14.0756, "COG": 0, "SOG": 0}})
+
+        from anchor_alarm_model import AnchorAlarmState
+        mock_state = AnchorAlarmState('IN_RADIUS', 'boat in radius', "short in radius message", 'info', False, {'drop_point': GPSPosition(10, 11), 'radius': 12, 'current_radius':5, 'radius_tolerance': 15, 'alarm_muted_count': 0, 'no_gps_count': 0, 'out_of_radius_count': 0})
+        connector.update_state(mock_state)
+        self.assertAlmostEqual(service[f'/Vessels/{mmsi}/Distance'], 1369, delta=1)
+        self.assertAlmostEqual(service[f'/Vessels/{mmsi}/Bearing'], 127, delta=1)
+        self.assertEqual(service['/Vessels/self/Distance'], 0)
+        self.assertEqual(service['/Vessels/self/Bearing'], "")
+
+        # own boat moves about 108m west of the vessel, without any new AIS report
+        controller.get_gps_snapshot.return_value = GPSSnapshot(GPSPosition(14.0756, -60.9504))
+        connector.update_state(mock_state)
+        self.assertAlmostEqual(service[f'/Vessels/{mmsi}/Distance'], 108, delta=1)
+        self.assertAlmostEqual(service[f'/Vessels/{mmsi}/Bearing'], 90, delta=0.1)
+
+        # and back, the vessel is now pruned with the current distance
+        connector._settings['DistanceToVessel'] = 1000
+        connector.update_state(mock_state)
+        self.assertIn(mmsi, connector._vessels)
+
+        controller.get_gps_snapshot.return_value = GPSSnapshot(GPSPosition(14.0829979, -60.9595577))
+        connector.update_state(mock_state)
+        self.assertNotIn(mmsi, connector._vessels)
+        self.assertFalse(f'/Vessels/{mmsi}/Distance' in service)
+
+
+    def test_vessel_index_follows_position_kept(self):
+        """Test a less precise report does not move the vessel in the index"""
+        controller = MagicMock()
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(14.0829979, -60.9595577)))
+
+        connector = MockDBusConnector(lambda: timer_provider, lambda settings, cb: MockSettingsDevice(settings, cb), MagicMock(), create_mock_dbus_service())
+        connector.set_controller(controller)
+        connector._settings['DistanceToVessel'] = 2000
+
+        mmsi = "368081510"
+        connector._on_ais_message({"fields": {"User ID": 368081510, "Longitude": -60.9494123, "Latitude": 14.0756123, "COG": 0, "SOG": 0}})
+        distance = connector._vessels[mmsi]['distance']
+
+        # about 110m away, ignored as less precise than the current position
+        connector._on_ais_message({"fields": {"User ID": 368081510, "Longitude": -60.9494, "Latitude": 14.0766, "COG": 0, "SOG": 1}})
+        vessel = connector._vessels[mmsi]
+        self.assertEqual((vessel['latitude'], vessel['longitude']), (14.0756123, -60.9494123))
+        self.assertEqual(vessel['sog'], 1)
+        self.assertAlmostEqual(vessel['distance'], distance, places=3)
+        self.assertAlmostEqual(connector._vessel_index.distance(mmsi), distance, places=3)
+        self.assertEqual(connector._vessel_index.nearest(14.0756123, -60.9494123)[0], mmsi)
+        self.assertEqual(connector._vessel_index.within(14.0766, -60.9494, 50), [])
+
+
     def test_vessel_dbus_path_management(self):
         """Test vessel DBus path creation and removal"""
         controller = MagicMock()
-        controller.get_gps_position = MagicMock(return_value=GPSPosition(14.0829979, -60.9595577))
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(14.0829979, -60.9595577)))
 
         mock_bridge = MagicMock()
         mock_bridge.add_pgn_handler = MagicMock()
@@ -865,7 +981,9 @@ class TestDBusConnector(unittest.TestCase):
             f'/Vessels/{mmsi}/SOG',
             f'/Vessels/{mmsi}/COG',
             f'/Vessels/{mmsi}/Heading',
-            f'/Vessels/{mmsi}/Tracks'
+            f'/Vessels/{mmsi}/Tracks',
+            f'/Vessels/{mmsi}/Distance',
+            f'/Vessels/{mmsi}/Bearing'
         ]
         
         for path in expected_paths:
@@ -882,7 +1000,7 @@ class TestDBusConnector(unittest.TestCase):
     def test_vessel_pruning_timer_integration(self):
         """Test vessel pruning integration with timer system"""
         controller = MagicMock()
-        controller.get_gps_position = MagicMock(return_value=GPSPosition(14.0829979, -60.9595577))
+        controller.get_gps_snapshot = MagicMock(return_value=GPSSnapshot(GPSPosition(14.0829979, -60.9595577)))
 
         mock_bridge = MagicMock()
         mock_bridge.add_pgn_handler = MagicMock()
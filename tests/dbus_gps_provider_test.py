@@ -89,14 +89,21 @@ class TestDBusGPSProvider(unittest.TestCase):
         monitor.set_value('com.victronenergy.gps.qwe1', '/Fix', 1)
     
         self.assertEqual(provider.get_gps_position(), GPSPosition(1, 1))
+        fix_id = provider.get_fix_id()
+        provider.get_gps_position()
+        self.assertEqual(provider.get_fix_id(), fix_id)
 
         monitor.set_value('com.victronenergy.gps.qwe1', '/Position/Latitude', 2)
         monitor.set_value('com.victronenergy.gps.qwe1', '/Position/Longitude', 2)
 
         self.assertEqual(provider.get_gps_position(), GPSPosition(2, 2))
+        self.assertNotEqual(provider.get_fix_id(), fix_id)
 
+        # the lost fix is pushed right away
+        provider.on_gps_position = MagicMock()
         monitor.set_value('com.victronenergy.gps.qwe1', '/Fix', 0)
         self.assertIsNone(provider.get_gps_position())
+        provider.on_gps_position.assert_called_once_with(provider, None)
 
         monitor.set_value('com.victronenergy.gps.qwe1', '/Fix', 1)
         self.assertEqual(provider.get_gps_position(), GPSPosition(2, 2))
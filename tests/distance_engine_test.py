@@ -0,0 +1,130 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+sys.path.insert(1, os.path.join(sys.path[0], '../gps_providers'))
+
+import random
+import unittest
+
+from geopy.distance import geodesic
+
+from distance_engine import DistanceEngine, LocalTangentPlane, INVALID_DISTANCE
+from abstract_gps_provider import GPSPosition
+
+
+class TestDistanceEngine(unittest.TestCase):
+
+    def test_planar_error_bounded_against_geodesic(self):
+        # property test : for random drop points and random positions up to 2km away, the planar
+        # distance must stay within 1cm of the geodesic one
+        rnd = random.Random(42)
+
+        for i in range(2000):
+            origin = GPSPosition(rnd.uniform(-75, 75), rnd.uniform(-180, 180))
+            plane = LocalTangentPlane(origin)
+
+            expected = rnd.uniform(0, 2000)
+            destination = geodesic(meters=expected).destination((origin.latitude, origin.longitude), rnd.uniform(0, 360))
+
+            distance = plane.distance(destination.latitude, destination.longitude)
+            self.assertAlmostEqual(distance, expected, delta=0.01, msg="origin "+ str(origin))
+
+
+    def test_from_xy(self):
+        rnd = random.Random(42)
+
+        for i in range(1000):
+            origin = GPSPosition(rnd.uniform(-75, 75), rnd.uniform(-180, 180))
+            plane = LocalTangentPlane(origin)
+
+            east, north = rnd.uniform(-2000, 2000), rnd.uniform(-2000, 2000)
+            latitude, longitude = plane.from_xy(east, north)
+            round_trip = plane.to_xy(latitude, longitude)
+            self.assertAlmostEqual(round_trip[0], east, delta=0.001)
+            self.assertAlmostEqual(round_trip[1], north, delta=0.001)
+
+
+    def test_antimeridian(self):
+        origin = GPSPosition(-17.0, 179.9995)
+        position = GPSPosition(-17.0, -179.9995)
+
+        expected = geodesic((origin.latitude, origin.longitude), (position.latitude, position.longitude)).meters
+        self.assertAlmostEqual(LocalTangentPlane(origin).distance(position.latitude, position.longitude), expected, delta=0.01)
+
+
+    def test_geodesic_fallback_near_boundary(self):
+        origin = GPSPosition(18.5060715, -64.3725071)
+        engine = DistanceEngine(geodesic_band=5)
+
+        position_far = GPSPosition(18.507111, -64.372955)  # ~124m
+        position_near = GPSPosition(18.506111, -64.372855)  # ~37m
+
+        # far from boundary, planar
+        engine.distance(origin, position_far, 40)
+        self.assertEqual(engine.planar_count, 1)
+        self.assertEqual(engine.geodesic_count, 0)
+
+        # within band, geodesic
+        distance = engine.distance(origin, position_near, 40)
+        self.assertEqual(engine.planar_count, 1)
+        self.assertEqual(engine.geodesic_count, 1)
+        self.assertEqual(distance, geodesic((origin.latitude, origin.longitude), (position_near.latitude, position_near.longitude)).meters)
+
+        # no boundary, always planar
+        engine.distance(origin, position_near)
+        self.assertEqual(engine.planar_count, 2)
+
+        # band of 0 only falls back on exact boundary
+        engine.geodesic_band = 0
+        engine.distance(origin, position_near, 40)
+        self.assertEqual(engine.planar_count, 3)
+
+
+    def test_origin_change(self):
+        engine = DistanceEngine()
+
+        self.assertAlmostEqual(engine.distance(GPSPosition(10, 10), GPSPosition(10, 10.001)), 109.6, delta=0.1)
+        self.assertAlmostEqual(engine.distance(GPSPosition(60, 10), GPSPosition(60, 10.001)), 55.8, delta=0.1)
+
+        engine.set_origin(None)
+        self.assertAlmostEqual(engine.distance(GPSPosition(60, 10), GPSPosition(60, 10.001)), 55.8, delta=0.1)
+
+
+    def test_invalid_coordinates(self):
+        engine = DistanceEngine()
+        origin = GPSPosition(18.5060715, -64.3725071)
+
+        self.assertEqual(engine.distance(origin, GPSPosition(-160, 10)), INVALID_DISTANCE)
+        self.assertEqual(engine.distance(origin, GPSPosition("qwe", 10)), INVALID_DISTANCE)
+        self.assertEqual(engine.distance(origin, GPSPosition(10, 200)), INVALID_DISTANCE)
+
+        # string coordinates are accepted
+        self.assertAlmostEqual(engine.distance(origin, GPSPosition("18.506111", "-64.372855")), 37, delta=1)
+
+        # invalid origin falls back on geodesic
+        self.assertEqual(engine.distance(GPSPosition(-160, 10), origin), INVALID_DISTANCE)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
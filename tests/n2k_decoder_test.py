@@ -0,0 +1,153 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import unittest
+
+from n2k_decoder import N2KDecoder, FastPacketAssembler, decode_can_id, parse_candump_line, read_candump
+
+
+CANDUMP_PATH = os.path.join(os.path.dirname(__file__), 'data', 'anchorage.candump')
+
+
+class TestN2KDecoder(unittest.TestCase):
+
+    def _decode_candump(self, decoder):
+        with open(CANDUMP_PATH) as candump:
+            messages = [decoder.decode_frame(can_id, data) for timestamp, can_id, data in read_candump(candump)]
+
+        return [message for message in messages if message is not None]
+
+
+    def test_can_id(self):
+        # PDU2, broadcast
+        self.assertEqual(decode_can_id(233967171), (3, 127502, 67, 255))
+
+        # PDU1, the destination is not part of the PGN
+        self.assertEqual(decode_can_id((3 << 26) | (0x1ED43 << 8) | 66), (3, 126208, 66, 67))
+
+
+    def test_candump_formats(self):
+        self.assertEqual(parse_candump_line("(1750000000.012300) can0 0DF20E43#00FFFF3FFFFFFFFF"),
+                         (1750000000.0123, 233967171, bytes.fromhex("00FFFF3FFFFFFFFF")))
+        self.assertEqual(parse_candump_line("  can0  0DF20E43   [8]  00 FF FF 3F FF FF FF FF"),
+                         (None, 233967171, bytes.fromhex("00FFFF3FFFFFFFFF")))
+        self.assertEqual(parse_candump_line(" (1750000000.012300)  vecan0  0DF20E43   [2]  00 FF"),
+                         (1750000000.0123, 233967171, bytes.fromhex("00FF")))
+        self.assertIsNone(parse_candump_line("# comment"))
+        self.assertIsNone(parse_candump_line(""))
+
+
+    def test_recorded_candump(self):
+        decoder = N2KDecoder()
+        messages = self._decode_candump(decoder)
+
+        self.assertEqual([(message['pgn'], message['src']) for message in messages], [
+            (129029, 3), (129026, 3), (129029, 3), (129029, 43), (127250, 5), (128267, 12), (130306, 12),
+            (127488, 58), (129039, 43), (129810, 43), (127502, 67), (126984, 7), (126998, 67)])
+
+        # the last 129029 lost a frame
+        self.assertEqual(decoder.get_dropped_packets(), 1)
+
+        by_pgn = {(message['pgn'], message['src']): message for message in messages}
+
+        gnss = by_pgn[(129029, 3)]
+        self.assertEqual((gnss['prio'], gnss['dst'], gnss['description']), (3, 255, 'GNSS Position Data'))
+        self.assertAlmostEqual(gnss['fields']['Latitude'], 14.0847990020335, places=12)
+        self.assertAlmostEqual(gnss['fields']['Longitude'], -60.960235248733, places=12)
+        self.assertEqual(gnss['fields']['Method'], 'GNSS fix')
+        self.assertEqual(gnss['fields']['GNSS type'], 'GPS+SBAS/WAAS+GLONASS')
+        self.assertEqual(gnss['fields']['Number of SVs'], 12)
+        self.assertEqual(gnss['fields']['HDOP'], 0.51)
+        self.assertEqual(gnss['fields']['PDOP'], 1.08)
+
+        # interleaved with the first source, HDOP and PDOP not available
+        gnss = by_pgn[(129029, 43)]
+        self.assertEqual(gnss['fields']['Method'], 'DGNSS fix')
+        self.assertNotIn('HDOP', gnss['fields'])
+        self.assertNotIn('PDOP', gnss['fields'])
+        self.assertNotIn('Altitude', gnss['fields'])
+
+        self.assertEqual(by_pgn[(129026, 3)]['fields'], {'SID': 167, 'COG Reference': 'True', 'COG': 0.2787, 'SOG': 0.07})
+        self.assertEqual(by_pgn[(127250, 5)]['fields'], {'SID': 1, 'Heading': 3.1416, 'Reference': 'Magnetic'})
+        self.assertEqual(by_pgn[(128267, 12)]['fields'], {'SID': 1, 'Depth': 4.52, 'Offset': 0.3})
+        self.assertEqual(by_pgn[(130306, 12)]['fields'], {'SID': 1, 'Wind Speed': 7.5, 'Wind Angle': 0.7854, 'Reference': 'Apparent'})
+        self.assertEqual(by_pgn[(127488, 58)]['fields'], {'Instance': 'Dual Engine Starboard', 'Speed': 1800, 'Boost Pressure': 0})
+
+        ais = by_pgn[(129039, 43)]['fields']
+        self.assertEqual((ais['User ID'], ais['Longitude'], ais['Latitude'], ais['COG'], ais['SOG']), (316001234, -60.9605, 14.0852, 2.1, 0.05))
+        self.assertEqual(ais['Message ID'], 'Standard Class B position report')
+        self.assertNotIn('Heading', ais)
+
+        static = by_pgn[(129810, 43)]['fields']
+        self.assertEqual((static['User ID'], static['Length'], static['Beam']), (316001234, 12.0, 4.2))
+
+        # same as what canboatjs gave for that frame
+        self.assertEqual(by_pgn[(127502, 67)]['fields'], {'Instance': 0, 'Switch12': 'Off'})
+
+        alert = by_pgn[(126984, 7)]['fields']
+        self.assertEqual((alert['Alert Type'], alert['Alert ID'], alert['Data Source Network ID NAME'], alert['Response Command']),
+                         ('Emergency Alarm', 54321, 54321, 'Acknowledge'))
+
+        self.assertEqual(by_pgn[(126998, 67)]['fields'], {'Installation Description #2': 'YD:LED 0 DONE', 'Manufacturer Information': 'Yacht Devices Ltd., www.yachtd.com'})
+
+
+    def test_wanted_pgns(self):
+        decoder = N2KDecoder([127502, 129029, 60928])
+        self.assertEqual(decoder.pgns, {127502, 129029})
+
+        messages = self._decode_candump(decoder)
+        self.assertEqual([message['pgn'] for message in messages], [129029, 129029, 129029, 127502])
+
+
+    def test_fast_packet(self):
+        assembler = FastPacketAssembler()
+        payload = bytes(range(20))
+
+        # first frame : sequence 1, frame 0, length, 6 bytes. Then 7 bytes per frame
+        frames = [bytes([0x20, 20]) + payload[:6], bytes([0x21]) + payload[6:13], bytes([0x22]) + payload[13:20]]
+
+        self.assertIsNone(assembler.feed(129039, 43, frames[0]))
+        self.assertIsNone(assembler.feed(129039, 43, frames[1]))
+        self.assertEqual(assembler.feed(129039, 43, frames[2]), payload)
+
+        # frames of another sequence, or a repeated frame, drop the packet
+        self.assertIsNone(assembler.feed(129039, 43, frames[0]))
+        self.assertIsNone(assembler.feed(129039, 43, bytes([0x41]) + payload[6:13]))
+        self.assertIsNone(assembler.feed(129039, 43, frames[2]))
+        self.assertEqual(assembler.dropped_packets, 1)
+
+        # a new first frame restarts the packet
+        self.assertIsNone(assembler.feed(129039, 43, frames[0]))
+        self.assertIsNone(assembler.feed(129039, 43, frames[0]))
+        self.assertEqual(assembler.dropped_packets, 2)
+        self.assertIsNone(assembler.feed(129039, 43, frames[1]))
+        self.assertEqual(assembler.feed(129039, 43, frames[2]), payload)
+
+        # a frame without its first one is ignored
+        self.assertIsNone(assembler.feed(129039, 43, frames[1]))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,6 +35,7 @@ from unittest.mock import call
 
 from mock_settings_device import MockSettingsDevice
 from glib_timer_mock import GLibTimerMock
+from nmea_bridge_mock import create_nmea_bridge_mock
 
 sys.path.insert(1, os.path.join(sys.path[0], '../gps_providers'))
 from abstract_gps_provider import GPSPosition
@@ -60,7 +61,7 @@ class TestNMEAAISAnchorConnector(unittest.TestCase):
 
 
     def test_nmea_messages(self):
-        mock_bridge = MagicMock()
+        mock_bridge = create_nmea_bridge_mock()
         mock_bridge.add_pgn_handler = MagicMock()
         mock_bridge.send_nmea = MagicMock()
 
@@ -230,7 +231,7 @@ class TestNMEAAISAnchorConnector(unittest.TestCase):
 
 
     def test_anchor_name(self):
-        mock_bridge = MagicMock()
+        mock_bridge = create_nmea_bridge_mock()
         mock_bridge.add_pgn_handler = MagicMock()
         mock_bridge.send_nmea = MagicMock()
 
@@ -296,7 +297,7 @@ class TestNMEAAISAnchorConnector(unittest.TestCase):
             nonlocal handler
             handler = the_handler
 
-        mock_bridge = MagicMock()
+        mock_bridge = create_nmea_bridge_mock()
         mock_bridge.add_pgn_handler = MagicMock(side_effect=_set_handler)
         mock_bridge.send_nmea = MagicMock()
 
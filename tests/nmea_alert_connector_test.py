@@ -35,6 +35,7 @@ from unittest.mock import call
 
 from mock_settings_device import MockSettingsDevice
 from glib_timer_mock import GLibTimerMock
+from nmea_bridge_mock import create_nmea_bridge_mock
 
 from abstract_gps_provider import GPSPosition
 
@@ -59,13 +60,14 @@ class TestNMEAAlertConnector(unittest.TestCase):
 
 
     def test_nmea_messages(self):
-        mock_bridge = MagicMock()
+        mock_bridge = create_nmea_bridge_mock()
         mock_bridge.add_pgn_handler = MagicMock()
         mock_bridge.send_nmea = MagicMock()
 
 
         connector = NMEAAlertConnector(lambda: timer_provider, MockSettingsDevice,  mock_bridge)
         connector._settings['AutoAcknowledgeInterval'] = 3
+        mock_bridge.enable_change_suppression.assert_called_with(126985, 10)
 
         controller = MagicMock()
         controller.trigger_mute_alarm   = MagicMock()
@@ -442,7 +444,7 @@ class TestNMEAAlertConnector(unittest.TestCase):
                 ])
         
     def test_show_message(self):
-        mock_bridge = MagicMock()
+        mock_bridge = create_nmea_bridge_mock()
         mock_bridge.add_pgn_handler = MagicMock()
         mock_bridge.send_nmea = MagicMock()
 
@@ -549,7 +551,7 @@ class TestNMEAAlertConnector(unittest.TestCase):
             nonlocal handler
             handler = the_handler
 
-        mock_bridge = MagicMock()
+        mock_bridge = create_nmea_bridge_mock()
         mock_bridge.add_pgn_handler = MagicMock(side_effect=_set_handler)
         mock_bridge.send_nmea = MagicMock()
 
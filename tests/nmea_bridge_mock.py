@@ -0,0 +1,43 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
+
+from unittest.mock import MagicMock
+
+from bridge_scheduler import merge_template
+
+
+def create_nmea_bridge_mock():
+    """MagicMock bridge sending templates through send_nmea, so tests can check the complete messages"""
+    bridge = MagicMock()
+    templates = {}
+
+    def register_template(name, nmea_message):
+        templates[name] = nmea_message
+
+    def send_template(name, fields=None, priority=None):
+        bridge.send_nmea(merge_template(templates[name], fields))
+
+    bridge.register_template = MagicMock(side_effect=register_template)
+    bridge.send_template = MagicMock(side_effect=send_template)
+    return bridge
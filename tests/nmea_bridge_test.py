@@ -0,0 +1,768 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import errno
+import json
+import unittest
+from unittest.mock import Mock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from utils import exit_on_error
+from fake_clock import FakeClock
+
+
+class GLibMock(object):
+    """Records GLib sources instead of running a main loop, tests dispatch them explicitly.
+    Functions wrapped with exit_on_error are called directly so exceptions fail the test"""
+    PRIORITY_DEFAULT = 0
+    IO_IN = 1
+    IO_OUT = 4
+    IO_ERR = 8
+    IO_HUP = 16
+
+    def __init__(self):
+        self.sources = {}
+        self._next_id = 0
+
+        # FakeClock timeouts are due with, see run_timers
+        self.clock = None
+
+    def _add(self, kind, callback, args, interval=None, source=None):
+        if callback is exit_on_error:
+            callback, args = args[0], args[1:]
+
+        self._next_id += 1
+        added = self.clock() if self.clock is not None else 0
+        self.sources[self._next_id] = {'kind': kind, 'callback': callback, 'args': args, 'interval': interval, 'source': source, 'added': added}
+        return self._next_id
+
+    def timeout_add(self, interval, callback, *args):
+        return self._add('timeout', callback, args, interval)
+
+    def timeout_add_seconds(self, interval, callback, *args):
+        return self._add('timeout', callback, args, interval * 1000)
+
+    def idle_add(self, callback, *args):
+        return self._add('idle', callback, args)
+
+    def io_add_watch(self, source, condition, callback, *args):
+        return self._add('io', callback, args, source=source)
+
+    def source_remove(self, source_id):
+        if source_id not in self.sources:
+            raise ValueError("Invalid source id "+ str(source_id))
+        del self.sources[source_id]
+
+    def find(self, kind, callback=None):
+        return [source_id for source_id, source in self.sources.items()
+                if source['kind'] == kind and (callback is None or source['callback'] == callback)]
+
+    def run_timers(self, until, callbacks=None):
+        """Calls the matching timeouts due until then in order, moving the clock to each due time"""
+        while True:
+            due = [(source['added'] + source['interval'] / 1000, source_id) for source_id, source in self.sources.items()
+                   if source['kind'] == 'timeout' and (callbacks is None or source['callback'] in callbacks)]
+            due = [(time, source_id) for time, source_id in due if time <= until]
+            if len(due) == 0:
+                break
+
+            time, source_id = min(due)
+            source = self.sources[source_id]
+            self.clock.now = max(self.clock.now, time)
+            if source['callback'](*source['args']):
+                source['added'] = time
+            else:
+                self.sources.pop(source_id, None)
+
+        self.clock.now = max(self.clock.now, until)
+
+    def dispatch(self, kind, callback=None, *args):
+        """Calls the matching sources once, removing the ones returning False. Returns how many were called"""
+        source_ids = self.find(kind, callback)
+        for source_id in source_ids:
+            source = self.sources[source_id]
+            if not source['callback'](*(args + source['args'])):
+                self.sources.pop(source_id, None)
+        return len(source_ids)
+
+
+glib = GLibMock()
+sys.modules['gi'] = Mock()
+sys.modules['gi.repository'] = Mock(GLib=glib)
+
+import nmea_bridge
+from nmea_bridge import NMEABridge
+from bridge_scheduler import PRIORITY_CONTROL, PRIORITY_ALARM, PRIORITY_AIS
+
+
+class FakeNodeProcess(object):
+    """Popen replacement with real pipes, the test plays nmea_bridge.js on the other end"""
+
+    def __init__(self, *args, **kwargs):
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+
+        self.stdin = open(stdin_write, 'w')
+        self.stdout = open(stdout_read, 'r')
+        self.stderr = open(stderr_read, 'r')
+
+        os.set_blocking(stdin_read, False)
+        self._child_stdin = stdin_read
+        self._child_stdout = stdout_write
+        self._child_stderr = stderr_write
+        self._child_read = b""
+
+        self.pid = 4242
+        self.returncode = None
+        self.killed = False
+        self.terminated = False
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        raise AssertionError("the main loop must never wait for the child")
+
+    def kill(self):
+        self.killed = True
+
+    def terminate(self):
+        self.terminated = True
+
+    def send(self, *events):
+        """Writes events on the child stdout"""
+        self.write("".join(json.dumps(event) + "\n" for event in events).encode('utf-8'))
+
+    def write(self, data):
+        os.write(self._child_stdout, data)
+
+    def commands(self):
+        """Commands written by the bridge since the last call, an incomplete line is kept for the next call"""
+        while True:
+            try:
+                chunk = os.read(self._child_stdin, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            self._child_read += chunk
+
+        lines = self._child_read.split(b"\n")
+        self._child_read = lines.pop()
+        return [json.loads(line) for line in lines]
+
+    def close_stdout(self):
+        os.close(self._child_stdout)
+        self._child_stdout = None
+
+    def close(self):
+        for stream in (self.stdin, self.stdout, self.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        for fd in (self._child_stdin, self._child_stdout, self._child_stderr):
+            if fd is not None:
+                os.close(fd)
+
+
+class FakeCanSocket(object):
+    def __init__(self):
+        self.error = None
+        self.closed = False
+
+    def recv(self, size):
+        if self.error is not None:
+            raise self.error
+        raise BlockingIOError()
+
+    def close(self):
+        self.closed = True
+
+
+class TestNMEABridge(unittest.TestCase):
+
+    def setUp(self):
+        glib.sources.clear()
+        self.processes = []
+
+        def _popen(*args, **kwargs):
+            process = FakeNodeProcess()
+            self.processes.append(process)
+            return process
+
+        popen_patcher = patch('nmea_bridge.Popen', side_effect=_popen)
+        popen_patcher.start()
+        self.addCleanup(popen_patcher.stop)
+
+        self.clock = FakeClock()
+        clock_patcher = patch('time.monotonic', self.clock)
+        clock_patcher.start()
+        self.addCleanup(clock_patcher.stop)
+        glib.clock = self.clock
+
+    def tearDown(self):
+        for process in self.processes:
+            process.close()
+
+    def create_bridge(self, **kwargs):
+        bridge = NMEABridge("can0", **kwargs)
+        bridge.error_handler = MagicMock()
+        return bridge
+
+    def read(self, bridge, process):
+        """Dispatches what the child wrote"""
+        bridge._on_stdout_data(process.stdout, glib.IO_IN)
+
+    def start(self, bridge, process):
+        """Plays the initCAN and ready handshake, returns the commands written until then"""
+        commands = process.commands()
+        init_can = [command for command in commands if command['command'] == 'initCAN'][0]
+        process.send({"event": "on_initCAN", "id": init_can["id"], "canId": "can0"}, {"event": "on_bridge_ready", "address": 12})
+        self.read(bridge, process)
+        return commands + process.commands()
+
+    def sent(self, commands, name="sendPGN"):
+        return [command for command in commands if command['command'] == name]
+
+    def ack(self, bridge, process, commands):
+        process.send(*[{"event": "on_"+ command["command"], "id": command["id"]} for command in commands])
+        self.read(bridge, process)
+
+    def receive(self, bridge, process, pgn, src, fields=None):
+        process.send({"event": "on_NMEA_message", "message": {"pgn": pgn, "src": src, "dst": 255, "prio": 2, "fields": fields or {}}})
+        self.read(bridge, process)
+
+    def test_native_decoding_socket_error(self):
+        can_socket = FakeCanSocket()
+        with patch('nmea_bridge.open_socketcan', return_value=can_socket):
+            bridge = self.create_bridge(native_decoding=True)
+
+        process = self.processes[0]
+        handler = MagicMock()
+        bridge.add_pgn_handler(129029, handler, throttle=True)
+        bridge.add_pgn_handler(127245, handler)
+        glib.dispatch('idle')
+        self.start(bridge, process)
+
+        # 129029 is decoded here, only the other one is asked to nmea_bridge.js
+        self.assertEqual(list(bridge._sent_filters), [127245])
+        self.assertEqual(glib.dispatch('io', bridge._on_can_data, can_socket, glib.IO_IN), 1)
+        self.assertEqual(len(glib.find('io', bridge._on_can_data)), 1)
+
+        # can0 goes down, nmea_bridge.js decodes everything again
+        can_socket.error = OSError(errno.ENETDOWN, "Network is down")
+        with self.assertLogs('nmea_bridge', 'ERROR'):
+            glib.dispatch('io', bridge._on_can_data, can_socket, glib.IO_IN)
+        self.assertEqual(glib.find('io', bridge._on_can_data), [])
+        self.assertTrue(can_socket.closed)
+        self.assertIsNone(bridge._native_decoder)
+
+        filters = self.sent(process.commands(), 'filterPGN')
+        self.assertEqual(len(filters), 1)
+        self.assertEqual(sorted(pgn_filter['pgn'] for pgn_filter in filters[0]['filter']), [127245, 129029])
+        self.assertEqual(bridge._throttle_intervals[129029], 1)
+
+    def test_restart_after_exit(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        process.returncode = 1
+        process.close_stdout()
+        glib.dispatch('io', bridge._on_stdout_data, process.stdout, glib.IO_IN | glib.IO_HUP)
+
+        self.assertFalse(process.killed)
+        self.assertFalse(bridge._ready)
+        self.assertEqual(glib.find('io', bridge._on_stdout_data), [])
+        self.assertEqual(glib.dispatch('timeout', bridge._start_nodejs_process), 1)
+        self.assertEqual(len(self.processes), 2)
+        self.assertEqual(bridge.get_restart_count(), 1)
+
+    def test_restart_after_stdout_closed(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        # still running without its stdout, killed without waiting for it
+        process.close_stdout()
+        glib.dispatch('io', bridge._on_stdout_data, process.stdout, glib.IO_HUP)
+        self.assertTrue(process.killed)
+        self.assertIsNone(bridge._nodejs_process)
+        self.assertEqual(glib.find('timeout', bridge._start_nodejs_process), [])
+
+        # restarted once collected
+        glib.dispatch('timeout', bridge._on_process_killed)
+        self.assertEqual(glib.find('timeout', bridge._start_nodejs_process), [])
+
+        process.returncode = -9
+        glib.dispatch('timeout', bridge._on_process_killed)
+        self.assertEqual(glib.find('timeout', bridge._on_process_killed), [])
+        glib.dispatch('timeout', bridge._start_nodejs_process)
+        self.assertEqual(len(self.processes), 2)
+
+        self.start(bridge, self.processes[1])
+        self.assertTrue(bridge._ready)
+        bridge.error_handler.assert_not_called()
+
+    def test_give_up_after_restarts(self):
+        bridge = self.create_bridge(max_restart_attempts=2)
+        for i in range(3):
+            process = self.processes[-1]
+            process.returncode = 1
+            process.close_stdout()
+            glib.dispatch('io', bridge._on_stdout_data, process.stdout, glib.IO_HUP)
+            glib.dispatch('timeout', bridge._start_nodejs_process)
+
+        self.assertEqual(len(self.processes), 3)
+        bridge.error_handler.assert_called_once_with("Unable to start NMEA bridge")
+
+
+    def test_commands_queued_until_ready(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 1}}, priority=PRIORITY_AIS)
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 2}}, priority=PRIORITY_ALARM)
+
+        # only initCAN is written before the bridge is ready
+        stats = bridge.get_command_stats()
+        self.assertEqual(stats.sent, 1)
+        self.assertEqual(stats.queued, 2)
+
+        commands = self.start(bridge, process)
+        self.assertEqual([command['message']['fields']['Position'] for command in self.sent(commands)], [2, 1])
+        self.assertEqual(bridge.get_command_stats().queued, 0)
+
+    def test_queue_full(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        with self.assertLogs('nmea_bridge', 'WARNING') as logs:
+            for i in range(nmea_bridge._MAX_QUEUED_COMMANDS + 10):
+                bridge.send_nmea({'pgn': 129038, 'fields': {'User ID': i}}, priority=PRIORITY_AIS)
+
+            # least important commands make room for more important ones
+            bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 1}}, priority=PRIORITY_ALARM)
+        self.assertEqual(len(logs.output), 11)
+
+        stats = bridge.get_command_stats()
+        self.assertEqual(stats.queued, nmea_bridge._MAX_QUEUED_COMMANDS)
+        self.assertEqual(stats.dropped, 11)
+
+        commands = self.sent(self.start(bridge, process))
+        self.assertEqual(commands[0]['message']['pgn'], 127245)
+        self.assertEqual(commands[1]['message']['fields']['User ID'], 11)
+
+    def test_ack(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 1}}, priority=PRIORITY_CONTROL)
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 2}}, priority=PRIORITY_CONTROL)
+        commands = self.sent(process.commands())
+        self.assertEqual(len(commands), 2)
+        self.assertEqual(bridge.get_command_stats().in_flight, 2)
+
+        self.ack(bridge, process, commands[:1])
+        stats = bridge.get_command_stats()
+        self.assertEqual(stats.in_flight, 1)
+        self.assertEqual(stats.acked, 2) # initCAN, then the first message
+        self.assertIn(commands[1]['id'], bridge._in_flight)
+
+        # unknown or repeated ids are ignored
+        self.ack(bridge, process, commands[:1] + [{'command': 'sendPGN', 'id': 'unknown'}])
+        self.assertEqual(bridge.get_command_stats().acked, 2)
+
+    def test_ack_timeout(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        for i in range(nmea_bridge._MAX_ACK_TIMEOUTS - 1):
+            bridge.send_nmea({'pgn': 127245, 'fields': {'Position': i}}, priority=PRIORITY_CONTROL)
+        commands = self.sent(process.commands())
+
+        self.clock.now = nmea_bridge._ACK_TIMEOUT - 0.1
+        glib.dispatch('timeout', bridge._check_pipeline)
+        self.assertEqual(bridge.get_command_stats().timeouts, 0)
+
+        self.clock.now = nmea_bridge._ACK_TIMEOUT
+        with self.assertLogs('nmea_bridge', 'WARNING'):
+            glib.dispatch('timeout', bridge._check_pipeline)
+        stats = bridge.get_command_stats()
+        self.assertEqual(stats.timeouts, nmea_bridge._MAX_ACK_TIMEOUTS - 1)
+        self.assertEqual(stats.in_flight, 0)
+        self.assertFalse(process.killed)
+
+        # an answer resets the count of lost commands in a row
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 10}}, priority=PRIORITY_CONTROL)
+        self.ack(bridge, process, self.sent(process.commands()))
+        self.assertEqual(bridge._consecutive_timeouts, 0)
+
+        for i in range(nmea_bridge._MAX_ACK_TIMEOUTS):
+            bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 20 + i}}, priority=PRIORITY_CONTROL)
+        self.clock.now += nmea_bridge._ACK_TIMEOUT
+        with self.assertLogs('nmea_bridge', 'WARNING') as logs:
+            glib.dispatch('timeout', bridge._check_pipeline)
+        self.assertIn("killing it", logs.output[-1])
+        self.assertTrue(process.killed)
+
+        # the answer came too late
+        self.ack(bridge, process, commands)
+        self.assertEqual(bridge.get_command_stats().acked, 2)
+
+    def test_wedged_child(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        # larger than the pipe, the child never reads it
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Text': 'x' * 4 * nmea_bridge._MAX_WRITE_BUFFER}}, priority=PRIORITY_CONTROL)
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 1}}, priority=PRIORITY_CONTROL)
+        stats = bridge.get_command_stats()
+        self.assertGreater(stats.write_buffer, nmea_bridge._MAX_WRITE_BUFFER)
+        self.assertEqual(stats.queued, 1)
+        self.assertEqual(len(glib.find('io', bridge._on_stdin_writable)), 1)
+
+        # a single command lost, only the write buffer tells the child is wedged
+        self.clock.now = nmea_bridge._WEDGED_TIMEOUT - 1
+        with self.assertLogs('nmea_bridge', 'WARNING'):
+            glib.dispatch('timeout', bridge._check_pipeline)
+        self.assertFalse(process.killed)
+
+        self.clock.now = nmea_bridge._WEDGED_TIMEOUT
+        with self.assertLogs('nmea_bridge', 'ERROR'):
+            glib.dispatch('timeout', bridge._check_pipeline)
+        self.assertTrue(process.killed)
+
+    def test_slow_child(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+        bridge.get_bridge_stats()
+        queued_time = self.clock.now
+
+        for i in range(1000):
+            bridge.send_nmea({'pgn': 127245, 'fields': {'Position': i, 'Text': 'x' * 1000}}, priority=PRIORITY_CONTROL)
+        self.assertGreater(bridge.get_command_stats().queued, 0)
+
+        # the child reads a pipe full between each check, it is slow but not wedged
+        commands = []
+        while glib.find('io', bridge._on_stdin_writable):
+            self.clock.now += nmea_bridge._ACK_TIMEOUT / 2
+            read = process.commands()
+            glib.dispatch('io', bridge._on_stdin_writable, process.stdin, glib.IO_OUT)
+            read += process.commands()
+            self.ack(bridge, process, read)
+            commands += read
+            glib.dispatch('timeout', bridge._check_pipeline)
+
+        self.assertGreater(self.clock.now, nmea_bridge._WEDGED_TIMEOUT)
+        self.assertFalse(process.killed)
+        self.assertEqual(bridge.get_command_stats().timeouts, 0)
+        self.assertEqual([command['message']['fields']['Position'] for command in self.sent(commands)], list(range(1000)))
+        self.assertEqual(bridge.get_command_stats().write_buffer, 0)
+
+        # the last ones waited for the child until the end
+        writes = bridge.get_bridge_stats().writes
+        self.assertGreaterEqual(writes.count, 1000)
+        self.assertGreater(writes.max, nmea_bridge._WEDGED_TIMEOUT)
+        self.assertLessEqual(writes.max, self.clock.now - queued_time)
+        self.assertLess(writes.average, writes.max)
+
+    def test_send_template(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        bridge.enable_change_suppression(126985, 10)
+        bridge.register_template('text', {'pgn': 126985, 'Alert Type': 'Caution', 'Alert Text Description': ''})
+        bridge.send_template('text', {'Alert Text Description': 'Drifting'})
+        bridge.send_template('text', {'Alert Text Description': 'Drifting'})
+        bridge.send_template('text', {'Alert Text Description': 'Dragging'})
+
+        commands = process.commands()
+        self.assertEqual(self.sent(commands, 'registerTemplate')[0]['message'], {'pgn': 126985, 'Alert Type': 'Caution', 'Alert Text Description': ''})
+        self.assertEqual([(command['template'], command['fields']) for command in self.sent(commands, 'sendTemplate')],
+                         [('text', {'Alert Text Description': 'Drifting'}), ('text', {'Alert Text Description': 'Dragging'})])
+        self.assertEqual(bridge.get_suppression_stats().suppressed, 1)
+
+    def test_requeue_after_restart(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 1}})
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 2}})
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 3}})
+        bridge.register_template('rudder', {'pgn': 127245, 'fields': {'Position': 0}})
+        self.ack(bridge, process, self.sent(process.commands())[:1])
+
+        # the child exits before answering the others
+        process.returncode = 1
+        glib.dispatch('io', bridge._on_stdout_data, process.stdout, glib.IO_HUP)
+        glib.dispatch('timeout', bridge._start_nodejs_process)
+        bridge.send_nmea({'pgn': 127245, 'fields': {'Position': 4}})
+
+        # unanswered messages go first, the template is registered again from our own state
+        process = self.processes[1]
+        commands = self.start(bridge, process)
+        self.assertEqual([command['message']['fields']['Position'] for command in self.sent(commands)], [2, 3, 4])
+        self.assertEqual(len(self.sent(commands, 'registerTemplate')), 1)
+
+        # never sent a third time, they may be what makes the child exit
+        self.ack(bridge, process, self.sent(commands)[2:])
+        process.returncode = 1
+        glib.dispatch('io', bridge._on_stdout_data, process.stdout, glib.IO_HUP)
+        with self.assertLogs('nmea_bridge', 'WARNING') as logs:
+            glib.dispatch('timeout', bridge._start_nodejs_process)
+        self.assertEqual(len(logs.output), 2)
+
+        commands = self.start(bridge, self.processes[2])
+        self.assertEqual(self.sent(commands), [])
+
+
+    def run_throttled(self, bridge, process, messages, until):
+        """Receives (time, src, position) messages of PGN 127245, running the throttle timers in between"""
+        timers = [handler_info['throttler']._on_timer for handler_info in bridge._handlers[127245]]
+        for now, src, position in messages:
+            glib.run_timers(now, timers)
+            self.receive(bridge, process, 127245, src, {'Position': position})
+
+        glib.run_timers(until, timers)
+
+    def delivered(self, handler):
+        return [(call.args[0]['src'], call.args[0]['fields']['Position']) for call in handler.call_args_list]
+
+    def test_throttle_per_source(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        fast = MagicMock()
+        slow = MagicMock()
+        bridge.add_pgn_handler(127245, fast, throttle=True)
+        bridge.add_pgn_handler(127245, slow, throttle=5)
+        glib.dispatch('idle')
+        self.start(bridge, process)
+
+        # nmea_bridge.js throttles at the fastest interval
+        self.assertEqual(bridge._sent_filters[127245]['throttle'], 1000)
+
+        self.run_throttled(bridge, process, [(i, src, i) for i in range(11) for src in [1, 2]], 11)
+        self.assertEqual(fast.call_count, 22)
+
+        # first message right away, then the most recent one at the end of each 5s. A busy source doesn't starve the other one
+        self.assertEqual(self.delivered(slow), [(1, 0), (2, 0), (1, 4), (2, 4), (1, 9), (2, 9)])
+
+    def test_throttle_delivers_latest(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        fast = MagicMock()
+        slow = MagicMock()
+        slow_times = []
+        slow.side_effect = lambda message: slow_times.append(self.clock.now)
+        bridge.add_pgn_handler(127245, fast, throttle=0.5)
+        bridge.add_pgn_handler(127245, slow, throttle=2)
+        glib.dispatch('idle')
+        self.start(bridge, process)
+
+        times = [0, 0.5, 1, 1.5, 1.9, 2.4, 2.9, 3.4, 3.8]
+        self.run_throttled(bridge, process, [(now, 1, now) for now in times], 6)
+
+        self.assertEqual(fast.call_count, 9)
+        self.assertEqual(self.delivered(slow), [(1, 0), (1, 1.9), (1, 3.8)])
+        self.assertEqual(slow_times, [0, 2, 4])
+
+    def test_throttle_with_unthrottled_handler(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        throttled = MagicMock()
+        every = MagicMock()
+        bridge.add_pgn_handler(127245, throttled, throttle=True)
+        bridge.add_pgn_handler(127245, every)
+        glib.dispatch('idle')
+        self.start(bridge, process)
+
+        # nmea_bridge.js sends every message, they are coalesced here
+        self.assertEqual(bridge._sent_filters[127245]['throttle'], 0)
+        self.run_throttled(bridge, process, [(i / 8, 1, i) for i in range(16)], 3)
+
+        self.assertEqual(every.call_count, 16)
+        self.assertEqual(self.delivered(throttled), [(1, 0), (1, 7), (1, 15)])
+        self.assertEqual(bridge._handlers[127245][0]['throttler'].throttled, 13)
+
+        # a removed handler doesn't get its pending message
+        self.run_throttled(bridge, process, [(3, 1, 16), (3.5, 1, 17)], 3.5)
+        throttler = bridge._handlers[127245][0]['throttler']
+        bridge.remove_pgn_handler(127245, throttled)
+        self.assertEqual([source for source in glib.sources.values() if source['callback'] == throttler._on_timer], [])
+        glib.run_timers(5, [throttler._on_timer])
+        self.assertEqual(self.delivered(throttled)[-1], (1, 16))
+
+        # throttling again once the unthrottled handler is gone
+        bridge.add_pgn_handler(127245, throttled, throttle=True)
+        bridge.remove_pgn_handler(127245, every)
+        glib.dispatch('idle')
+        self.assertEqual(bridge._sent_filters[127245]['throttle'], 1000)
+
+    def test_throttle_native_decoding(self):
+        with patch('nmea_bridge.open_socketcan', return_value=FakeCanSocket()):
+            bridge = self.create_bridge(native_decoding=True)
+        self.start(bridge, self.processes[0])
+        handler = MagicMock()
+        bridge.add_pgn_handler(129029, handler, throttle=True)
+        glib.dispatch('idle')
+
+        # decoded here, every message is coalesced here
+        self.assertEqual(bridge._throttle_intervals[129029], 0)
+        throttler = bridge._handlers[129029][0]['throttler']
+        for i in range(16):
+            glib.run_timers(i / 8, [throttler._on_timer])
+            bridge._on_nmea_message({'pgn': 129029, 'src': 3, 'dst': 255, 'fields': {'Latitude': i}})
+        glib.run_timers(3, [throttler._on_timer])
+
+        self.assertEqual([call.args[0]['fields']['Latitude'] for call in handler.call_args_list], [0, 7, 15])
+
+    def test_filters_update(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        position = MagicMock()
+        rudder = MagicMock()
+        bridge.add_pgn_handler(129026, position, throttle=True, fields=['SOG'])
+        bridge.add_pgn_handler(127245, rudder, fields=['Position'])
+        glib.dispatch('idle')
+        self.start(bridge, process)
+
+        # handlers changed together like NMEASOGRPMConnector.on_state_changed does
+        sog = MagicMock()
+        rpm = MagicMock()
+        wind = MagicMock()
+        bridge.add_pgn_handler(129026, sog)
+        bridge.add_pgn_handler(127488, rpm, throttle=2)
+        bridge.remove_pgn_handler(127245, rudder)
+        bridge.add_pgn_handler(130306, wind)
+        bridge.remove_pgn_handler(130306, wind)
+        self.assertEqual(process.commands(), [])
+
+        self.assertEqual(glib.dispatch('idle'), 1)
+        commands = process.commands()
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(commands[0]['command'], 'updateFilterPGN')
+        self.assertEqual(commands[0]['add'], [{'pgn': 129026, 'throttle': 0}, {'pgn': 127488, 'throttle': 2000}])
+        self.assertEqual(commands[0]['remove'], [127245])
+
+        # nothing changed in the end
+        bridge.remove_pgn_handler(129026, sog)
+        bridge.add_pgn_handler(129026, sog)
+        bridge.add_pgn_handler(127488, rpm, throttle=2)
+        glib.dispatch('idle')
+        self.assertEqual(process.commands(), [])
+        self.assertEqual(glib.find('idle'), [])
+
+    def test_filters_update_on_restart(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        bridge.add_pgn_handler(129026, MagicMock(), throttle=True)
+        glib.dispatch('idle')
+        self.start(bridge, process)
+
+        # the new child gets the whole list, the pending update is not sent on top of it
+        bridge.add_pgn_handler(127488, MagicMock())
+        process.returncode = 1
+        glib.dispatch('io', bridge._on_stdout_data, process.stdout, glib.IO_HUP)
+        glib.dispatch('timeout', bridge._start_nodejs_process)
+        self.assertEqual(glib.find('idle'), [])
+
+        commands = self.start(bridge, self.processes[1])
+        self.assertEqual(self.sent(commands, 'updateFilterPGN'), [])
+        filters = self.sent(commands, 'filterPGN')
+        self.assertEqual(len(filters), 1)
+        self.assertEqual(filters[0]['filter'], [{'pgn': 129026, 'throttle': 1000}, {'pgn': 127488, 'throttle': 0}])
+
+
+    def test_read_partial_messages(self):
+        bridge = self.create_bridge()
+        process = self.processes[0]
+        self.start(bridge, process)
+        handler = MagicMock()
+        bridge.add_pgn_handler(127245, handler)
+        glib.dispatch('idle')
+        stats = bridge.get_read_stats()
+
+        line = (json.dumps({"event": "on_NMEA_message", "message": {"pgn": 127245, "src": 1, "dst": 255, "fields": {"Position": 1}}}) + "\n").encode('utf-8')
+
+        # an incomplete message waits for the next read
+        process.write(line[:30])
+        self.read(bridge, process)
+        handler.assert_not_called()
+        read_stats = bridge.get_read_stats()
+        self.assertEqual(read_stats.wakeups, stats.wakeups + 1)
+        self.assertEqual(read_stats.last_messages, 0)
+        self.assertEqual(read_stats.last_backlog, 30)
+        self.assertEqual(read_stats.partial_bytes, 30)
+
+        process.write(line[30:] + line + line[:10])
+        self.read(bridge, process)
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual(handler.call_args.args[0]['fields'], {'Position': 1})
+        read_stats = bridge.get_read_stats()
+        self.assertEqual(read_stats.wakeups, stats.wakeups + 2)
+        self.assertEqual(read_stats.messages, stats.messages + 2)
+        self.assertEqual(read_stats.last_messages, 2)
+        self.assertEqual(read_stats.last_backlog, 2 * len(line) - 20)
+        self.assertEqual(read_stats.partial_bytes, 10)
+
+    def test_read_limit(self):
+        with patch('nmea_bridge._READ_CHUNK_SIZE', 100), patch('nmea_bridge._MAX_READ_PER_WAKEUP', 1000):
+            bridge = self.create_bridge()
+            process = self.processes[0]
+            self.start(bridge, process)
+            stats = bridge.get_read_stats()
+
+            # 100 bytes lines, 25 at once
+            event = {"event": "on_getStats", "stats": {}, "padding": ""}
+            event["padding"] = "x" * (99 - len(json.dumps(event)))
+            line = (json.dumps(event) + "\n").encode('utf-8')
+            self.assertEqual(len(line), 100)
+            process.write(line * 25)
+
+            # at most 1000 bytes per wakeup, the rest stays in the pipe for the next one
+            backlogs = []
+            while bridge.get_read_stats().messages < stats.messages + 25:
+                self.read(bridge, process)
+                backlogs.append(bridge.get_read_stats().last_backlog)
+
+        self.assertEqual(backlogs, [2500, 1500, 500])
+        read_stats = bridge.get_read_stats()
+        self.assertEqual(read_stats.wakeups, stats.wakeups + 3)
+        self.assertEqual(read_stats.last_messages, 5)
+        self.assertEqual(read_stats.max_messages, 10)
+        self.assertEqual(read_stats.max_backlog, 2500)
+        self.assertEqual(read_stats.partial_bytes, 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -70,7 +70,9 @@ class TestNMEADSConnector(unittest.TestCase):
 
 
         connector = NMEADSConnector(lambda: timer_provider, MockSettingsDevice,  mock_bridge)
+        mock_bridge.enable_change_suppression.assert_called_with(127501, 5)
         connector._settings['AdvertiseInterval'] = 0
+        mock_bridge.enable_change_suppression.assert_called_with(127501, 0)
 
         controller = MagicMock()
         controller.trigger_anchor_down     = MagicMock()
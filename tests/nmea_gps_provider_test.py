@@ -20,6 +20,7 @@
 
 import sys
 import os
+import math
 from unittest import mock
 
 
@@ -40,6 +41,7 @@ from glib_timer_mock import GLibTimerMock
 sys.path.insert(1, os.path.join(sys.path[0], '../gps_providers'))
 
 from abstract_gps_provider import GPSPosition
+from abstract_gps_provider import GPSVelocity
 
 from nmea_gps_provider import NMEAGPSProvider
           
@@ -58,14 +60,29 @@ class TestNMEAGPSProvider(unittest.TestCase):
         mock_bridge = MagicMock()
         
         handler = None
-        def _set_handler(pgn, the_handler):
+        cog_sog_handler = None
+        projected_fields = {}
+        def _set_handler(pgn, the_handler, **kwargs):
             nonlocal handler
-            handler = the_handler
+            nonlocal cog_sog_handler
+            projected_fields[pgn] = kwargs.get('fields')
+            if pgn == 129026:
+                cog_sog_handler = the_handler
+            else:
+                handler = the_handler
 
         mock_bridge.add_pgn_handler = MagicMock(side_effect=_set_handler)              
 
 
-        provider = NMEAGPSProvider(lambda: timer_provider, mock_bridge)
+        now = 0
+        def _clock():
+            return now
+
+        provider = NMEAGPSProvider(lambda: timer_provider, mock_bridge, _clock)
+        provider.on_gps_position = MagicMock()
+
+        # rapid updates are throttled, not to cancel the throttling of other 129026 handlers
+        mock_bridge.add_pgn_handler.assert_any_call(129026, ANY, throttle=True, fields=ANY)
 
         self.assertIsNone(provider.get_gps_position())
 
@@ -84,37 +101,162 @@ class TestNMEAGPSProvider(unittest.TestCase):
         handler(get_nofix_message(1))
         self.assertIsNone(provider.get_gps_position())
 
+        # accuracy estimated from the default DOP without fusion too
         handler(get_fix_message(1, 1, 1))
-        self.assertEqual(provider.get_gps_position(), GPSPosition(1, 1))
+        self.assertEqual(provider.get_gps_position(), GPSPosition(1, 1, 10))
+        provider.on_gps_position.assert_called_once_with(provider, GPSPosition(1, 1, 10))
+
+        # no timer needed to invalidate positions
+        self.assertEqual(len(timer_provider.timers), 0)
+
+        now += 1.9
+        self.assertEqual(provider.get_gps_position(), GPSPosition(1, 1, 10))
 
-        timer_provider.tick()
-        timer_provider.tick()
+        now += 0.1
         self.assertIsNone(provider.get_gps_position())
 
         handler(get_fix_message(1, 2, 2))
-        self.assertEqual(provider.get_gps_position(), GPSPosition(2, 2))
+        self.assertEqual(provider.get_gps_position(), GPSPosition(2, 2, 10))
         handler(get_nofix_message(1))
         self.assertIsNone(provider.get_gps_position())
 
+        # the lost fix is pushed too
+        provider.on_gps_position.assert_called_with(provider, None)
+
         handler(get_fix_message(1, 3, 3))
         handler(get_nofix_message(2))
-        self.assertEqual(provider.get_gps_position(), GPSPosition(3, 3))
+        self.assertEqual(provider.get_gps_position(), GPSPosition(3, 3, 10))
+        provider.on_gps_position.reset_mock()
         handler(get_fix_message(20, 20, 20))
-        self.assertEqual(provider.get_gps_position(), GPSPosition(3, 3))
+        self.assertEqual(provider.get_gps_position(), GPSPosition(3, 3, 10))
+        # not the preferred source, not pushed
+        provider.on_gps_position.assert_not_called()
 
 
         handler(get_nofix_message(1))
-        self.assertEqual(provider.get_gps_position(), GPSPosition(20, 20))
+        self.assertEqual(provider.get_gps_position(), GPSPosition(20, 20, 10))
 
         handler(get_nofix_message(20))
         self.assertIsNone(provider.get_gps_position())
 
 
         handler(get_fix_message(20, 20, 20))
-        self.assertEqual(provider.get_gps_position(), GPSPosition(20, 20))
+        self.assertEqual(provider.get_gps_position(), GPSPosition(20, 20, 10))
+
+        now += 2
+        self.assertIsNone(provider.get_gps_position())
+
+        # speed and course from the preferred source only
+        self.assertIsNone(provider.get_gps_velocity())
+        handler(get_fix_message(20, 20, 20))
+        cog_sog_handler({'canId': 167248387, 'prio': 2, 'src': 3, 'dst': 255, 'pgn': 129026, 'timestamp': '2025-05-16T13:51:59.279Z',
+                   'fields': {'SID': 208, 'COG Reference': 'True', 'COG': 0.2787, 'SOG': 0.07}, 'description': 'COG & SOG, Rapid Update'})
+        self.assertIsNone(provider.get_gps_velocity())
+
+        cog_sog_handler({'canId': 167248387, 'prio': 2, 'src': 20, 'dst': 255, 'pgn': 129026, 'timestamp': '2025-05-16T13:51:59.279Z',
+                   'fields': {'SID': 208, 'COG Reference': 'True', 'COG': 0.2787, 'SOG': 0.07}, 'description': 'COG & SOG, Rapid Update'})
+        self.assertEqual(provider.get_gps_velocity(), GPSVelocity(0.07, 0.2787))
+
+        now += 2
+        self.assertIsNone(provider.get_gps_velocity())
+
 
-        timer_provider.tick()
-        timer_provider.tick()
+    def test_fusion(self):
+        mock_bridge = MagicMock()
+
+        handler = None
+        cog_sog_handler = None
+        projected_fields = {}
+        def _set_handler(pgn, the_handler, **kwargs):
+            nonlocal handler
+            nonlocal cog_sog_handler
+            projected_fields[pgn] = kwargs.get('fields')
+            if pgn == 129026:
+                cog_sog_handler = the_handler
+            else:
+                handler = the_handler
+
+        mock_bridge.add_pgn_handler = MagicMock(side_effect=_set_handler)
+
+        now = 0
+        def _clock():
+            return now
+
+        provider = NMEAGPSProvider(lambda: timer_provider, mock_bridge, _clock, MockSettingsDevice)
+        provider.on_gps_position = MagicMock()
+
+        # disabled by default
+        self.assertFalse(provider._fusion)
+        provider._settings['Fusion'] = 1
+
+        def get_fix_message(src, lat, lon, method='GNSS fix', hdop=1, svs=10):
+            return {'canId': 234358059, 'prio': 3, 'src': src, 'dst': 255, 'pgn': 129029, 'timestamp': '2025-06-06T17:35:04.000Z', 'input': [],
+                    'fields': {'Date': '2025.06.06', 'Time': '17:35:04', 'Latitude': lat, 'Longitude': lon, 'GNSS type': 'GPS', 'Method': method,
+                               'Integrity': 'No integrity checking', 'Number of SVs': svs, 'HDOP': hdop, 'PDOP': 2, 'Reference Stations': 0, 'list': []}, 'description': 'GNSS Position Data'}
+
+        handler(get_fix_message(1, 10, 10))
+        position = provider.get_gps_position()
+        self.assertEqual((position.latitude, position.longitude), (10, 10))
+        self.assertAlmostEqual(position.accuracy, 5)
+        provider.on_gps_position.assert_called_once_with(provider, position)
+        self.assertEqual(provider.get_source_id(), "NMEA fused 1")
+
+        # same accuracy, ~11m north : mean of both
+        handler(get_fix_message(2, 10.0001, 10))
+        position = provider.get_gps_position()
+        self.assertAlmostEqual(position.latitude, 10.00005)
+        self.assertAlmostEqual(position.longitude, 10)
+        self.assertAlmostEqual(position.accuracy, 5 / math.sqrt(2))
+        self.assertEqual(provider.get_source_id(), "NMEA fused 1,2")
+        self.assertEqual(provider.on_gps_position.call_count, 2)
+
+        # fused when fixes are received, reading the position doesn't fuse again
+        fix_id = provider.get_fix_id()
+        with patch.object(provider, '_fuse_gps_positions') as fuse:
+            self.assertEqual(provider.get_gps_position(), position)
+            self.assertEqual(provider.get_gps_position(), position)
+            fuse.assert_not_called()
+        self.assertEqual(provider.get_fix_id(), fix_id)
+
+        # DGNSS source weighs more
+        handler(get_fix_message(2, 10.0001, 10, 'DGNSS fix'))
+        position = provider.get_gps_position()
+        self.assertAlmostEqual(position.latitude, 10 + 0.0001 * 25 / (25 + 1.5*1.5))
+
+        # a source jumping away from consensus is rejected
+        handler(get_fix_message(3, 10.001, 10, 'RTK Fixed Integer'))
+        self.assertEqual(provider.get_source_id(), "NMEA fused 1,2")
+        self.assertLess(provider.get_gps_position().latitude, 10.0001)
+
+        # other sources lost, start again from the remaining one
+        now += 2.5
+        handler(get_fix_message(3, 10.001, 10, 'RTK Fixed Integer'))
+        self.assertEqual(provider.get_source_id(), "NMEA fused 3")
+        self.assertAlmostEqual(provider.get_gps_position().latitude, 10.001)
+        self.assertAlmostEqual(provider.get_gps_position().accuracy, 0.05)
+
+        handler(get_fix_message(1, 10, 10))
+        self.assertEqual(provider.get_source_id(), "NMEA fused 3")
+
+        # only the fields used are asked to the bridge
+        message = get_fix_message(5, 10.001, 10, 'RTK Fixed Integer', hdop=0.5, svs=4)
+        fields = message['fields']
+        handler({'src': 5, 'pgn': 129029, 'fields': {name: fields[name] for name in projected_fields[129029] if name in fields}})
+        self.assertEqual(provider._gps_positions[5].accuracy, provider._estimate_accuracy(fields))
+
+        # low satellite count and no HDOP degrade accuracy
+        fields = get_fix_message(4, 10, 10, hdop=None, svs=4)['fields']
+        self.assertAlmostEqual(provider._estimate_accuracy(fields), 5 * 2 * 2)
+
+        # antimeridian
+        now += 2.5
+        handler(get_fix_message(1, 10, 179.99999))
+        handler(get_fix_message(2, 10, -179.99999))
+        position = provider.get_gps_position()
+        self.assertAlmostEqual(abs(position.longitude), 180)
+
+        # invalidated like any other source
+        now += 2
         self.assertIsNone(provider.get_gps_position())
 
 
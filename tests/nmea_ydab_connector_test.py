@@ -26,6 +26,7 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), '../ext/velib_python/test'))
 
 from anchor_alarm_model import AnchorAlarmState
+from bridge_scheduler import PRIORITY_ALARM
 
 import unittest
 from unittest.mock import ANY
@@ -143,22 +144,22 @@ class TestNMEAYDABConnector(unittest.TestCase):
         led_0 = self._get_pgn_for_command("YD:LED 0")
         
         connector.on_state_changed(state_disabled)
-        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off), call(led_0)])
+        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM)])
 
         connector.on_state_changed(state_drop_point_set)
-        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off), call(led_0), call(ds_10)])
+        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM), call(ds_10, priority=PRIORITY_ALARM)])
 
         connector.on_state_changed(state_in_radius)
-        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off), call(led_0), call(ds_10), call(ds_all_off), call(led_21)])
+        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM), call(ds_10, priority=PRIORITY_ALARM), call(ds_all_off, priority=PRIORITY_ALARM), call(led_21, priority=PRIORITY_ALARM)])
 
         connector.on_state_changed(state_dragging)
-        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off), call(led_0), call(ds_10), call(ds_all_off), call(led_21), call(ds_11)])
+        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM), call(ds_10, priority=PRIORITY_ALARM), call(ds_all_off, priority=PRIORITY_ALARM), call(led_21, priority=PRIORITY_ALARM), call(ds_11, priority=PRIORITY_ALARM)])
 
         connector.on_state_changed(state_dragging_muted)
-        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off), call(led_0), call(ds_10), call(ds_all_off), call(led_21), call(ds_11), call(ds_12)])
+        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM), call(ds_10, priority=PRIORITY_ALARM), call(ds_all_off, priority=PRIORITY_ALARM), call(led_21, priority=PRIORITY_ALARM), call(ds_11, priority=PRIORITY_ALARM), call(ds_12, priority=PRIORITY_ALARM)])
 
         connector.on_state_changed(state_disabled)
-        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off), call(led_0), call(ds_10), call(ds_all_off), call(led_21), call(ds_11), call(ds_12), call(ds_all_off), call(led_0)])
+        mock_bridge.send_nmea.assert_has_calls([call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM), call(ds_10, priority=PRIORITY_ALARM), call(ds_all_off, priority=PRIORITY_ALARM), call(led_21, priority=PRIORITY_ALARM), call(ds_11, priority=PRIORITY_ALARM), call(ds_12, priority=PRIORITY_ALARM), call(ds_all_off, priority=PRIORITY_ALARM), call(led_0, priority=PRIORITY_ALARM)])
 
     def test_states_acks(self):
         mock_bridge = MagicMock()
@@ -348,7 +349,7 @@ class TestNMEAYDABConnector(unittest.TestCase):
         # trigger new config
         connector._settings['StartConfiguration'] = 1
 
-        mock_bridge.send_nmea.assert_called_once_with(get_config_call("YD:RESET"))
+        mock_bridge.send_nmea.assert_called_once_with(get_config_call("YD:RESET"), priority=PRIORITY_ALARM)
 
         # try to put setting back, should reject
         connector._settings['StartConfiguration'] = 0
@@ -369,7 +370,7 @@ class TestNMEAYDABConnector(unittest.TestCase):
         mock_bridge.send_nmea.reset_mock()
 
         connector._settings['StartConfiguration'] = 1
-        mock_bridge.send_nmea.assert_has_calls([call(get_config_call("YD:RESET"))])
+        mock_bridge.send_nmea.assert_has_calls([call(get_config_call("YD:RESET"), priority=PRIORITY_ALARM)])
 
         timer_provider.tick()
         self.assertEqual(connector._settings['StartConfiguration'], 1)
@@ -396,7 +397,7 @@ class TestNMEAYDABConnector(unittest.TestCase):
 
         mock_bridge.send_nmea.reset_mock()
         connector._settings['StartConfiguration'] = 1
-        mock_bridge.send_nmea.assert_has_calls([call(get_config_call("YD:RESET"))])
+        mock_bridge.send_nmea.assert_has_calls([call(get_config_call("YD:RESET"), priority=PRIORITY_ALARM)])
 
         timer_provider.tick()
         self.assertEqual(connector._settings['StartConfiguration'], 1)
@@ -427,7 +428,7 @@ class TestNMEAYDABConnector(unittest.TestCase):
 
         calls = []
         for i, command in enumerate(expected_commands):
-            calls.append(call(get_config_call(command)))
+            calls.append(call(get_config_call(command), priority=PRIORITY_ALARM))
             mock_bridge.send_nmea.assert_has_calls(calls)
             timer_provider.tick()
             handler(get_ack_call(command))
@@ -437,12 +438,12 @@ class TestNMEAYDABConnector(unittest.TestCase):
                 self.assertEqual(len(connector._queued_config_commands), len(expected_commands)-1-i)
 
 
-        calls.append(call(get_config_call("YD:PLAY 6")))
+        calls.append(call(get_config_call("YD:PLAY 6"), priority=PRIORITY_ALARM))
         mock_bridge.send_nmea.assert_has_calls(calls)
 
         timer_provider.tick()
 
-        calls.append(call(get_config_call("YD:PLAY 0")))
+        calls.append(call(get_config_call("YD:PLAY 0"), priority=PRIORITY_ALARM))
         mock_bridge.send_nmea.assert_has_calls(calls)
 
         self.assertEqual(connector._settings['StartConfiguration'], 0)
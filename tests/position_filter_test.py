@@ -0,0 +1,129 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+sys.path.insert(1, os.path.join(sys.path[0], '../gps_providers'))
+
+import math
+import random
+import unittest
+
+from position_filter import PositionFilter
+from distance_engine import LocalTangentPlane
+from abstract_gps_provider import GPSPosition, GPSVelocity
+
+
+class TestPositionFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.origin = GPSPosition(18.5060715, -64.3725071)
+        self.plane = LocalTangentPlane(self.origin)
+
+    def position_at(self, east, north, accuracy=None):
+        latitude, longitude = self.plane.from_xy(east, north)
+        return GPSPosition(latitude, longitude, accuracy)
+
+    def offset_of(self, gps_position):
+        return self.plane.to_xy(gps_position.latitude, gps_position.longitude)
+
+
+    def test_stationary_noise(self):
+        rnd = random.Random(42)
+        position_filter = PositionFilter()
+
+        self.assertIsNone(position_filter.get_position())
+        self.assertIsNone(position_filter.get_covariance())
+
+        raw_error = 0
+        filtered_error = 0
+        for i in range(300):
+            position = position_filter.update(self.position_at(rnd.gauss(0, 5), rnd.gauss(0, 5), 5), i)
+            if i >= 60:
+                raw_error += math.hypot(*self.offset_of(self.position_at(rnd.gauss(0, 5), rnd.gauss(0, 5))))
+                filtered_error += math.hypot(*self.offset_of(position))
+
+        self.assertLess(filtered_error, raw_error / 2)
+
+        # filtered accuracy is better than the measurements one
+        self.assertLess(position.accuracy, 5)
+        covariance = position_filter.get_covariance()
+        self.assertAlmostEqual(covariance[0][0], covariance[1][1])
+        self.assertAlmostEqual(position.accuracy, math.sqrt(covariance[0][0]))
+
+
+    def test_single_jump(self):
+        position_filter = PositionFilter()
+        for i in range(60):
+            position_filter.update(self.position_at(0, 0, 3), i)
+
+        # multipath, 40m away for a single fix
+        position = position_filter.update(self.position_at(0, 40, 3), 60)
+        self.assertLess(self.offset_of(position)[1], 10)
+
+        for i in range(61, 70):
+            position = position_filter.update(self.position_at(0, 0, 3), i)
+        self.assertLess(abs(self.offset_of(position)[1]), 3)
+
+
+    def test_constant_velocity(self):
+        position_filter = PositionFilter()
+        for i in range(120):
+            position = position_filter.update(self.position_at(0, i * 1.0), i)
+
+        east, north = self.offset_of(position)
+        self.assertAlmostEqual(north, 119, delta=0.5)
+        self.assertAlmostEqual(east, 0, delta=0.1)
+        self.assertAlmostEqual(position_filter.get_velocity()[1], 1, delta=0.05)
+
+
+    def test_velocity_measurements(self):
+        without_velocity = PositionFilter()
+        with_velocity = PositionFilter()
+        for i in range(5):
+            without_velocity.update(self.position_at(i * 2.0, 0), i)
+            with_velocity.update(self.position_at(i * 2.0, 0), i, GPSVelocity(2, math.pi / 2))
+
+        self.assertAlmostEqual(with_velocity.get_velocity()[0], 2, delta=0.1)
+        self.assertLess(without_velocity.get_velocity()[0], with_velocity.get_velocity()[0])
+
+
+    def test_restart_after_gap(self):
+        position_filter = PositionFilter()
+        for i in range(30):
+            position_filter.update(self.position_at(0, 0, 5), i)
+
+        position = position_filter.update(self.position_at(0, 100, 5), 60)
+        self.assertAlmostEqual(self.offset_of(position)[1], 100, delta=0.01)
+        self.assertAlmostEqual(position.accuracy, 5)
+
+
+    def test_moving_origin(self):
+        position_filter = PositionFilter()
+        for i in range(400):
+            position = position_filter.update(self.position_at(0, i * 5.0), i)
+
+        self.assertAlmostEqual(self.offset_of(position)[1], 1995, delta=1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
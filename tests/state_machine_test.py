@@ -0,0 +1,108 @@
+# Copyright (c) 2025 Thomas Dubois
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+sys.path.insert(1, os.path.join(sys.path[0], '../ext'))
+
+import random
+import unittest
+
+from transitions import Machine
+
+from state_machine import StateMachine
+
+
+STATES = [{'name': 'A'}, {'name': 'B'}, {'name': 'C'}]
+
+TRANSITIONS = [
+    { 'trigger': 'go_b',    'source': 'A',  'dest': 'B', 'after': 'after_go_b'},
+    { 'trigger': 'go_c',    'source': 'B',  'dest': 'C' },
+    { 'trigger': 'go_c',    'source': 'A',  'dest': 'C', 'after': ['after_go_c', 'after_go_c_again'] },
+    { 'trigger': 'go_a',    'source': ['B', 'C'], 'dest': 'A' },
+    { 'trigger': 'reset',   'source': '*',  'dest': 'A' },
+]
+
+
+class RecordingModel(object):
+    def __init__(self):
+        self.calls = []
+
+    def on_enter_A(self, *args):
+        self.calls.append(('on_enter_A', self.state, args))
+
+    def on_exit_A(self, *args):
+        self.calls.append(('on_exit_A', self.state, args))
+
+    def on_enter_C(self, *args):
+        self.calls.append(('on_enter_C', self.state, args))
+
+    def after_go_b(self, *args):
+        self.calls.append(('after_go_b', self.state, args))
+
+    def after_go_c(self, *args):
+        self.calls.append(('after_go_c', self.state, args))
+
+    def after_go_c_again(self, *args):
+        self.calls.append(('after_go_c_again', self.state, args))
+
+    def after_state_change(self, *args):
+        self.calls.append(('after_state_change', self.state, args))
+
+
+class TestStateMachine(unittest.TestCase):
+
+    def test_same_behaviour_as_transitions(self):
+        expected = RecordingModel()
+        Machine(model=expected, states=STATES, transitions=TRANSITIONS, initial='A', after_state_change=expected.after_state_change, ignore_invalid_triggers=True)
+
+        model = RecordingModel()
+        StateMachine(model=model, states=STATES, transitions=TRANSITIONS, initial='A', after_state_change=model.after_state_change)
+
+        rnd = random.Random(3)
+        for i in range(500):
+            trigger = rnd.choice(['go_a', 'go_b', 'go_c', 'reset'])
+            args = (i,) if rnd.random() < 0.5 else ()
+
+            self.assertEqual(getattr(model, trigger)(*args), getattr(expected, trigger)(*args))
+            self.assertEqual(model.state, expected.state)
+
+        self.assertEqual(model.calls, expected.calls)
+
+    def test_invalid_trigger_ignored(self):
+        model = RecordingModel()
+        StateMachine(model=model, states=STATES, transitions=TRANSITIONS, initial='C', after_state_change=model.after_state_change)
+
+        self.assertFalse(model.go_b())
+        self.assertEqual(model.state, 'C')
+        self.assertEqual(model.calls, [])
+
+    def test_reflexive_transition(self):
+        model = RecordingModel()
+        StateMachine(model=model, states=STATES, transitions=TRANSITIONS, initial='A', after_state_change=model.after_state_change)
+
+        self.assertTrue(model.reset())
+        self.assertEqual(model.calls, [('on_exit_A', 'A', ()), ('on_enter_A', 'A', ()), ('after_state_change', 'A', ())])
+
+
+
+if __name__ == '__main__':
+    unittest.main()